@@ -9,6 +9,8 @@ import os
 import re
 import shutil
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 if __name__ == '__main__':
     # prevent python from generating compiled byte code (.pyc).
@@ -17,8 +19,8 @@ if __name__ == '__main__':
 from tools.anotherargparser import AnotherArgumentParser
 from tools.parsejson import parse_json
 from tools.log import Log
+from tools.elfcache import ElfCache
 from pyelftools.elftools.elf.elffile import ELFFile
-from pyelftools.elftools.elf.dynamic import DynamicSection
 from tools.gitlog import git_logs
 from tools.svninfo import svn_info
 
@@ -33,6 +35,29 @@ def export(obj):
 
 
 ################################################################################
+# scan_elf() parses an elf file and returns the libraries it needs, the code
+# size and the sizes of the bss/data/rodata/text sections. it returns None if
+# the file cannot be found. it is a module level function so that it can be
+# run in the worker processes of a process pool.
+#
+def scan_elf(filename):
+    result = None
+    try:
+        with ELFFile.from_path(filename) as elffile:
+            result = {
+                "libs": Project.get_libraries_used_by_elf(elffile),
+                "code_size": Project.caculate_code_size(elffile),
+                "sections": {
+                    "bss": Project.get_section_size(elffile, ".bss"),
+                    "data": Project.get_section_size(elffile, ".data"),
+                    "rodata": Project.get_section_size(elffile, ".rodata"),
+                    "text": Project.get_section_size(elffile, ".text"),
+                },
+            }
+    except FileNotFoundError as e:
+        print(e)
+    return result
+
 
 class Project:
     class Path:
@@ -109,35 +134,30 @@ class Project:
             browse_path = browse_path[:-1]  # remove the last character, an ampersand.
             return browse_path
 
-    def __init__(self, dict_project):
+    def __init__(self, dict_project, jobs=1, cache=None):
         self.dict_project = dict_project
         self.path = self.Path(dict_project.get("path", {}))
         self.repo = self.Repo(self, dict_project.get("repo", {}))
+        self.jobs = jobs
+        self.cache = cache
         self.libraries = set()
+        self.elfs = {}
+        self.scan_elfs()
         self.read_apps()
         self.read_libraries()
 
     def readelf(self, path, name, elf):
-        filename = path + name
-        try:
-            with open(filename, 'rb') as file:
-                elffile = ELFFile(file)
-                if "name" not in elf:
-                    elf["name"] = name
-                if "description" not in elf:
-                    elf["description"] = re.split('\.', name)[0]
-                elf["libs"] = self.get_libraries_used_by_elf(elffile)
-                summary = elf.get("summary", {})
-                summary["code_size"] = self.caculate_code_size(elffile)
-                summary["sections"] = {
-                    "bss": self.get_section_size(elffile, ".bss"),
-                    "data": self.get_section_size(elffile, ".data"),
-                    "rodata": self.get_section_size(elffile, ".rodata"),
-                    "text": self.get_section_size(elffile, ".text"),
-                }
-                elf["summary"] = summary
-        except FileNotFoundError as e:
-            print(e)
+        result = self.elfs.get(path + name)
+        if result is not None:
+            if "name" not in elf:
+                elf["name"] = name
+            if "description" not in elf:
+                elf["description"] = re.split('\.', name)[0]
+            elf["libs"] = list(result["libs"])
+            summary = elf.get("summary", {})
+            summary["code_size"] = result["code_size"]
+            summary["sections"] = dict(result["sections"])
+            elf["summary"] = summary
         return elf
 
     def read_apps(self):
@@ -161,16 +181,82 @@ class Project:
                 libs.append(lib)
         self.dict_project["libs"] = sorted(libs, key=lambda x: x["name"])
 
-    def get_libraries_used_by_elf(self, elffile):
+    ################################################################################
+    # scan_elfs() parses every app and, through a work queue, every library they
+    # need. a library is queued as soon as it is found in the DT_NEEDED entries
+    # of a parsed elf. with jobs > 1 the elf files are parsed in a process pool.
+    #
+    def scan_elfs(self):
+        filenames = []
+        for key, path in (("sbin", self.path.sbin), ("cgi", self.path.cgi)):
+            for app in self.dict_project.get(key, []):
+                filenames.append(path + app["name"])
+        if self.jobs > 1:
+            self.scan_elfs_parallel(filenames)
+        else:
+            self.scan_elfs_serial(filenames)
+        if self.cache is not None:
+            self.cache.save()
+
+    def scan_elfs_serial(self, filenames):
+        queue = deque(filenames)
+        while queue:
+            filename = queue.popleft()
+            if filename not in self.elfs:
+                result = self.get_cached_elf(filename)
+                if result is None:
+                    result = scan_elf(filename)
+                    self.put_cached_elf(filename, result)
+                self.elfs[filename] = result
+                queue.extend(self.queue_libraries(result))
+
+    def scan_elfs_parallel(self, filenames):
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            scheduled = set()
+            pending = {}
+            queue = deque(filenames)
+            while queue or pending:
+                while queue:
+                    filename = queue.popleft()
+                    if filename not in scheduled:
+                        scheduled.add(filename)
+                        result = self.get_cached_elf(filename)
+                        if result is None:
+                            pending[executor.submit(scan_elf, filename)] = filename
+                        else:
+                            self.elfs[filename] = result
+                            queue.extend(self.queue_libraries(result))
+                if not pending:
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    filename = pending.pop(future)
+                    result = self.elfs[filename] = future.result()
+                    self.put_cached_elf(filename, result)
+                    queue.extend(self.queue_libraries(result))
+
+    def get_cached_elf(self, filename):
+        return self.cache.get(filename) if self.cache is not None else None
+
+    def put_cached_elf(self, filename, result):
+        if self.cache is not None and result is not None:
+            self.cache.put(filename, result)
+
+    def queue_libraries(self, result):
+        filenames = []
+        if result is not None:
+            for libname in result["libs"]:
+                if libname not in self.libraries:
+                    self.libraries.add(libname)
+                    filenames.append(self.path.lib + libname)
+        return filenames
+
+    @staticmethod
+    def get_libraries_used_by_elf(elffile):
         libs = []
-        for section in elffile.iter_sections():
-            if isinstance(section, DynamicSection):
-                for tag in section.iter_tags():
-                    if tag.entry.d_tag == 'DT_NEEDED':
-                        libs.append(tag.needed)
-                        if tag.needed not in self.libraries:
-                            self.readelf(self.path.lib, tag.needed, dict())
-                            self.libraries.add(tag.needed)
+        for section in elffile.get_sections_by_type('SHT_DYNAMIC'):
+            for tag in section.iter_tags(type='DT_NEEDED'):
+                libs.append(tag.needed)
         return libs
 
     @staticmethod
@@ -306,7 +392,10 @@ class ElfFileStats:
             return
 
         dictproject = dictall["project"]
-        project = Project(dictproject)
+        cache = None
+        if args.cache:
+            cache = ElfCache(args.cache, max_entries=args.cache_size, invalidate=args.invalidate_cache)
+        project = Project(dictproject, jobs=args.jobs, cache=cache)
         dictproject["repo"]["revision"] = project.repo.latest_revision
         dictproject["repo"]["browse_path"] = project.repo.browse_path
 
@@ -318,6 +407,8 @@ class ElfFileStats:
             self.generate_trac_report()
         if genredmine:
             self.generate_trac_report(redmine=True)
+        if cache is not None:
+            print(cache.stats())
 
         return
 
@@ -344,6 +435,14 @@ def init_args_parser():
                         help="generate the report in a javascript file.")
     parser.add_argument("-a", "--output-html", action="store_true", default=False,
                         help="generate the report in an html file.")
+    parser.add_argument("--jobs", metavar="N", type=int, default=1,
+                        help="parse the elf files in N processes in parallel.")
+    parser.add_argument("--cache", metavar="filename", default=None,
+                        help="cache the results of the elf files in a json file.")
+    parser.add_argument("--cache-size", metavar="N", type=int, default=ElfCache.DEFAULT_MAX_ENTRIES,
+                        help="keep at most N elf files in the cache.")
+    parser.add_argument("--invalidate-cache", action="store_true", default=False,
+                        help="discard the cached results and parse all elf files.")
     parser.set_defaults(action="process")
     return parser
 
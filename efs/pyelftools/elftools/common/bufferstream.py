@@ -0,0 +1,105 @@
+#-------------------------------------------------------------------------------
+# elftools: common/bufferstream.py
+#
+# BufferStream - a read-only stream over an in-memory or memory-mapped buffer
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import io
+import mmap
+
+
+class BufferStream(object):
+    """ A read-only, seekable binary stream over a buffer (bytes, bytearray,
+        mmap or anything else supporting the buffer protocol).
+
+        Reads are served by slicing the buffer in memory, so unlike a file
+        object they don't cost a system call each. view() gives zero-copy
+        access to a region of the buffer.
+
+        Accessible attributes:
+
+            buffer:
+                A memoryview of the whole buffer
+    """
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        self._size = len(self.buffer)
+        self._pos = 0
+        self._mmap = None
+
+    @classmethod
+    def from_path(cls, path):
+        """ Create a BufferStream backed by a read-only memory mapping of the
+            file at path (or by its contents on Python 2, whose memoryview
+            doesn't support mmap objects).
+        """
+        with open(path, 'rb') as f:
+            try:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                return cls(b'')
+            try:
+                stream = cls(mapping)
+            except TypeError:
+                # Python 2 can't make a memoryview of an mmap: the file is
+                # read into memory instead
+                mapping.close()
+                return cls(f.read())
+        stream._mmap = mapping
+        return stream
+
+    def read(self, size=-1):
+        start = self._pos
+        if size is None or size < 0:
+            end = self._size
+        else:
+            end = min(start + size, self._size)
+        if end <= start:
+            return b''
+        self._pos = end
+        return self.buffer[start:end].tobytes()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError('Invalid whence %r' % whence)
+        if pos < 0:
+            raise ValueError('Negative seek position %d' % pos)
+        self._pos = pos
+        return pos
+
+    def tell(self):
+        return self._pos
+
+    def view(self, offset, size):
+        """ Zero-copy access to size bytes of the buffer starting at offset:
+            returns a memoryview slice of the buffer.
+        """
+        return self.buffer[offset:offset + size]
+
+    def close(self):
+        """ Release the buffer, and unmap it if it was mapped by from_path.
+            A mapping that still has views exported by view() stays alive
+            until the last of them is released.
+        """
+        if hasattr(self.buffer, 'release'):
+            self.buffer.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -6,7 +6,15 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
-from ..construct import Subconstruct, ConstructError, ArrayError
+from operator import itemgetter
+from struct import Struct as Packer
+
+from ..construct import (
+    Subconstruct, ConstructError, ArrayError, SizeofError, FieldError,
+    Struct, FormatField, MetaArray, Value, Buffered,
+    MappingAdapter, PaddingAdapter, BitIntegerAdapter, ListContainer)
+from ..construct.lib import make_record_class
+from ..construct.core import _read_stream
 
 
 class RepeatUntilExcluding(Subconstruct):
@@ -38,7 +46,215 @@ class RepeatUntilExcluding(Subconstruct):
         except ConstructError as ex:
             raise ArrayError("missing terminator", ex)
         return obj
+    def _compile_parse(self, gen, context):
+        if self.subcon.conflags & self.FLAG_COPY_CONTEXT:
+            raise NotImplementedError()
+        gen.use_context(context)
+        obj = gen.var("obj")
+        gen.emit("%s = []" % obj)
+        gen.emit("try:")
+        with gen.indented():
+            gen.emit("while True:")
+            with gen.indented():
+                subobj = gen.parse(self.subcon, context)
+                gen.emit("if %s(%s, %s): break" % (gen.bind(self.predicate),
+                    subobj, context.var))
+                gen.emit("%s.append(%s)" % (obj, subobj))
+        gen.emit("except array_errors as ex:")
+        with gen.indented():
+            gen.emit("raise ArrayError('missing terminator', ex)")
+        return obj
     def _build(self, obj, stream, context):
         raise NotImplementedError('no building')
     def _sizeof(self, context):
         raise SizeofError("can't calculate size")
+
+
+class PrecompiledStruct(Struct):
+    """ A Struct of fixed layout that parses with a single precompiled
+        struct.Struct unpack into a record class generated for it (see
+        construct's make_record_class) instead of walking its subconstructs
+        and building a Container.
+
+        Only a subset of constructs can be precompiled: FormatFields,
+        mappings (Enum) of them, Padding, fixed-size Arrays of FormatFields,
+        Values, nested Structs of these and BitStructs of unsigned BitFields
+        (possibly mapped) and Padding. Any other subconstruct raises
+        TypeError when the PrecompiledStruct is created.
+
+        Values are computed after all the other fields, with the record as
+        their context. Building and sizeof go through the generic Struct.
+    """
+    __slots__ = ["packer", "_field_getters", "_value_fields"]
+
+    def __init__(self, name, *subcons):
+        Struct.__init__(self, name, *subcons)
+        endianity = self._find_endianity(subcons) or '='
+        fmt, self.record_class, self._field_getters, self._value_fields = \
+            self._compile_struct(self, [0])
+        self.packer = Packer(endianity + fmt)
+
+    def parse_stream(self, stream):
+        # No context is needed: skip the Container Construct.parse_stream
+        # creates for it
+        return self._parse(stream, None)
+
+    def _parse(self, stream, context):
+        return self.parse_record(_read_stream(stream, self.packer.size))
+
+    def _compile_parse(self, gen, context):
+        if gen.take_embed_target() is not None:
+            raise NotImplementedError()
+        raw = gen.var('raw')
+        gen.emit('%s = %s(buf, pos)' % (raw, gen.bind(self.packer.unpack_from)))
+        gen.emit('pos += %d' % self.packer.size)
+        obj = gen.var('obj')
+        gen.emit('%s = %s(%s)' % (obj, gen.bind(self.make_record), raw))
+        return obj
+
+    def parse_record(self, data):
+        """ Parse a record from data: a buffer of exactly sizeof() bytes
+        """
+        try:
+            raw = self.packer.unpack(data)
+        except Exception as ex:
+            raise FieldError(ex)
+        return self.make_record(raw)
+
+    def make_record(self, raw):
+        """ Make a record from raw, the tuple of values unpacked by packer
+        """
+        record = self.record_class(*[get(raw) for get in self._field_getters])
+        for name, func in self._value_fields:
+            setattr(record, name, func(record))
+        return record
+
+    @classmethod
+    def _find_endianity(cls, subcons):
+        for sc in subcons:
+            if type(sc) is FormatField:
+                return cls._packer_format(sc)[0]
+            elif isinstance(sc, Struct):
+                endianity = cls._find_endianity(sc.subcons)
+            elif isinstance(sc, (MappingAdapter, MetaArray)):
+                endianity = cls._find_endianity([sc.subcon])
+            else:
+                continue
+            if endianity:
+                return endianity
+        return None
+
+    @classmethod
+    def _compile_struct(cls, struct, index):
+        """ Compile the subcons of struct. index is a one-element list holding
+            the position of the next raw value in the unpacked tuple; it's
+            advanced past the values consumed by the struct.
+
+            Returns (format, record class, field getters, value fields).
+        """
+        fmt = ''
+        fields = []
+        init_fields = []
+        getters = []
+        value_fields = []
+        for sc in struct.subcons:
+            if isinstance(sc, Value):
+                fields.append(sc.name)
+                value_fields.append((sc.name, sc.func))
+                continue
+            if isinstance(sc, PaddingAdapter):
+                fmt += '%dx' % sc.subcon.length
+                continue
+            if isinstance(sc, Struct) and type(sc) is Struct:
+                subfmt, subclass, subgetters, subvalues = \
+                    cls._compile_struct(sc, index)
+                fmt += subfmt
+                getter = cls._record_getter(subclass, subgetters, subvalues)
+            elif isinstance(sc, Buffered) and type(sc.subcon) is Struct:
+                fmt += cls._bitstruct_format(sc.subcon)
+                getter = cls._bitstruct_getter(sc.subcon, index[0])
+                index[0] += 1
+            else:
+                subfmt, getter = cls._compile_field(sc, index)
+                fmt += subfmt
+            if sc.name is not None:
+                fields.append(sc.name)
+                init_fields.append(sc.name)
+                getters.append(getter)
+        record_class = make_record_class(struct.name, fields, init_fields)
+        return fmt, record_class, getters, value_fields
+
+    @classmethod
+    def _compile_field(cls, sc, index):
+        """ Compile a FormatField, possibly mapped or in a fixed-size Array
+        """
+        if type(sc) is FormatField:
+            getter = itemgetter(index[0])
+            index[0] += 1
+            return cls._packer_format(sc)[1:], getter
+        elif isinstance(sc, MappingAdapter) and type(sc.subcon) is FormatField:
+            fmt, raw_getter = cls._compile_field(sc.subcon, index)
+            decode = sc._decode
+            return fmt, lambda raw: decode(raw_getter(raw), None)
+        elif isinstance(sc, MetaArray) and type(sc.subcon) is FormatField \
+                and not sc._is_flag(sc.FLAG_DYNAMIC):
+            count = sc.countfunc(None)
+            start = index[0]
+            index[0] += count
+            return (cls._packer_format(sc.subcon)[1:] * count,
+                    lambda raw: ListContainer(raw[start:start + count]))
+        raise TypeError("can't precompile %r" % sc)
+
+    @staticmethod
+    def _packer_format(formatfield):
+        fmt = formatfield.packer.format
+        return fmt if isinstance(fmt, str) else fmt.decode('ascii')
+
+    @staticmethod
+    def _record_getter(record_class, getters, value_fields):
+        def getter(raw):
+            record = record_class(*[get(raw) for get in getters])
+            for name, func in value_fields:
+                setattr(record, name, func(record))
+            return record
+        return getter
+
+    @staticmethod
+    def _bitstruct_format(struct):
+        width = 0
+        for sc in struct.subcons:
+            width += sc.subcon._sizeof(None)
+        if width != 8:
+            raise TypeError("can't precompile %r: only 8-bit BitStructs are "
+                            "supported" % struct)
+        return 'B'
+
+    @classmethod
+    def _bitstruct_getter(cls, struct, index):
+        """ Getter of a BitStruct of one byte. Bits are taken from the most
+            significant one, like construct's BitField does.
+        """
+        fields = []
+        shift = 8
+        for sc in struct.subcons:
+            decode = None
+            if isinstance(sc, MappingAdapter):
+                decode = sc._decode
+                sc = sc.subcon
+            if isinstance(sc, PaddingAdapter):
+                shift -= sc.subcon._sizeof(None)
+                continue
+            if not isinstance(sc, BitIntegerAdapter) or sc.swapped or sc.signed:
+                raise TypeError("can't precompile %r" % sc)
+            shift -= sc.width
+            fields.append((sc.name, shift, (1 << sc.width) - 1, decode))
+        record_class = make_record_class(struct.name, [f[0] for f in fields])
+
+        def getter(raw):
+            byte = raw[index]
+            values = []
+            for name, shift, mask, decode in fields:
+                value = (byte >> shift) & mask
+                values.append(value if decode is None else decode(value, None))
+            return record_class(*values)
+        return getter
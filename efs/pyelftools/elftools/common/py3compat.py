@@ -27,7 +27,10 @@ if PY3:
     ifilter = filter
 
     maxint = sys.maxsize
+
+    intern = sys.intern
 else:
+    import __builtin__
     import cStringIO
     StringIO = BytesIO = cStringIO.StringIO
 
@@ -44,6 +47,11 @@ else:
 
     maxint = sys.maxint
 
+    # The builtin intern only takes str: unicode objects (e.g. the result of
+    # decode()) are returned as they are
+    def intern(s):
+        return __builtin__.intern(s) if isinstance(s, str) else s
+
 
 def iterkeys(d):
     """Return an iterator over the keys of a dictionary."""
@@ -8,7 +8,7 @@
 #-------------------------------------------------------------------------------
 from contextlib import contextmanager
 from .exceptions import ELFParseError, ELFError, DWARFError
-from .py3compat import int2byte
+from .py3compat import int2byte, PY3
 from ..construct import ConstructError
 
 
@@ -25,10 +25,17 @@ def struct_parse(struct, stream, stream_pos=None):
         the parsing is done. Otherwise, the current position of the stream is
         used.
         Wraps the error thrown by construct with ELFParseError.
+
+        Structs are parsed from a BufferStream straight from its buffer (see
+        Construct.parse_from), without reading the data into bytes objects.
     """
     try:
         if stream_pos is not None:
             stream.seek(stream_pos)
+        if PY3 and isinstance(getattr(stream, 'buffer', None), memoryview):
+            obj, offset = struct.parse_from(stream.buffer, stream.tell())
+            stream.seek(offset)
+            return obj
         return struct.parse_stream(stream)
     except ConstructError as e:
         raise ELFParseError(str(e))
@@ -88,6 +95,24 @@ def preserve_stream_pos(stream):
     stream.seek(saved_pos)
 
 
+def get_stream_buffer(stream):
+    """ Get the whole data of a stream as a buffer that yields integers when
+        indexed, for the decoders reading straight from buffers (like those
+        of dwarf/leb128.py). Where possible, e.g. for a BufferStream or a
+        BytesIO on Python 3, the buffer shares the memory of the stream.
+        Otherwise the data is read into a bytearray.
+    """
+    if PY3:
+        if isinstance(getattr(stream, 'buffer', None), memoryview):
+            # BufferStream
+            return stream.buffer
+        if hasattr(stream, 'getbuffer'):
+            return stream.getbuffer()
+    with preserve_stream_pos(stream):
+        stream.seek(0)
+        return bytearray(stream.read())
+
+
 def roundup(num, bits):
     """ Round up a number to nearest multiple of 2^bits. The result is a number
         where the least significant bits passed in bits are 0.
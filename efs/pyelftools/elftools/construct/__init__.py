@@ -34,6 +34,7 @@ from .core import *
 from .adapters import *
 from .macros import *
 from .debug import Probe, Debugger
+from .profiler import ParseProfiler, profile_from_environment
 
 
 #===============================================================================
@@ -96,8 +97,8 @@ __all__ = [
     'NoneOfValidator', 'Octet', 'OnDemand', 'OnDemandPointer', 'OneOf',
     'OneOfValidator', 'OpenRange', 'Optional', 'OptionalGreedyRange',
     'OptionalGreedyRepeater', 'PaddedStringAdapter', 'Padding',
-    'PaddingAdapter', 'PaddingError', 'PascalString', 'Pass', 'Peek',
-    'Pointer', 'PrefixedArray', 'Probe', 'Range', 'RangeError', 'Reconfig',
+    'PaddingAdapter', 'PaddingError', 'ParseProfiler', 'PascalString', 'Pass',
+    'Peek', 'Pointer', 'PrefixedArray', 'Probe', 'Range', 'RangeError', 'Reconfig',
     'Rename', 'RepeatUntil', 'Repeater', 'Restream', 'SBInt16', 'SBInt32',
     'SBInt64', 'SBInt8', 'SLInt16', 'SLInt32', 'SLInt64', 'SLInt8', 'SNInt16',
     'SNInt32', 'SNInt64', 'SNInt8', 'Select', 'SelectError', 'Sequence',
@@ -108,3 +109,6 @@ __all__ = [
     'ULInt32', 'ULInt64', 'ULInt8', 'UNInt16', 'UNInt32', 'UNInt64', 'UNInt8',
     'Union', 'ValidationError', 'Validator', 'Value', "Magic",
 ]
+
+# Profile the parsing of the whole run if CONSTRUCT_PROFILE is set
+profile_from_environment()
@@ -1,4 +1,4 @@
-from .core import Adapter, AdaptationError, Pass
+from .core import Adapter, AdaptationError, Pass, RepeatUntil, StaticField
 from .lib import int_to_bin, bin_to_int, swap_bytes
 from .lib import FlagsContainer, HexString
 from .lib.py3compat import BytesIO, decodebytes
@@ -101,6 +101,12 @@ class MappingAdapter(Adapter):
             if self.decdefault is Pass:
                 return obj
             return self.decdefault
+    def _compile_decode(self, gen, value, context):
+        obj = gen.var()
+        gen.emit("try: %s = %s[%s]" % (obj, gen.bind(self.decoding), value))
+        gen.emit("except (KeyError, TypeError): %s = %s(%s, None)" % (obj,
+            gen.bind(self._decode), value))
+        return obj
 
 class FlagsAdapter(Adapter):
     """
@@ -151,6 +157,12 @@ class StringAdapter(Adapter):
         if self.encoding:
             obj = obj.decode(self.encoding)
         return obj
+    def _compile_decode(self, gen, value, context):
+        if not self.encoding:
+            return value
+        obj = gen.var()
+        gen.emit("%s = %s.decode(%r)" % (obj, value, self.encoding))
+        return obj
 
 class PaddedStringAdapter(Adapter):
     r"""
@@ -215,6 +227,10 @@ class LengthValueAdapter(Adapter):
         return (len(obj), obj)
     def _decode(self, obj, context):
         return obj[1]
+    def _compile_decode(self, gen, value, context):
+        obj = gen.var()
+        gen.emit("%s = %s[1]" % (obj, value))
+        return obj
 
 class CStringAdapter(StringAdapter):
     r"""
@@ -235,6 +251,21 @@ class CStringAdapter(StringAdapter):
         return StringAdapter._encode(self, obj, context) + self.terminators[0:1]
     def _decode(self, obj, context):
         return StringAdapter._decode(self, b''.join(obj[:-1]), context)
+    def _compile_parse(self, gen, context):
+        charfield = self.subcon.subcon
+        if not (type(self.subcon) is RepeatUntil and
+                type(charfield) is StaticField and charfield.length == 1):
+            return gen.decode(self, gen.parse(self.subcon, context), context)
+        # the characters are repeated until a terminator, as built by
+        # CString: the buffer is searched for the terminators instead
+        obj = gen.var()
+        gen.emit("%s, pos = parse_cstring(buf, pos, %s)" % (obj,
+            gen.bind(self.terminators)))
+        return StringAdapter._compile_decode(self, gen, obj, context)
+    def _compile_decode(self, gen, value, context):
+        obj = gen.var()
+        gen.emit("%s = b''.join(%s[:-1])" % (obj, value))
+        return StringAdapter._compile_decode(self, gen, obj, context)
 
 class TunnelAdapter(Adapter):
     """
@@ -332,6 +363,10 @@ class ConstAdapter(Adapter):
         if obj != self.value:
             raise ConstError("expected %r, found %r" % (self.value, obj))
         return obj
+    def _compile_decode(self, gen, value, context):
+        gen.emit("if %s != %s: %s(%s, None)" % (value, gen.bind(self.value),
+            gen.bind(self._decode), value))
+        return value
 
 class SlicingAdapter(Adapter):
     """
@@ -373,6 +408,10 @@ class IndexingAdapter(Adapter):
         return [None] * self.index + [obj]
     def _decode(self, obj, context):
         return obj[self.index]
+    def _compile_decode(self, gen, value, context):
+        obj = gen.var()
+        gen.emit("%s = %s[%d]" % (obj, value, self.index))
+        return obj
 
 class PaddingAdapter(Adapter):
     r"""
@@ -397,6 +436,10 @@ class PaddingAdapter(Adapter):
             if obj != expected:
                 raise PaddingError("expected %r, found %r" % (expected, obj))
         return obj
+    def _compile_decode(self, gen, value, context):
+        if self.strict:
+            return Adapter._compile_decode(self, gen, value, context)
+        return value
 
 
 #===============================================================================
@@ -0,0 +1,309 @@
+"""
+Compilation of construct trees into specialized parser functions.
+See Construct.compile().
+"""
+import keyword
+import re
+import struct
+from contextlib import contextmanager
+from struct import Struct as Packer
+
+from .core import (Adapter, FormatField, ConstructError,
+    FieldError, ArrayError, SwitchError, _format_leaf, _defining_class)
+from .lib import Container, ListContainer, BufferReader
+
+
+_identifier_re = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# The errors of the compiled code turned into a FieldError, like the
+# FormatFields and StaticFields do when parsing from a stream
+_buffer_errors = (struct.error, IndexError)
+
+# The parsers of bare FormatFields, by format: such fields are often created
+# on the fly (e.g. UBInt32("")), and don't need compiling each time
+_format_parsers = {}
+
+
+def compile_parser(construct):
+    """
+    Compile a parser function for the given construct (see
+    Construct.compile). Returns None if the construct tree holds a construct
+    that can't be compiled.
+    """
+    if type(construct) is FormatField:
+        key = construct.packer.format
+        if key not in _format_parsers:
+            _format_parsers[key] = CodeGenerator().make_parser(construct)
+        return _format_parsers[key]
+    gen = CodeGenerator()
+    try:
+        return gen.make_parser(construct)
+    except NotImplementedError:
+        return None
+
+
+class _Context(object):
+    """
+    A context of the generated code: the variable holding the Container and
+    the one holding its __dict__, where the values of fields are stored.
+    The code maintaining a context is dropped if nothing uses it.
+    """
+    __slots__ = ["var", "dictvar", "parent", "used"]
+    def __init__(self, var, dictvar, parent):
+        self.var = var
+        self.dictvar = dictvar
+        self.parent = parent
+        self.used = False
+
+
+class CodeGenerator(object):
+    """
+    Generates the source of a parser function for a construct tree, and
+    executes it.
+
+    Constructs generate the code parsing them in their _compile_parse(gen,
+    context) method. It emits lines reading from the buffer `buf` at the
+    offset held by the local variable `pos`, advances `pos` past the data,
+    and returns the expression of the parsed object (usually a local
+    variable). context is the _Context of the enclosing construct; the
+    constructs calling user functions with the context must mark it as
+    used with use_context().
+    """
+    def __init__(self):
+        # The globals of the generated function: bound constants, functions
+        # and constructs
+        self.namespace = dict(
+            Container = Container,
+            ListContainer = ListContainer,
+            FieldError = FieldError,
+            ArrayError = ArrayError,
+            SwitchError = SwitchError,
+            ConstructError = ConstructError,
+            buffer_errors = _buffer_errors,
+            array_errors = (ConstructError,) + _buffer_errors,
+            parse_cstring = parse_cstring,
+            BufferReader = BufferReader,
+        )
+        self._bound = {}
+        self._lines = []
+        self._indent = 0
+        self._counter = 0
+        self._embed_target = None
+
+    #===========================================================================
+    # code emission
+    #===========================================================================
+    def var(self, prefix = "v"):
+        """returns a new local variable name"""
+        self._counter += 1
+        return "%s%d" % (prefix, self._counter)
+
+    def bind(self, value, prefix = "k"):
+        """binds a value to a global name of the generated code"""
+        key = id(value)
+        if key in self._bound:
+            return self._bound[key][0]
+        self._counter += 1
+        name = "%s%d" % (prefix, self._counter)
+        self.namespace[name] = value
+        # the value is kept alive along with its name, so its id isn't reused
+        self._bound[key] = (name, value)
+        return name
+
+    def emit(self, line, context = None):
+        """
+        emits a line of code. if context is given, the line only maintains
+        it, and is dropped if the context isn't used.
+        """
+        self._lines.append((self._indent, line, context))
+
+    @contextmanager
+    def indented(self):
+        self._indent += 1
+        try:
+            yield
+        finally:
+            self._indent -= 1
+
+    #===========================================================================
+    # contexts
+    #===========================================================================
+    def new_context(self, parent):
+        """creates the nested context of a struct, like Container(_ = parent)"""
+        context = _Context(self.var("ctx"), self.var("ctxd"), parent)
+        self.emit("%s = Container(_ = %s)" % (context.var, parent.var),
+            context)
+        self.emit("%s = %s.__dict__" % (context.dictvar, context.var), context)
+        return context
+
+    def use_context(self, context):
+        """marks a context (and the contexts it's nested in) as used"""
+        while context is not None and not context.used:
+            context.used = True
+            context = context.parent
+
+    def store(self, context, name, value):
+        """stores the value of a field into the context"""
+        self.emit("%s[%r] = %s" % (context.dictvar, name, value), context)
+
+    def set_embed_target(self, target):
+        """sets the (fields, context) an embedded struct parses into"""
+        self._embed_target = target
+
+    def take_embed_target(self):
+        target = self._embed_target
+        self._embed_target = None
+        return target
+
+    #===========================================================================
+    # compilation
+    #===========================================================================
+    def parse(self, construct, context):
+        """
+        generates the code parsing construct, and returns the expression of
+        the parsed object. constructs that can't be compiled are parsed with
+        their _parse(); raises NotImplementedError if that isn't possible
+        either (the construct is embedded).
+        """
+        if _overrides(type(construct), "_parse", "_compile_parse"):
+            # a subclass with its own parsing; the compilation inherited from
+            # its base class doesn't apply
+            return self.parse_stream(construct, context)
+        mark = len(self._lines)
+        embedded = self._embed_target is not None
+        try:
+            return construct._compile_parse(self, context)
+        except NotImplementedError:
+            if embedded:
+                raise
+            # drop the code generated for its subconstructs
+            del self._lines[mark:]
+            self._embed_target = None
+            return self.parse_stream(construct, context)
+
+    def parse_stream(self, construct, context):
+        """
+        generates the code parsing construct with its _parse() from a
+        BufferReader over the buffer
+        """
+        if self._embed_target is not None:
+            # _parse() can't add the fields of an embedded struct to the
+            # generated code's
+            raise NotImplementedError("can't compile %r" % (construct,))
+        self.use_context(context)
+        stream = self.var("stream")
+        obj = self.var()
+        self.emit("%s = BufferReader(buf, pos)" % stream)
+        self.emit("%s = %s._parse(%s, %s)" % (obj, self.bind(construct),
+            stream, context.var))
+        self.emit("pos = %s.tell()" % stream)
+        return obj
+
+    def decode(self, adapter, value, context):
+        """generates the code decoding value with the given adapter"""
+        if _overrides(type(adapter), "_decode", "_compile_decode"):
+            return Adapter._compile_decode(adapter, self, value, context)
+        return adapter._compile_decode(self, value, context)
+
+    def make_parser(self, construct):
+        """generates and executes the parser function of construct"""
+        root = _Context("context", "contextd", None)
+        self.emit("if context is None: context = Container()", root)
+        self.emit("contextd = context.__dict__", root)
+        result = self.parse(construct, root)
+        source = ["def parse(buf, pos, context = None):"]
+        source.append("    try:")
+        for indent, line, context in self._lines:
+            if context is not None and not context.used:
+                continue
+            source.append("    " * (indent + 2) + line)
+        source.append("        return %s, pos" % (result,))
+        source.append("    except buffer_errors as ex:")
+        source.append("        raise FieldError(ex)")
+        source = "\n".join(source) + "\n"
+
+        namespace = self.namespace
+        code = compile(source, "<compiled %s>" % (construct,), "exec")
+        exec(code, namespace)
+        parser = namespace["parse"]
+        parser.source = source
+        return parser
+
+    def format_leaf(self, construct):
+        """
+        if construct is a FormatField, possibly wrapped in adapters and
+        renamed, returns the (adapters, formatfield) pair, the adapters
+        ordered from the outermost. otherwise returns None.
+        """
+        return _format_leaf(construct)
+
+    def unpack_formats(self, formatfields):
+        """
+        generates the code unpacking consecutive FormatFields (of the same
+        endianity) at once, and returns the variables of their values
+        """
+        formats = [_packer_format(ff) for ff in formatfields]
+        packer = Packer(formats[0][0] + "".join(f[1:] for f in formats))
+        values = [self.var() for _ in formatfields]
+        self.emit("%s, = %s(buf, pos)" % (", ".join(values),
+            self.bind(packer.unpack_from, "unpack")))
+        self.emit("pos += %d" % packer.size)
+        return values
+
+    def make_fields(self, fields, factory = "Container"):
+        """
+        returns the expression creating a Container (or calling another
+        factory) with the given list of (name, value) pairs as keywords
+        """
+        names = [name for name, _ in fields]
+        if (len(set(names)) == len(names) and
+                all(_identifier_re.match(name) and not keyword.iskeyword(name)
+                    for name in names)):
+            return "%s(%s)" % (factory, ", ".join(
+                "%s = %s" % (name, value) for name, value in fields))
+        return "%s(**{%s})" % (factory, ", ".join(
+            "%r: %s" % (name, value) for name, value in fields))
+
+
+def parse_cstring(buf, pos, terminators):
+    """
+    parses a string ending with one of the terminator characters from buf at
+    pos, like CString. returns the string (without the terminator) and the
+    offset following the terminator.
+    """
+    if len(terminators) == 1:
+        # the buffer is searched by chunks for the terminator
+        start = pos
+        while True:
+            chunk = buf[start:start + 64].tobytes()
+            index = chunk.find(terminators)
+            if index >= 0:
+                end = start + index
+                break
+            if len(chunk) < 64:
+                raise ArrayError("missing terminator")
+            start += 64
+    else:
+        end = pos
+        while True:
+            char = buf[end:end + 1].tobytes()
+            if not char:
+                raise ArrayError("missing terminator")
+            if char in terminators:
+                break
+            end += 1
+    return buf[pos:end].tobytes(), end + 1
+
+def _packer_format(formatfield):
+    fmt = formatfield.packer.format
+    return fmt if isinstance(fmt, str) else fmt.decode("ascii")
+
+def _overrides(cls, attr, compile_attr):
+    """
+    whether cls (or a base class) overrides attr below the class defining
+    compile_attr
+    """
+    defining = _defining_class(cls, attr)
+    compiling = _defining_class(cls, compile_attr)
+    return (compiling is None or
+        (defining is not compiling and issubclass(defining, compiling)))
@@ -1,7 +1,8 @@
-from struct import Struct as Packer
+from struct import Struct as Packer, unpack
 
 from .lib.py3compat import BytesIO, advance_iterator, bchr
-from .lib import Container, ListContainer, LazyContainer
+from .lib import (Container, ListContainer, LazyContainer, BufferReader,
+    make_record_class)
 
 
 #===============================================================================
@@ -51,6 +52,7 @@ class Construct(object):
      * _parse()
      * _build()
      * _sizeof()
+     * _compile_parse() (optional, see compile())
 
     There is also a flag API:
 
@@ -89,7 +91,7 @@ class Construct(object):
     FLAG_EMBED                 = 0x0004
     FLAG_NESTING               = 0x0008
 
-    __slots__ = ["name", "conflags"]
+    __slots__ = ["name", "conflags", "_compiled"]
     def __init__(self, name, flags = 0):
         if name is not None:
             if type(name) is not str:
@@ -154,6 +156,9 @@ class Construct(object):
         for name in slots:
             if hasattr(self, name):
                 attrs[name] = getattr(self, name)
+        # the compiled parser is not part of the state: a copy may be
+        # reconfigured
+        attrs.pop("_compiled", None)
         return attrs
 
     def __setstate__(self, attrs):
@@ -179,6 +184,28 @@ class Construct(object):
 
         return self.parse_stream(BytesIO(data))
 
+    def parse_from(self, buffer, offset = 0):
+        """
+        Parse a buffer at the given offset, without wrapping it in a stream.
+
+        bytes, bytearrays, mmaps, memoryviews, and other objects supporting
+        the buffer protocol can be parsed with this method. Fields are
+        unpacked in place (see compile()), and the subconstructs that can't
+        be compiled are parsed from a BufferReader over the buffer.
+
+        Returns the parsed object with the offset following it.
+        """
+
+        buf = memoryview(buffer)
+        if buf.format != "B":
+            buf = buf.cast("B")
+        parser = self.compile()
+        if parser is None:
+            stream = BufferReader(buf, offset)
+            obj = self._parse(stream, Container())
+            return obj, stream.tell()
+        return parser(buf, offset)
+
     def parse_stream(self, stream):
         """
         Parse a stream.
@@ -196,6 +223,38 @@ class Construct(object):
 
         raise NotImplementedError()
 
+    def compile(self):
+        """
+        Compile a parser specialized for this construct.
+
+        The construct tree is translated to the source of a Python function
+        that parses from a buffer in straight-line code, instead of calling
+        _parse() on every subconstruct and copying contexts. The function is
+        created on the first call, and cached.
+
+        The function takes a memoryview and an offset in it, and returns the
+        parsed object with the offset following it. The subconstructs that
+        can't be compiled are parsed with their _parse() from a BufferReader
+        over the memoryview. None is returned instead if the tree can't be
+        compiled at all (e.g. an embedded struct can't be compiled).
+        """
+
+        try:
+            return self._compiled
+        except AttributeError:
+            from .compiler import compile_parser
+            self._compiled = compile_parser(self)
+            return self._compiled
+
+    def _compile_parse(self, gen, context):
+        """
+        Override me in your subclass to support compile(): emit the code
+        parsing this construct with the CodeGenerator gen, and return the
+        expression of the parsed object (see compiler.CodeGenerator).
+        """
+
+        raise NotImplementedError()
+
     def build(self, obj):
         """
         Build an object in memory.
@@ -259,6 +318,8 @@ class Subconstruct(Construct):
         self.subcon = subcon
     def _parse(self, stream, context):
         return self.subcon._parse(stream, context)
+    def _compile_parse(self, gen, context):
+        return gen.parse(self.subcon, context)
     def _build(self, obj, stream, context):
         self.subcon._build(obj, stream, context)
     def _sizeof(self, context):
@@ -274,6 +335,19 @@ class Adapter(Subconstruct):
     __slots__ = []
     def _parse(self, stream, context):
         return self._decode(self.subcon._parse(stream, context), context)
+    def _compile_parse(self, gen, context):
+        return gen.decode(self, gen.parse(self.subcon, context), context)
+    def _compile_decode(self, gen, value, context):
+        """
+        Emit the code decoding value, and return the expression of the
+        decoded object. By default, _decode() is called; adapters that don't
+        use the context may inline their decoding instead.
+        """
+        gen.use_context(context)
+        obj = gen.var()
+        gen.emit("%s = %s(%s, %s)" % (obj, gen.bind(self._decode), value,
+            context.var))
+        return obj
     def _build(self, obj, stream, context):
         self.subcon._build(self._encode(obj, context), stream, context)
     def _decode(self, obj, context):
@@ -293,6 +367,15 @@ def _read_stream(stream, length):
         raise FieldError("expected %d, found %d" % (length, len(data)))
     return data
 
+def _compile_read(gen, length):
+    """emits the code reading length bytes, like _read_stream"""
+    data = gen.var()
+    gen.emit("%s = buf[pos:pos + %s].tobytes()" % (data, length))
+    gen.emit("if len(%s) != %s: raise FieldError('expected %%d, found %%d' "
+        "%% (%s, len(%s)))" % (data, length, length, data))
+    gen.emit("pos += %s" % length)
+    return data
+
 def _write_stream(stream, length, data):
     if length < 0:
         raise ValueError("length must be >= 0", length)
@@ -314,6 +397,8 @@ class StaticField(Construct):
         self.length = length
     def _parse(self, stream, context):
         return _read_stream(stream, self.length)
+    def _compile_parse(self, gen, context):
+        return _compile_read(gen, repr(self.length))
     def _build(self, obj, stream, context):
         _write_stream(stream, self.length, obj)
     def _sizeof(self, context):
@@ -351,6 +436,8 @@ class FormatField(StaticField):
             return self.packer.unpack(_read_stream(stream, self.length))[0]
         except Exception as ex:
             raise FieldError(ex)
+    def _compile_parse(self, gen, context):
+        return gen.unpack_formats([self])[0]
     def _build(self, obj, stream, context):
         try:
             _write_stream(stream, self.length, self.packer.pack(obj))
@@ -383,6 +470,14 @@ class MetaField(Construct):
         self._set_flag(self.FLAG_DYNAMIC)
     def _parse(self, stream, context):
         return _read_stream(stream, self.lengthfunc(context))
+    def _compile_parse(self, gen, context):
+        gen.use_context(context)
+        length = gen.var("length")
+        gen.emit("%s = %s(%s)" % (length, gen.bind(self.lengthfunc),
+            context.var))
+        gen.emit("if %s < 0: raise ValueError('length must be >= 0', %s)" % (
+            length, length))
+        return _compile_read(gen, length)
     def _build(self, obj, stream, context):
         _write_stream(stream, self.lengthfunc(context), obj)
     def _sizeof(self, context):
@@ -392,6 +487,140 @@ class MetaField(Construct):
 #===============================================================================
 # arrays and repeaters
 #===============================================================================
+class _BulkElements(object):
+    """
+    The elements of an array that are unpacked at once, instead of parsing
+    them one by one: FormatFields, possibly wrapped in adapters (like Enums),
+    or Structs made only of those. See create().
+    """
+    __slots__ = ["packer", "array_format", "struct", "names", "decoders"]
+
+    @classmethod
+    def create(cls, subcon):
+        """
+        returns the _BulkElements of the arrays of subcon, or None if its
+        elements must be parsed one by one
+        """
+        if type(subcon) is Struct:
+            subcons = subcon.subcons
+            names = [sc.name for sc in subcons]
+            if (not subcons or None in names or
+                    len(set(names)) != len(names)):
+                return None
+            struct = subcon
+        else:
+            subcons = [subcon]
+            names = [None]
+            struct = None
+        leaves = [_format_leaf(sc) for sc in subcons]
+        if None in leaves:
+            return None
+        formats = []
+        for _, formatfield in leaves:
+            fmt = formatfield.packer.format
+            formats.append(fmt if isinstance(fmt, str) else fmt.decode("ascii"))
+        if len(set(fmt[0] for fmt in formats)) != 1:
+            return None
+        self = cls()
+        self.packer = Packer(formats[0][0] + "".join(f[1:] for f in formats))
+        # the format of a number of FormatFields, like "<%dH"
+        self.array_format = formats[0][0] + "%d" + formats[0][1:]
+        self.struct = struct
+        self.names = names
+        # the adapters of each field, innermost first
+        self.decoders = [adapters[::-1] for adapters, _ in leaves]
+        return self
+
+    def parse(self, stream, count, context):
+        """parses an array of count elements"""
+        size = self.packer.size
+        count = max(count, 0)
+        data = stream.read(size * count) if count > 0 else b""
+        if len(data) != size * count:
+            raise ArrayError("expected %d, found %d" % (count,
+                len(data) // size), FieldError("expected %d, found %d" % (
+                size, len(data) % size)))
+        obj = ListContainer()
+        try:
+            self.decode(data, context, obj)
+        except ConstructError as ex:
+            raise ArrayError("expected %d, found %d" % (count, len(obj)), ex)
+        return obj
+
+    def parse_from(self, buf, pos, count, context):
+        """parses an array of count elements from buf at pos"""
+        return self.parse(BufferReader(buf, pos), count, context), \
+            pos + self.packer.size * max(count, 0)
+
+    def decode(self, data, context, obj):
+        """
+        unpacks the elements of data (a whole number of them), and appends
+        them to obj
+        """
+        if self.struct is None:
+            values = unpack(self.array_format % (len(data) // self.packer.size),
+                data)
+            decoders = self.decoders[0]
+            if not decoders:
+                obj.extend(values)
+                return
+            for value in values:
+                for decoder in decoders:
+                    value = decoder._decode(value, context)
+                obj.append(value)
+            return
+        struct = self.struct
+        size = self.packer.size
+        factory = struct.record_class or Container
+        if struct.nested and not any(self.decoders):
+            names = self.names
+            for i in range(0, len(data), size):
+                obj.append(factory(**dict(zip(names,
+                    self.packer.unpack_from(data, i)))))
+            return
+        # the adapters are passed the context Struct would create
+        fields = list(zip(self.names, self.decoders))
+        for i in range(0, len(data), size):
+            values = self.packer.unpack_from(data, i)
+            subcontext = Container(_ = context) if struct.nested else context
+            subobj = {}
+            for (name, decoders), value in zip(fields, values):
+                for decoder in decoders:
+                    value = decoder._decode(value, subcontext)
+                subobj[name] = value
+                subcontext[name] = value
+            obj.append(factory(**subobj))
+
+def _format_leaf(construct):
+    """
+    if construct is a FormatField, possibly renamed and wrapped in adapters
+    that only decode it, returns the (adapters, formatfield) pair, the
+    adapters ordered from the outermost. otherwise returns None. used by the
+    bulk arrays and the compiler (see CodeGenerator.format_leaf).
+    """
+    adapters = []
+    while True:
+        cls = type(construct)
+        if cls is FormatField:
+            return adapters, construct
+        elif isinstance(construct, Adapter):
+            # the adapters with their own parsing (or compiled parsing) do
+            # more than decoding the value of their subcon
+            if (_defining_class(cls, "_parse") is not Adapter or
+                    _defining_class(cls, "_compile_parse") is not Adapter):
+                return None
+            adapters.append(construct)
+        elif cls is not Reconfig or construct.conflags & Construct.FLAG_EMBED:
+            return None
+        construct = construct.subcon
+
+def _defining_class(cls, attr):
+    """returns the class of the mro of cls that defines attr, or None"""
+    for c in cls.__mro__:
+        if attr in c.__dict__:
+            return c
+    return None
+
 class MetaArray(Subconstruct):
     """
     An array (repeater) of a meta-count. The array will iterate exactly
@@ -405,17 +634,23 @@ class MetaArray(Subconstruct):
 
     Example:
     MetaArray(lambda ctx: 5, UBInt8("foo"))
+
+    Arrays of FormatFields (possibly mapped, like Enums) and of Structs of
+    them are unpacked at once.
     """
-    __slots__ = ["countfunc"]
+    __slots__ = ["countfunc", "_bulk"]
     def __init__(self, countfunc, subcon):
         Subconstruct.__init__(self, subcon)
         self.countfunc = countfunc
+        self._bulk = _BulkElements.create(subcon)
         self._clear_flag(self.FLAG_COPY_CONTEXT)
         self._set_flag(self.FLAG_DYNAMIC)
     def _parse(self, stream, context):
+        count = self.countfunc(context)
+        if self._bulk is not None:
+            return self._bulk.parse(stream, count, context)
         obj = ListContainer()
         c = 0
-        count = self.countfunc(context)
         try:
             if self.subcon.conflags & self.FLAG_COPY_CONTEXT:
                 while c < count:
@@ -428,6 +663,89 @@ class MetaArray(Subconstruct):
         except ConstructError as ex:
             raise ArrayError("expected %d, found %d" % (count, c), ex)
         return obj
+    def _compile_parse(self, gen, context):
+        if self.subcon.conflags & self.FLAG_COPY_CONTEXT:
+            raise NotImplementedError()
+        count = gen.var("count")
+        if self._is_flag(self.FLAG_DYNAMIC):
+            gen.use_context(context)
+            gen.emit("%s = %s(%s)" % (count, gen.bind(self.countfunc),
+                context.var))
+        else:
+            # a fixed count (see Array)
+            gen.emit("%s = %d" % (count, self.countfunc(None)))
+        obj = gen.var("obj")
+        if self._bulk is not None:
+            return self._compile_bulk(gen, context, count, obj)
+        gen.emit("%s = ListContainer()" % obj)
+        gen.emit("try:")
+        with gen.indented():
+            gen.emit("for _ in range(%s):" % count)
+            with gen.indented():
+                subobj = gen.parse(self.subcon, context)
+                gen.emit("%s.append(%s)" % (obj, subobj))
+        gen.emit("except array_errors as ex:")
+        with gen.indented():
+            gen.emit("raise ArrayError('expected %%d, found %%d' %% (%s, "
+                "len(%s)), ex)" % (count, obj))
+        return obj
+    def _compile_bulk(self, gen, context, count, obj):
+        bulk = self._bulk
+        plain = (not any(bulk.decoders) and
+            (bulk.struct is None or bulk.struct.nested))
+        if plain:
+            ctx = "None"
+        else:
+            # the adapters (or the fields of an unnested struct) use the
+            # context
+            gen.use_context(context)
+            ctx = context.var
+        if not hasattr(bulk.packer, "iter_unpack") or plain:
+            gen.emit("%s, pos = %s(buf, pos, %s, %s)" % (obj,
+                gen.bind(bulk.parse_from), count, ctx))
+            return obj
+        # the elements are unpacked at once, and decoded by compiled code
+        data = gen.var("data")
+        gen.emit("%s = buf[pos:pos + %d * max(%s, 0)]" % (data,
+            bulk.packer.size, count))
+        gen.emit("if len(%s) != %d * max(%s, 0): %s(buf, pos, %s, %s)" % (
+            data, bulk.packer.size, count, gen.bind(bulk.parse_from), count,
+            ctx))
+        gen.emit("pos += len(%s)" % data)
+        gen.emit("%s = ListContainer()" % obj)
+        values = [gen.var() for _ in bulk.names]
+        gen.emit("try:")
+        with gen.indented():
+            gen.emit("for %s, in %s(%s):" % (", ".join(values),
+                gen.bind(bulk.packer.iter_unpack), data))
+            with gen.indented():
+                if bulk.struct is None:
+                    subcontext = context
+                elif bulk.struct.nested:
+                    subcontext = gen.new_context(context)
+                else:
+                    subcontext = context
+                fields = []
+                for name, decoders, value in zip(bulk.names, bulk.decoders,
+                        values):
+                    for decoder in decoders:
+                        value = gen.decode(decoder, value, subcontext)
+                    fields.append((name, value))
+                    if name is not None:
+                        gen.store(subcontext, name, value)
+                if bulk.struct is None:
+                    subobj = fields[0][1]
+                elif bulk.struct.record_class is not None:
+                    subobj = gen.make_fields(fields,
+                        gen.bind(bulk.struct.record_class, "record"))
+                else:
+                    subobj = gen.make_fields(fields)
+                gen.emit("%s.append(%s)" % (obj, subobj))
+        gen.emit("except array_errors as ex:")
+        with gen.indented():
+            gen.emit("raise ArrayError('expected %%d, found %%d' %% (%s, "
+                "len(%s)), ex)" % (count, obj))
+        return obj
     def _build(self, obj, stream, context):
         count = self.countfunc(context)
         if len(obj) != count:
@@ -484,14 +802,17 @@ class Range(Subconstruct):
     construct.core.RangeError: expected 3..7, found 8
     """
 
-    __slots__ = ["mincount", "maxcout"]
+    __slots__ = ["mincount", "maxcout", "_bulk"]
     def __init__(self, mincount, maxcout, subcon):
         Subconstruct.__init__(self, subcon)
         self.mincount = mincount
         self.maxcout = maxcout
+        self._bulk = _BulkElements.create(subcon)
         self._clear_flag(self.FLAG_COPY_CONTEXT)
         self._set_flag(self.FLAG_DYNAMIC)
     def _parse(self, stream, context):
+        if self._bulk is not None:
+            return self._parse_bulk(stream, context)
         obj = ListContainer()
         c = 0
         try:
@@ -511,6 +832,33 @@ class Range(Subconstruct):
                     (self.mincount, self.maxcout, c), ex)
             stream.seek(pos)
         return obj
+    def _parse_bulk(self, stream, context):
+        # the elements are unpacked by chunks (GreedyRange has no maximal
+        # count), until one is incomplete or fails to decode
+        obj = ListContainer()
+        size = self._bulk.packer.size
+        error = None
+        while len(obj) < self.maxcout:
+            count = min(self.maxcout - len(obj), 1024)
+            pos = stream.tell()
+            data = stream.read(size * count)
+            complete = len(data) // size
+            parsed = len(obj)
+            try:
+                self._bulk.decode(data[:complete * size], context, obj)
+            except ConstructError as ex:
+                error = ex
+            parsed = len(obj) - parsed
+            if parsed < count:
+                stream.seek(pos + parsed * size)
+                if error is None:
+                    error = FieldError("expected %d, found %d" % (size,
+                        len(data) - parsed * size))
+                break
+        if len(obj) < self.mincount:
+            raise RangeError("expected %d to %d, found %d" %
+                (self.mincount, self.maxcout, len(obj)), error)
+        return obj
     def _build(self, obj, stream, context):
         if len(obj) < self.mincount or len(obj) > self.maxcout:
             raise RangeError("expected %d to %d, found %d" %
@@ -577,6 +925,24 @@ class RepeatUntil(Subconstruct):
         except ConstructError as ex:
             raise ArrayError("missing terminator", ex)
         return obj
+    def _compile_parse(self, gen, context):
+        if self.subcon.conflags & self.FLAG_COPY_CONTEXT:
+            raise NotImplementedError()
+        gen.use_context(context)
+        obj = gen.var("obj")
+        gen.emit("%s = []" % obj)
+        gen.emit("try:")
+        with gen.indented():
+            gen.emit("while True:")
+            with gen.indented():
+                subobj = gen.parse(self.subcon, context)
+                gen.emit("%s.append(%s)" % (obj, subobj))
+                gen.emit("if %s(%s, %s): break" % (gen.bind(self.predicate),
+                    subobj, context.var))
+        gen.emit("except array_errors as ex:")
+        with gen.indented():
+            gen.emit("raise ArrayError('missing terminator', ex)")
+        return obj
     def _build(self, obj, stream, context):
         terminated = False
         if self.subcon.conflags & self.FLAG_COPY_CONTEXT:
@@ -613,6 +979,10 @@ class Struct(Construct):
     * nested - a keyword-only argument that indicates whether this struct
       creates a nested context. The default is True. This parameter is
       considered "advanced usage", and may be removed in the future.
+    * record - a keyword-only argument that selects the fast mode: the struct
+      is parsed into instances of a Record class generated for it (see
+      make_record_class), which keep the fields in __slots__, instead of
+      Containers. The subconstructs can't be embedded. The default is False.
 
     Example:
     Struct("foo",
@@ -622,19 +992,32 @@ class Struct(Construct):
         UBInt8("third_element"),
     )
     """
-    __slots__ = ["subcons", "nested"]
+    __slots__ = ["subcons", "nested", "record_class"]
     def __init__(self, name, *subcons, **kw):
         self.nested = kw.pop("nested", True)
+        record = kw.pop("record", False)
         if kw:
-            raise TypeError("the only keyword argument accepted is 'nested'", kw)
+            raise TypeError("the only keyword arguments accepted are "
+                "'nested' and 'record'", kw)
         Construct.__init__(self, name)
         self.subcons = subcons
         self._inherit_flags(*subcons)
         self._clear_flag(self.FLAG_EMBED)
+        self.record_class = None
+        if record:
+            if any(sc.conflags & self.FLAG_EMBED for sc in subcons):
+                raise ValueError("a record struct can't embed subconstructs")
+            fields = []
+            for sc in subcons:
+                if sc.name is not None and sc.name not in fields:
+                    fields.append(sc.name)
+            self.record_class = make_record_class(name or "Record", fields)
     def _parse(self, stream, context):
         if "<obj>" in context:
             obj = context["<obj>"]
             del context["<obj>"]
+        elif self.record_class is not None:
+            return self._parse_record(stream, context)
         else:
             obj = Container()
             if self.nested:
@@ -649,6 +1032,78 @@ class Struct(Construct):
                     obj[sc.name] = subobj
                     context[sc.name] = subobj
         return obj
+    def _parse_record(self, stream, context):
+        if self.nested:
+            context = Container(_ = context)
+        fields = {}
+        for sc in self.subcons:
+            subobj = sc._parse(stream, context)
+            if sc.name is not None:
+                fields[sc.name] = subobj
+                context[sc.name] = subobj
+        return self.record_class(**fields)
+    def _compile_parse(self, gen, context):
+        target = gen.take_embed_target()
+        if target is not None:
+            obj, context = target
+        else:
+            if self.nested:
+                context = gen.new_context(context)
+            if any(sc.conflags & self.FLAG_EMBED for sc in self.subcons):
+                # the embedded structs add fields, so they're collected in a
+                # dict
+                obj = gen.var("obj")
+                gen.emit("%s = {}" % obj)
+            else:
+                obj = None
+        fields = []
+        def add_field(sc, value):
+            if sc.name is not None:
+                if obj is None:
+                    fields.append((sc.name, value))
+                else:
+                    gen.emit("%s[%r] = %s" % (obj, sc.name, value))
+                gen.store(context, sc.name, value)
+        subcons = list(self.subcons)
+        while subcons:
+            sc = subcons.pop(0)
+            if sc.conflags & self.FLAG_EMBED:
+                gen.set_embed_target((obj, context))
+                gen.parse(sc, context)
+                gen.take_embed_target()
+                continue
+            leaf = gen.format_leaf(sc)
+            if leaf is None:
+                add_field(sc, gen.parse(sc, context))
+            else:
+                # the following fields of the same byte order are unpacked
+                # at once
+                leaves = [(sc, leaf)]
+                while subcons and not subcons[0].conflags & self.FLAG_EMBED:
+                    leaf = gen.format_leaf(subcons[0])
+                    if (leaf is None or
+                            leaf[1].packer.format[:1] !=
+                            leaves[0][1][1].packer.format[:1]):
+                        break
+                    leaves.append((subcons.pop(0), leaf))
+                raws = gen.unpack_formats([ff for _, (_, ff) in leaves])
+                for (sc, (adapters, _)), value in zip(leaves, raws):
+                    for adapter in reversed(adapters):
+                        value = gen.decode(adapter, value, context)
+                    # stored before the adapters of the following fields
+                    # run, as they may read it from the context
+                    add_field(sc, value)
+        if target is not None:
+            return "None"
+        result = gen.var("obj")
+        if self.record_class is not None:
+            gen.emit("%s = %s" % (result, gen.make_fields(fields,
+                gen.bind(self.record_class, "record"))))
+        elif obj is None:
+            gen.emit("%s = %s" % (result, gen.make_fields(fields)))
+        else:
+            gen.emit("%s = Container(**%s)" % (result, obj))
+        return result
     def _build(self, obj, stream, context):
         if "<unnested>" in context:
             del context["<unnested>"]
@@ -709,6 +1164,20 @@ class Sequence(Struct):
                     obj.append(subobj)
                     context[sc.name] = subobj
         return obj
+    def _compile_parse(self, gen, context):
+        if (gen.take_embed_target() is not None or
+                any(sc.conflags & self.FLAG_EMBED for sc in self.subcons)):
+            raise NotImplementedError()
+        if self.nested:
+            context = gen.new_context(context)
+        obj = gen.var("obj")
+        gen.emit("%s = ListContainer()" % obj)
+        for sc in self.subcons:
+            subobj = gen.parse(sc, context)
+            if sc.name is not None:
+                gen.emit("%s.append(%s)" % (obj, subobj))
+                gen.store(context, sc.name, subobj)
+        return obj
     def _build(self, obj, stream, context):
         if "<unnested>" in context:
             del context["<unnested>"]
@@ -827,6 +1296,32 @@ class Switch(Construct):
             return key, obj
         else:
             return obj
+    def _compile_parse(self, gen, context):
+        gen.use_context(context)
+        target = gen.take_embed_target()
+        key = gen.var("key")
+        obj = gen.var("obj")
+        gen.emit("%s = %s(%s)" % (key, gen.bind(self.keyfunc), context.var))
+        branch = "if"
+        for casekey, case in self.cases.items():
+            gen.emit("%s %s == %s:" % (branch, key, gen.bind(casekey)))
+            with gen.indented():
+                gen.set_embed_target(target)
+                gen.emit("%s = %s" % (obj, gen.parse(case, context)))
+            branch = "elif"
+        gen.emit("else:" if self.cases else "if True:")
+        with gen.indented():
+            if self.default is self.NoDefault:
+                gen.emit("raise SwitchError('no default case defined')")
+            else:
+                gen.set_embed_target(target)
+                gen.emit("%s = %s" % (obj, gen.parse(self.default, context)))
+        gen.take_embed_target()
+        if self.include_key:
+            result = gen.var("obj")
+            gen.emit("%s = (%s, %s)" % (result, key, obj))
+            return result
+        return obj
     def _build(self, obj, stream, context):
         if self.include_key:
             key, obj = obj
@@ -1178,6 +1673,10 @@ class Anchor(Construct):
     __slots__ = []
     def _parse(self, stream, context):
         return stream.tell()
+    def _compile_parse(self, gen, context):
+        obj = gen.var()
+        gen.emit("%s = pos" % obj)
+        return obj
     def _build(self, obj, stream, context):
         context[self.name] = stream.tell()
     def _sizeof(self, context):
@@ -1205,6 +1704,11 @@ class Value(Construct):
         self._set_flag(self.FLAG_DYNAMIC)
     def _parse(self, stream, context):
         return self.func(context)
+    def _compile_parse(self, gen, context):
+        gen.use_context(context)
+        obj = gen.var()
+        gen.emit("%s = %s(%s)" % (obj, gen.bind(self.func), context.var))
+        return obj
     def _build(self, obj, stream, context):
         context[self.name] = self.func(context)
     def _sizeof(self, context):
@@ -1293,6 +1797,8 @@ class Pass(Construct):
     __slots__ = []
     def _parse(self, stream, context):
         pass
+    def _compile_parse(self, gen, context):
+        return "None"
     def _build(self, obj, stream, context):
         assert obj is None
     def _sizeof(self, context):
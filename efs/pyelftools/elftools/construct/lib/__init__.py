@@ -1,7 +1,8 @@
 from .binary import (
     int_to_bin, bin_to_int, swap_bytes, encode_bin, decode_bin)
 from .bitstream import BitStreamReader, BitStreamWriter
+from .buffer import BufferReader
 from .container import (Container, FlagsContainer, ListContainer,
-    LazyContainer)
+    LazyContainer, Record, make_record_class)
 from .hex import HexString, hexdump
 
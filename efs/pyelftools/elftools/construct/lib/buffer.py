@@ -0,0 +1,34 @@
+class BufferReader(object):
+    """
+    A read-only stream over a buffer (a memoryview of bytes), for parsing
+    with _parse() from a buffer and an offset in it (see Construct.parse_from).
+    """
+
+    __slots__ = ["buffer", "pos"]
+
+    def __init__(self, buffer, pos = 0):
+        self.buffer = buffer
+        self.pos = pos
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence = 0):
+        if whence == 1:
+            pos += self.pos
+        elif whence == 2:
+            pos += len(self.buffer)
+        if pos < 0:
+            raise ValueError("negative seek position", pos)
+        self.pos = pos
+
+    def read(self, count = -1):
+        start = self.pos
+        if count is None or count < 0:
+            end = len(self.buffer)
+        else:
+            end = min(start + count, len(self.buffer))
+        if end <= start:
+            return b""
+        self.pos = end
+        return self.buffer[start:end].tobytes()
@@ -2,6 +2,8 @@
 Various containers.
 """
 
+import keyword
+import re
 from collections import MutableMapping
 from pprint import pformat
 
@@ -62,7 +64,8 @@ class Container(MutableMapping):
         try:
             return self.__dict__ == other.__dict__
         except AttributeError:
-            return False
+            # a Record compares itself with containers
+            return NotImplemented if isinstance(other, Record) else False
 
     def __ne__(self, other):
         return not self == other
@@ -85,6 +88,112 @@ class Container(MutableMapping):
     def __str__(self):
         return "%s(%s)" % (self.__class__.__name__, str(self.__dict__))
 
+class Record(object):
+    """
+    Base class of the record classes generated by make_record_class.
+
+    A record is a low-overhead Container of a fixed set of fields: they are
+    kept in __slots__, so a record has no per-instance __dict__. Like a
+    Container, it allows both record["field"] and record.field access, and
+    compares equal to records and Containers of the same fields and values.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except (AttributeError, TypeError):
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return name in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def values(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def get(self, name, default = None):
+        if name in self.__slots__:
+            return getattr(self, name, default)
+        return default
+
+    # Rich comparisons.
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return (self.__slots__ == other.__slots__ and
+                self.values() == other.values())
+        elif isinstance(other, Container):
+            return dict(self.items()) == other.__dict__
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(tuple(self.values()))
+
+    # Copy interface.
+
+    def copy(self):
+        return self.__class__(**dict(self.items()))
+
+    __copy__ = copy
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, dict(self.items()))
+
+    def __str__(self):
+        return self.__pretty_str__()
+
+    def __pretty_str__(self, nesting = 1, indentation = "    "):
+        lines = [self.__class__.__name__ + ":"]
+        for name, value in self.items():
+            if hasattr(value, "__pretty_str__"):
+                text = value.__pretty_str__(nesting + 1, indentation)
+            else:
+                text = repr(value)
+            lines.append("%s%s = %s" % (indentation * nesting, name, text))
+        return "\n".join(lines)
+
+_identifier_re = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def make_record_class(name, fields, init_fields = None):
+    """
+    Generates a Record subclass named name, with the given field names as
+    __slots__. Its constructor takes the values of init_fields (all the
+    fields by default) in order, positionally or by name.
+    """
+    fields = tuple(fields)
+    if init_fields is None:
+        init_fields = fields
+    for field in fields:
+        if not _identifier_re.match(field) or keyword.iskeyword(field):
+            raise ValueError("invalid record field name", field)
+    args = "".join(", %s" % field for field in init_fields)
+    body = "".join("    self.%s = %s\n" % (field, field)
+        for field in init_fields)
+    namespace = {}
+    exec("def __init__(self%s):\n%s    pass\n" % (args, body), namespace)
+    return type(str(name), (Record,), dict(
+        __slots__ = fields,
+        __init__ = namespace["__init__"]))
+
 class FlagsContainer(Container):
     """
     A container providing pretty-printing for flags.
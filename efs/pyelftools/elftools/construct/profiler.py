@@ -0,0 +1,252 @@
+"""
+Profiling of the parsing of constructs
+"""
+from __future__ import print_function
+import atexit
+import json
+import os
+import sys
+import time
+from .core import Construct
+
+
+_clock = getattr(time, "perf_counter", time.time)
+
+# The number of memory blocks currently allocated by the interpreter
+# (Python 3.4+), or None
+_allocated_blocks = getattr(sys, "getallocatedblocks", None)
+
+
+class ParseStats(object):
+    """
+    The statistics of the parsing of a construct (see ParseProfiler).
+
+    Attributes:
+    * name - the class and the name of the construct, e.g. "Struct Elf_Sym"
+    * calls - the number of times it was parsed
+    * cumtime - the time spent parsing it, with its subconstructs, in seconds
+    * tottime - the time spent parsing it, without the profiled
+      subconstructs, in seconds
+    * bytes - the number of bytes it consumed
+    * allocs - the net number of memory blocks allocated by the parsing, or
+      None if the interpreter doesn't count them
+    """
+    __slots__ = ["name", "calls", "cumtime", "tottime", "bytes", "allocs"]
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.cumtime = 0.0
+        self.tottime = 0.0
+        self.bytes = 0
+        self.allocs = 0 if _allocated_blocks is not None else None
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class ParseProfiler(object):
+    """
+    Records, for each construct parsed while it's active, the number of
+    calls, the time spent, the bytes consumed and the memory blocks
+    allocated. Constructs are told apart by class and name.
+
+    Nothing is instrumented while no profiler is active: starting the
+    profiler wraps the parsing methods of the Construct classes, and
+    stopping it restores them. Classes defined after it started aren't
+    profiled.
+
+    By default, only the constructs parsed with parse(), parse_stream() or
+    parse_from() are recorded (like the structs of ELFStructs and
+    DWARFStructs, parsed by struct_parse). With nested set, their
+    subconstructs are recorded too; compiled parsers (see Construct.compile)
+    are then disabled, since their subconstructs aren't parsed by _parse(),
+    so the timings are those of the uncompiled parsing.
+
+    Only one profiler can be active at a time. The CONSTRUCT_PROFILE
+    environment variable activates one for the whole run (see
+    profile_from_environment).
+
+    Parameters:
+    * nested - whether or not to record the subconstructs. default is False.
+
+    Example:
+    with ParseProfiler() as profiler:
+        elffile.get_dwarf_info()
+    print(profiler.report())
+    """
+    _active = None
+
+    def __init__(self, nested = False):
+        self.nested = nested
+        self.stats = {}
+        self._stack = []
+        self._patched = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """starts recording"""
+        if ParseProfiler._active is not None:
+            raise RuntimeError("a ParseProfiler is already active")
+        ParseProfiler._active = self
+        names = ["parse_stream", "parse_from"]
+        if self.nested:
+            names.append("_parse")
+            self._patch(Construct, "compile", lambda construct: None)
+        for cls in _construct_classes():
+            for name in names:
+                if name in cls.__dict__:
+                    self._patch(cls, name, self._wrap(cls.__dict__[name], name))
+
+    def stop(self):
+        """stops recording"""
+        for cls, name, func in reversed(self._patched):
+            setattr(cls, name, func)
+        self._patched = []
+        self._stack = []
+        if ParseProfiler._active is self:
+            ParseProfiler._active = None
+
+    def get_stats(self, sort = "cumtime"):
+        """
+        returns the list of the ParseStats, sorted in decreasing order of the
+        given attribute
+        """
+        return sorted(self.stats.values(),
+            key = lambda stats: (getattr(stats, sort) or 0, stats.name),
+            reverse = True)
+
+    def report(self, sort = "cumtime", limit = None):
+        """returns the statistics as a table, sorted like get_stats()"""
+        lines = ["%10s %10s %10s %12s %10s  %s" % ("calls", "cumtime",
+            "tottime", "bytes", "allocs", "construct")]
+        for stats in self.get_stats(sort)[:limit]:
+            lines.append("%10d %10.4f %10.4f %12d %10s  %s" % (stats.calls,
+                stats.cumtime, stats.tottime, stats.bytes,
+                "-" if stats.allocs is None else stats.allocs, stats.name))
+        return "\n".join(lines)
+
+    def to_json(self, sort = "cumtime"):
+        """returns the statistics as JSON, sorted like get_stats()"""
+        return json.dumps([stats.as_dict() for stats in self.get_stats(sort)],
+            indent = 1)
+
+    def _patch(self, cls, name, func):
+        self._patched.append((cls, name, cls.__dict__[name]))
+        setattr(cls, name, func)
+
+    def _wrap(self, func, name):
+        profiler = self
+        if name == "parse_from":
+            def parse_from(construct, buffer, offset = 0):
+                frame = profiler._enter(construct)
+                if frame is None:
+                    return func(construct, buffer, offset)
+                obj, end = None, offset
+                try:
+                    obj, end = func(construct, buffer, offset)
+                    return obj, end
+                finally:
+                    profiler._exit(frame, end - offset)
+            return parse_from
+
+        def parse(construct, stream, *args):
+            frame = profiler._enter(construct)
+            if frame is None:
+                return func(construct, stream, *args)
+            start = _tell(stream)
+            try:
+                return func(construct, stream, *args)
+            finally:
+                end = _tell(stream)
+                profiler._exit(frame, 0 if None in (start, end) else end - start)
+        parse.__name__ = func.__name__
+        return parse
+
+    def _enter(self, construct):
+        """
+        pushes the frame of the parsing of construct, or returns None if it's
+        already being parsed (e.g. parse_stream() calling _parse())
+        """
+        if self._stack and self._stack[-1][0] is construct:
+            return None
+        frame = [construct, _clock(), 0.0,
+            _allocated_blocks() if _allocated_blocks is not None else 0]
+        self._stack.append(frame)
+        return frame
+
+    def _exit(self, frame, nbytes):
+        construct, start, subtime, blocks = frame
+        elapsed = _clock() - start
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        key = (construct.__class__.__name__, construct.name)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = ParseStats("%s %s" % (key[0],
+                "<unnamed>" if not construct.name else construct.name))
+        stats.calls += 1
+        stats.cumtime += elapsed
+        stats.tottime += elapsed - subtime
+        stats.bytes += nbytes
+        if _allocated_blocks is not None:
+            stats.allocs += _allocated_blocks() - blocks
+
+
+def profile_from_environment(environ = os.environ):
+    """
+    Activates a ParseProfiler for the whole run if the CONSTRUCT_PROFILE
+    environment variable is set, and returns it (None otherwise). At exit,
+    the statistics are printed to stderr as a table; if the variable isn't
+    "1", they're also written to the file it names as JSON. Setting
+    CONSTRUCT_PROFILE_NESTED to "1" records the subconstructs too.
+
+    The profiler starts when the first construct is created, so that the
+    Construct classes defined after this call (e.g. by the modules importing
+    construct) are profiled too.
+    """
+    path = environ.get("CONSTRUCT_PROFILE")
+    if not path:
+        return None
+    profiler = ParseProfiler(
+        nested = environ.get("CONSTRUCT_PROFILE_NESTED") == "1")
+
+    init = Construct.__dict__["__init__"]
+    def starter(construct, *args, **kwargs):
+        Construct.__init__ = init
+        profiler.start()
+        init(construct, *args, **kwargs)
+    Construct.__init__ = starter
+
+    def write_report():
+        profiler.stop()
+        print(profiler.report(), file = sys.stderr)
+        if path != "1":
+            with open(path, "w") as f:
+                f.write(profiler.to_json())
+    atexit.register(write_report)
+    return profiler
+
+
+def _construct_classes():
+    classes = []
+    pending = [Construct]
+    while pending:
+        cls = pending.pop()
+        if cls not in classes:
+            classes.append(cls)
+            pending.extend(cls.__subclasses__())
+    return classes
+
+def _tell(stream):
+    try:
+        return stream.tell()
+    except Exception:
+        return None
@@ -6,7 +6,22 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
-from ..common.utils import struct_parse, dwarf_assert
+from ..common.py3compat import iteritems
+from ..common.utils import dwarf_assert, get_stream_buffer
+from ..construct import Container, ListContainer
+from .enums import ENUM_DW_TAG, ENUM_DW_CHILDREN, ENUM_DW_AT, ENUM_DW_FORM
+from .leb128 import decode_uleb128
+
+
+def _raw2name(enum):
+    # Inverse mapping of an enum. Unknown values of enums with a default
+    # are left as they are (as with construct's Enum and Pass).
+    return dict((v, k) for k, v in iteritems(enum) if k != '_default_')
+
+_DW_TAG_raw2name = _raw2name(ENUM_DW_TAG)
+_DW_CHILDREN_raw2name = _raw2name(ENUM_DW_CHILDREN)
+_DW_AT_raw2name = _raw2name(ENUM_DW_AT)
+_DW_FORM_raw2name = _raw2name(ENUM_DW_FORM)
 
 
 class AbbrevTable(object):
@@ -28,28 +43,75 @@ class AbbrevTable(object):
         self.offset = offset
 
         self._abbrev_map = self._parse_abbrev_table()
+        self._abbrev_decls = {}
+        self._compiled_abbrevs = {}
 
     def get_abbrev(self, code):
         """ Get the AbbrevDecl for a given code. Raise KeyError if no
             declaration for this code exists.
         """
-        return AbbrevDecl(code, self._abbrev_map[code])
+        decl = self._abbrev_decls.get(code)
+        if decl is None:
+            decl = AbbrevDecl(code, self._abbrev_map[code])
+            self._abbrev_decls[code] = decl
+        return decl
+
+    def get_compiled_abbrev(self, code, structs):
+        """ Get the declaration for a given code precompiled for parsing DIEs
+            with the given DWARFStructs: a (tag, has_children, attr_specs)
+            tuple, where attr_specs is a tuple of (name, form, decoder)
+            tuples, decoder being the function of
+            structs.Dwarf_dw_form_decoders for the form. Raise KeyError if no
+            declaration for this code exists.
+
+            The table is shared by the CUs using it, so compiled declarations
+            are cached for each kind of structs.
+        """
+        key = (code, structs.little_endian, structs.dwarf_format,
+               structs.address_size)
+        compiled = self._compiled_abbrevs.get(key)
+        if compiled is None:
+            decl = self.get_abbrev(code)
+            decoders = structs.Dwarf_dw_form_decoders
+            compiled = (
+                decl['tag'],
+                decl.has_children(),
+                tuple((name, form, decoders[form])
+                      for name, form in zip(decl.attr_names, decl.attr_forms)))
+            self._compiled_abbrevs[key] = compiled
+        return compiled
 
     def _parse_abbrev_table(self):
-        """ Parse the abbrev table from the stream
+        """ Parse the abbrev table from the stream. The declarations are
+            decoded straight from the buffer of the stream into the same
+            containers Dwarf_abbrev_declaration would parse.
         """
         map = {}
-        self.stream.seek(self.offset)
+        buffer = get_stream_buffer(self.stream)
+        offset = self.offset
         while True:
-            decl_code = struct_parse(
-                struct=self.structs.Dwarf_uleb128(''),
-                stream=self.stream)
+            decl_code, offset = decode_uleb128(buffer, offset)
             if decl_code == 0:
                 break
-            declaration = struct_parse(
-                struct=self.structs.Dwarf_abbrev_declaration,
-                stream=self.stream)
-            map[decl_code] = declaration
+            tag, offset = decode_uleb128(buffer, offset)
+            dwarf_assert(offset < len(buffer), 'Truncated abbrev declaration')
+            children_flag = buffer[offset]
+            offset += 1
+            dwarf_assert(children_flag in _DW_CHILDREN_raw2name,
+                'Invalid children flag %d' % children_flag)
+            attr_spec = ListContainer()
+            while True:
+                name, offset = decode_uleb128(buffer, offset)
+                form, offset = decode_uleb128(buffer, offset)
+                if name == 0 and form == 0:
+                    break
+                attr_spec.append(Container(
+                    name=_DW_AT_raw2name.get(name, name),
+                    form=_DW_FORM_raw2name.get(form, form)))
+            map[decl_code] = Container(
+                tag=_DW_TAG_raw2name.get(tag, tag),
+                children_flag=_DW_CHILDREN_raw2name[children_flag],
+                attr_spec=attr_spec)
         return map
 
 
@@ -63,6 +125,13 @@ class AbbrevDecl(object):
         self.code = code
         self.decl = decl
 
+        # The names and forms of the attribute specs, as parallel tuples, and
+        # a map of attribute names to their index in them
+        self.attr_names = tuple(spec.name for spec in decl['attr_spec'])
+        self.attr_forms = tuple(spec.form for spec in decl['attr_spec'])
+        self.attr_index = dict(
+            (name, i) for i, name in enumerate(self.attr_names))
+
     def has_children(self):
         """ Does the entry have children?
         """
@@ -0,0 +1,267 @@
+#-------------------------------------------------------------------------------
+# elftools: dwarf/addressindex.py
+#
+# Index of the address ranges of CUs, functions and inlined functions
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+from bisect import bisect_right
+from collections import namedtuple
+
+from .ranges import RangeLists, BaseAddressEntry
+
+
+# An address range of a DIE in the index
+#
+# begin, end:
+#   The range of addresses [begin, end) covered by the DIE
+#
+# tag:
+#   The tag of the DIE: DW_TAG_compile_unit (or DW_TAG_partial_unit),
+#   DW_TAG_subprogram or DW_TAG_inlined_subroutine
+#
+# name:
+#   The DW_AT_name of the DIE, or of the DIE it refers to through
+#   DW_AT_abstract_origin or DW_AT_specification. None if there is none in
+#   the same CU.
+#
+# depth:
+#   The depth of the DIE in the DIE tree of its CU (0 for the top DIE)
+#
+# cu_offset, die_offset:
+#   The offsets of the CU and of the DIE in .debug_info
+#
+AddressRange = namedtuple('AddressRange',
+    'begin end tag name depth cu_offset die_offset')
+
+
+class AddressIndex(object):
+    """ A sorted interval index answering which CU, function and inlined
+        functions contain an address, in O(log n).
+
+        The ranges are split at their boundaries into disjoint segments, each
+        holding the ranges covering it, so a query is a single binary search.
+
+        ranges:
+            An iterable of AddressRange objects
+    """
+    def __init__(self, ranges):
+        self.ranges = sorted(ranges, key=lambda r: (r.begin, r.depth))
+        self._starts, self._covering = self._build_segments(self.ranges)
+
+    @classmethod
+    def from_segments(cls, ranges, starts, covering):
+        """ Create an AddressIndex from ranges already split into segments,
+            without sorting or sweeping them again (e.g. when loaded from a
+            DWARFIndex).
+
+            ranges:
+                A sequence of the AddressRange objects, sorted like in the
+                'ranges' attribute
+
+            starts, covering:
+                Parallel sequences of the start addresses of the segments and
+                of the tuples of ranges covering them, like those returned by
+                _build_segments
+        """
+        index = cls.__new__(cls)
+        index.ranges = ranges
+        index._starts = starts
+        index._covering = covering
+        return index
+
+    def iter_segments(self):
+        """ Yield the (start, covering) pairs of the segments of the index:
+            the start address of each segment with the tuple of the ranges
+            covering it, ordered like the results of lookup()
+        """
+        for i in range(len(self._starts)):
+            yield self._starts[i], self._covering[i]
+
+    def lookup(self, address):
+        """ Get the ranges containing the address, as a tuple of AddressRange
+            ordered from the outermost (the CU) to the innermost. The tuple is
+            empty if no range contains the address.
+        """
+        i = bisect_right(self._starts, address) - 1
+        if i < 0:
+            return ()
+        return self._covering[i]
+
+    def lookup_many(self, addresses):
+        """ Batched lookup(): get the list of the results of lookup() for each
+            of the addresses, in the same order.
+        """
+        results = [None] * len(addresses)
+        starts = self._starts
+        i = 0
+        for n, address in sorted(enumerate(addresses), key=lambda e: e[1]):
+            # The addresses are sorted, so the search can start from the
+            # segment of the previous one
+            i = max(bisect_right(starts, address, i) - 1, 0)
+            if starts and starts[i] <= address:
+                results[n] = self._covering[i]
+            else:
+                results[n] = ()
+        return results
+
+    def function_at(self, address):
+        """ Get the AddressRange of the innermost DW_TAG_subprogram containing
+            the address, or None.
+        """
+        for r in reversed(self.lookup(address)):
+            if r.tag == 'DW_TAG_subprogram':
+                return r
+        return None
+
+    def cu_offset_at(self, address):
+        """ Get the offset in .debug_info of the CU containing the address,
+            or None.
+        """
+        ranges = self.lookup(address)
+        return ranges[0].cu_offset if ranges else None
+
+    #------ PRIVATE ------#
+
+    @staticmethod
+    def _build_segments(ranges):
+        """ Sweep the boundaries of the ranges, and return the list of the
+            start addresses of the segments they delimit, with the parallel
+            list of the tuples of ranges covering each segment.
+        """
+        bounds = set()
+        for r in ranges:
+            bounds.add(r.begin)
+            bounds.add(r.end)
+
+        starts = []
+        covering = []
+        active = []
+        i = 0
+        for bound in sorted(bounds):
+            active = [r for r in active if r.end > bound]
+            while i < len(ranges) and ranges[i].begin == bound:
+                active.append(ranges[i])
+                i += 1
+            active.sort(key=lambda r: r.depth)
+            starts.append(bound)
+            covering.append(tuple(active))
+        return starts, covering
+
+
+class AddressIndexBuilder(object):
+    """ Collects the AddressRange objects of a DWARFInfo in one streaming pass
+        over the DIEs of its CUs.
+
+        dwarfinfo:
+            The DWARFInfo to index
+    """
+    # The DIEs the index holds ranges for
+    RANGE_TAGS = frozenset((
+        'DW_TAG_compile_unit', 'DW_TAG_partial_unit',
+        'DW_TAG_subprogram', 'DW_TAG_inlined_subroutine'))
+
+    # DIEs whose children never hold code or names of functions, so they
+    # are skipped
+    SKIPPED_TAGS = frozenset((
+        'DW_TAG_enumeration_type', 'DW_TAG_array_type',
+        'DW_TAG_subroutine_type'))
+
+    def __init__(self, dwarfinfo):
+        self.dwarfinfo = dwarfinfo
+
+    def build(self):
+        """ Return an AddressIndex of the ranges of all the CUs
+        """
+        ranges = []
+        for cu in self.dwarfinfo.iter_CUs():
+            ranges.extend(self._iter_CU_ranges(cu))
+        return AddressIndex(ranges)
+
+    #------ PRIVATE ------#
+
+    def _iter_CU_ranges(self, cu):
+        range_lists = None
+        if self.dwarfinfo.debug_ranges_sec:
+            range_lists = RangeLists(self.dwarfinfo.debug_ranges_sec.stream,
+                                     cu.structs)
+
+        # Names and references to other DIEs, keyed by DIE offset, to
+        # resolve the names of DIEs pointing to their abstract origin or
+        # specification
+        names = {}
+        refs = {}
+        found = []
+        base_address = 0
+        skip = lambda die: die.tag in self.SKIPPED_TAGS
+        for depth, die in cu.iter_DIEs_streaming(skip_children=skip):
+            if die.is_null():
+                continue
+            attributes = die.attributes
+            if 'DW_AT_name' in attributes:
+                names[die.offset] = attributes['DW_AT_name'].value
+            else:
+                for ref_name in ('DW_AT_abstract_origin',
+                                 'DW_AT_specification'):
+                    if ref_name in attributes:
+                        refs[die.offset] = cu.resolve_reference(
+                            attributes[ref_name])
+                        break
+
+            if die.tag not in self.RANGE_TAGS:
+                continue
+            if depth == 0 and 'DW_AT_low_pc' in attributes:
+                base_address = attributes['DW_AT_low_pc'].value
+            for begin, end in self._die_ranges(die, base_address, range_lists):
+                if begin < end:
+                    found.append((begin, end, die.tag, depth, die.offset))
+
+        for begin, end, tag, depth, offset in found:
+            yield AddressRange(
+                begin=begin,
+                end=end,
+                tag=tag,
+                name=self._resolve_name(offset, names, refs),
+                depth=depth,
+                cu_offset=cu.cu_offset,
+                die_offset=offset)
+
+    def _die_ranges(self, die, base_address, range_lists):
+        """ Get the list of (begin, end) address ranges of a DIE
+        """
+        attributes = die.attributes
+        if 'DW_AT_ranges' in attributes:
+            if range_lists is None:
+                return []
+            result = []
+            for entry in range_lists.get_range_list_at_offset(
+                    attributes['DW_AT_ranges'].value):
+                if isinstance(entry, BaseAddressEntry):
+                    base_address = entry.base_address
+                else:
+                    result.append((base_address + entry.begin_offset,
+                                   base_address + entry.end_offset))
+            return result
+        elif 'DW_AT_low_pc' in attributes and 'DW_AT_high_pc' in attributes:
+            lowpc = attributes['DW_AT_low_pc'].value
+            highpc_attr = attributes['DW_AT_high_pc']
+            # DW_AT_high_pc is either an address, or an offset from
+            # DW_AT_low_pc if it has a constant form (DWARF v4 2.17)
+            if highpc_attr.form == 'DW_FORM_addr':
+                highpc = highpc_attr.value
+            else:
+                highpc = lowpc + highpc_attr.value
+            return [(lowpc, highpc)]
+        return []
+
+    @staticmethod
+    def _resolve_name(offset, names, refs):
+        # Follow the chain of references (e.g. an inlined subroutine refers
+        # to its abstract origin, which refers to its declaration)
+        for _ in range(8):
+            if offset in names:
+                return names[offset]
+            offset = refs.get(offset)
+            if offset is None:
+                break
+        return None
@@ -7,11 +7,16 @@
 # This code is in the public domain
 #-------------------------------------------------------------------------------
 import copy
+import struct
+from bisect import bisect_right
 from collections import namedtuple
-from ..common.utils import (struct_parse, dwarf_assert, preserve_stream_pos)
-from ..common.py3compat import iterkeys
+from ..construct import Container
+from ..common.utils import (struct_parse, dwarf_assert, preserve_stream_pos,
+                            get_stream_buffer)
+from ..common.py3compat import iterkeys, bytes2str
 from .structs import DWARFStructs
 from .constants import *
+from .leb128 import decode_uleb128, decode_sleb128
 
 
 class CallFrameInfo(object):
@@ -33,11 +38,27 @@ class CallFrameInfo(object):
             file; more sophisticated methods are used by libdwarf and others,
             such as guessing which CU contains which FDEs (based on their
             address ranges) and taking the address_size from those CUs.
+
+        for_eh_frame:
+            True if the section is a .eh_frame section, whose entries have
+            augmentation data and encoded pointers (see the LSB)
+
+        address:
+            The address of the section, for decoding pc-relative pointers of
+            .eh_frame
+
+        eh_frame_hdr:
+            An optional EHFrameHeader of the .eh_frame section, whose binary
+            search table is then used by find_FDE_offset
     """
-    def __init__(self, stream, size, base_structs):
+    def __init__(self, stream, size, base_structs, for_eh_frame=False,
+                 address=0, eh_frame_hdr=None):
         self.stream = stream
         self.size = size
         self.base_structs = base_structs
+        self.for_eh_frame = for_eh_frame
+        self.address = address
+        self.eh_frame_hdr = eh_frame_hdr
         self.entries = None
 
         # Map between an offset in the stream and the entry object found at this
@@ -45,6 +66,21 @@ class CallFrameInfo(object):
         # header field which contains a stream offset.
         self._entry_cache = {}
 
+        # The DWARFStructs of the entries, keyed by (dwarf_format,
+        # address_size), as creating them is costly
+        self._structs_cache = {}
+
+        # The ranges of addresses of the FDEs found through eh_frame_hdr, as
+        # (initial_location, end) pairs keyed by offset
+        self._fde_ranges = {}
+
+        # The FDE index: sorted parallel lists of the initial locations of
+        # the FDEs, of the ends of their ranges and of their offsets. Built
+        # lazily.
+        self._fde_locations = None
+        self._fde_ends = None
+        self._fde_offsets = None
+
     def get_entries(self):
         """ Get a list of entries that constitute this CFI. The list consists
             of CIE or FDE objects, in the order of their appearance in the
@@ -54,89 +90,263 @@ class CallFrameInfo(object):
             self.entries = self._parse_entries()
         return self.entries
 
+    def get_entry_at_offset(self, offset):
+        """ Get the entry (CIE or FDE object) at the given offset in the
+            section. CIEs are kept for reuse, but unless get_entries was
+            called, FDEs are parsed anew on each call.
+        """
+        return self._parse_entry_at(offset, cache=False)
+
+    def find_FDE_offset(self, address):
+        """ Get the offset in the section of the FDE whose range of addresses
+            contains the given address, or None if there is none. The FDE is
+            found by a binary search in the table of the EHFrameHeader if
+            there is one, and otherwise in an index of the ranges of the FDEs
+            built on the first call by parsing only their headers.
+        """
+        if self.eh_frame_hdr is not None and self.eh_frame_hdr.has_table():
+            fde_address = self.eh_frame_hdr.find_FDE_address(address)
+            if fde_address is None:
+                return None
+            # The FDE may end before the address
+            offset = fde_address - self.address
+            fde_range = self._fde_ranges.get(offset)
+            if fde_range is None:
+                header = self._parse_entry_header_at(offset)
+                if header.is_CIE:
+                    return None
+                fde_range = (header.initial_location,
+                             header.initial_location + header.address_range)
+                self._fde_ranges[offset] = fde_range
+            if not fde_range[0] <= address < fde_range[1]:
+                return None
+            return offset
+
+        if self._fde_locations is None:
+            self._build_FDE_index()
+        i = bisect_right(self._fde_locations, address) - 1
+        if i < 0 or address >= self._fde_ends[i]:
+            return None
+        return self._fde_offsets[i]
+
+    def find_FDE(self, address):
+        """ Get the FDE whose range of addresses contains the given address,
+            or None if there is none (see find_FDE_offset)
+        """
+        offset = self.find_FDE_offset(address)
+        if offset is None:
+            return None
+        return self.get_entry_at_offset(offset)
+
     #-------------------------
 
     def _parse_entries(self):
         entries = []
         offset = 0
         while offset < self.size:
+            header = self._parse_entry_header_at(offset)
+            if header is None:
+                break
             entries.append(self._parse_entry_at(offset))
-            offset = self.stream.tell()
+            offset = header.end_offset
         return entries
 
-    def _parse_entry_at(self, offset):
+    def _build_FDE_index(self):
+        """ Build the FDE index by parsing the headers of all the entries
+        """
+        ranges = []
+        offset = 0
+        while offset < self.size:
+            header = self._parse_entry_header_at(offset)
+            if header is None:
+                break
+            if not header.is_CIE:
+                ranges.append((
+                    header.initial_location,
+                    header.initial_location + header.address_range,
+                    offset))
+            offset = header.end_offset
+        ranges.sort()
+        self._fde_locations = [r[0] for r in ranges]
+        self._fde_ends = [r[1] for r in ranges]
+        self._fde_offsets = [r[2] for r in ranges]
+
+    def _parse_entry_at(self, offset, cache=True):
         """ Parse an entry from self.stream starting with the given offset.
             Return the entry object. self.stream will point right after the
-            entry.
+            entry. CIEs are always cached, FDEs only if cache is True.
         """
         if offset in self._entry_cache:
             return self._entry_cache[offset]
 
+        header = self._parse_entry_header_at(offset)
+        instructions = self._parse_instructions(
+            header.structs, header.instructions_offset, header.end_offset)
+
+        if header.is_CIE:
+            entry = CIE(
+                header=header.header, instructions=instructions, offset=offset,
+                structs=header.structs,
+                augmentation_dict=header.augmentation_dict)
+            self._entry_cache[offset] = entry
+        else: # FDE
+            with preserve_stream_pos(self.stream):
+                cie = self._parse_entry_at(header.cie_offset)
+            entry = FDE(
+                header=header.header, instructions=instructions, offset=offset,
+                structs=header.structs, cie=cie)
+            if cache:
+                self._entry_cache[offset] = entry
+        return entry
+
+    def _parse_entry_header_at(self, offset):
+        """ Parse the header of the entry at the given offset, and return it
+            as an _EntryHeader, or None for the zero terminator of .eh_frame.
+        """
         entry_length = struct_parse(
             self.base_structs.Dwarf_uint32(''), self.stream, offset)
+        if entry_length == 0 and self.for_eh_frame:
+            return None
         dwarf_format = 64 if entry_length == 0xFFFFFFFF else 32
 
-        entry_structs = DWARFStructs(
-            little_endian=self.base_structs.little_endian,
-            dwarf_format=dwarf_format,
-            address_size=self.base_structs.address_size)
+        entry_structs = self._get_structs(
+            dwarf_format, self.base_structs.address_size)
 
         # Read the next field to see whether this is a CIE or FDE
         CIE_id = struct_parse(
             entry_structs.Dwarf_offset(''), self.stream)
+        CIE_id_end = self.stream.tell()
 
-        is_CIE = (
-            (dwarf_format == 32 and CIE_id == 0xFFFFFFFF) or
-            CIE_id == 0xFFFFFFFFFFFFFFFF)
-
-        if is_CIE:
-            header_struct = entry_structs.Dwarf_CIE_header
+        if self.for_eh_frame:
+            is_CIE = CIE_id == 0
         else:
-            header_struct = entry_structs.Dwarf_FDE_header
-
-        # Parse the header, which goes up to and including the
-        # return_address_register field
-        header = struct_parse(
-            header_struct, self.stream, offset)
-
-        # If this is DWARF version 4 or later, we can have a more precise
-        # address size, read from the CIE header.
-        if entry_structs.dwarf_version >= 4:
-            entry_structs = DWARFStructs(
-                little_endian=entry_structs.little_endian,
-                dwarf_format=entry_structs.dwarf_format,
-                address_size=header.address_size)
+            is_CIE = (
+                (dwarf_format == 32 and CIE_id == 0xFFFFFFFF) or
+                CIE_id == 0xFFFFFFFFFFFFFFFF)
+
+        augmentation_dict = {}
+        cie_offset = None
+        if is_CIE or not self.for_eh_frame:
+            if is_CIE:
+                header_struct = entry_structs.Dwarf_CIE_header
+            else:
+                header_struct = entry_structs.Dwarf_FDE_header
+                cie_offset = CIE_id
+
+            # Parse the header, which goes up to and including the
+            # return_address_register field
+            header = struct_parse(
+                header_struct, self.stream, offset)
+
+            # If this is DWARF version 4 or later, we can have a more precise
+            # address size, read from the CIE header.
+            if entry_structs.dwarf_version >= 4:
+                entry_structs = self._get_structs(
+                    entry_structs.dwarf_format, header.address_size)
+            instructions_offset = self.stream.tell()
+
+            if is_CIE and self.for_eh_frame:
+                augmentation_dict, instructions_offset = (
+                    self._parse_CIE_augmentation(
+                        header, entry_structs, instructions_offset))
+        else:
+            # A FDE of .eh_frame: its CIE pointer is relative to itself, and
+            # its addresses are encoded as told by the augmentation of its
+            # CIE
+            cie_offset = CIE_id_end - entry_structs.dwarf_format // 8 - CIE_id
+            with preserve_stream_pos(self.stream):
+                cie = self._parse_entry_at(cie_offset)
+            encoding = cie.augmentation_dict.get(
+                'FDE_encoding', DW_EH_PE_absptr)
+            buffer = get_stream_buffer(self.stream)
+            initial_location, pos = decode_encoded_pointer(
+                buffer, CIE_id_end, encoding, entry_structs,
+                pcrel_base=self.address)
+            address_range, pos = decode_encoded_pointer(
+                buffer, pos, encoding & 0x0F, entry_structs)
+            if cie.augmentation_dict.get('augmentation_data'):
+                augmentation_length, pos = decode_uleb128(buffer, pos)
+                pos += augmentation_length
+            header = Container(
+                length=entry_length,
+                CIE_pointer=CIE_id,
+                initial_location=initial_location,
+                address_range=address_range)
+            instructions_offset = pos
 
         # For convenience, compute the end offset for this entry
         end_offset = (
             offset + header.length +
             entry_structs.initial_length_field_size())
 
-        # At this point self.stream is at the start of the instruction list
-        # for this entry
-        instructions = self._parse_instructions(
-            entry_structs, self.stream.tell(), end_offset)
-
-        if is_CIE:
-            self._entry_cache[offset] = CIE(
-                header=header, instructions=instructions, offset=offset,
-                structs=entry_structs)
-        else: # FDE
-            with preserve_stream_pos(self.stream):
-                cie = self._parse_entry_at(header['CIE_pointer'])
-            self._entry_cache[offset] = FDE(
-                header=header, instructions=instructions, offset=offset,
-                structs=entry_structs, cie=cie)
-        return self._entry_cache[offset]
+        return _EntryHeader(
+            header=header,
+            structs=entry_structs,
+            is_CIE=is_CIE,
+            cie_offset=cie_offset,
+            initial_location=None if is_CIE else header['initial_location'],
+            address_range=None if is_CIE else header['address_range'],
+            augmentation_dict=augmentation_dict,
+            instructions_offset=instructions_offset,
+            end_offset=end_offset)
+
+    def _get_structs(self, dwarf_format, address_size):
+        key = (dwarf_format, address_size)
+        structs = self._structs_cache.get(key)
+        if structs is None:
+            structs = self._structs_cache[key] = DWARFStructs(
+                little_endian=self.base_structs.little_endian,
+                dwarf_format=dwarf_format,
+                address_size=address_size)
+        return structs
+
+    def _parse_CIE_augmentation(self, header, structs, offset):
+        """ Parse the augmentation data following the header of a CIE of
+            .eh_frame, as described by its augmentation string. Return a dict
+            describing it and the offset of the instructions.
+        """
+        augmentation = bytes2str(header['augmentation'])
+        augmentation_dict = {}
+        if not augmentation.startswith('z'):
+            # Without augmentation data, nothing more is known
+            return augmentation_dict, offset
+
+        buffer = get_stream_buffer(self.stream)
+        augmentation_length, offset = decode_uleb128(buffer, offset)
+        instructions_offset = offset + augmentation_length
+        augmentation_dict['augmentation_data'] = True
+        for char in augmentation[1:]:
+            if char == 'L':
+                augmentation_dict['LSDA_encoding'] = buffer[offset]
+                offset += 1
+            elif char == 'R':
+                augmentation_dict['FDE_encoding'] = buffer[offset]
+                offset += 1
+            elif char == 'P':
+                encoding = buffer[offset]
+                augmentation_dict['personality'], offset = (
+                    decode_encoded_pointer(
+                        buffer, offset + 1, encoding, structs,
+                        pcrel_base=self.address))
+            elif char not in 'SB':
+                # The remaining data can't be interpreted, but is skipped
+                break
+        return augmentation_dict, instructions_offset
 
     def _parse_instructions(self, structs, offset, end_offset):
         """ Parse a list of CFI instructions from self.stream, starting with
             the offset and until (not including) end_offset.
             Return a list of CallFrameInstruction objects.
         """
+        # The instructions are decoded straight from the buffer of the stream
+        buffer = get_stream_buffer(self.stream)
+        decoders = structs.Dwarf_dw_form_decoders
+        decode_block = decoders['DW_FORM_block']
+
         instructions = []
         while offset < end_offset:
-            opcode = struct_parse(structs.Dwarf_uint8(''), self.stream, offset)
+            opcode = buffer[offset]
+            offset += 1
             args = []
 
             primary = opcode & _PRIMARY_MASK
@@ -144,9 +354,8 @@ class CallFrameInfo(object):
             if primary == DW_CFA_advance_loc:
                 args = [primary_arg]
             elif primary == DW_CFA_offset:
-                args = [
-                    primary_arg,
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream)]
+                arg, offset = decode_uleb128(buffer, offset)
+                args = [primary_arg, arg]
             elif primary == DW_CFA_restore:
                 args = [primary_arg]
             # primary == 0 and real opcode is extended
@@ -154,46 +363,173 @@ class CallFrameInfo(object):
                             DW_CFA_restore_state):
                 args = []
             elif opcode == DW_CFA_set_loc:
-                args = [
-                    struct_parse(structs.Dwarf_target_addr(''), self.stream)]
+                arg, offset = decoders['DW_FORM_addr'](buffer, offset)
+                args = [arg]
             elif opcode == DW_CFA_advance_loc1:
-                args = [struct_parse(structs.Dwarf_uint8(''), self.stream)]
+                arg, offset = decoders['DW_FORM_data1'](buffer, offset)
+                args = [arg]
             elif opcode == DW_CFA_advance_loc2:
-                args = [struct_parse(structs.Dwarf_uint16(''), self.stream)]
+                arg, offset = decoders['DW_FORM_data2'](buffer, offset)
+                args = [arg]
             elif opcode == DW_CFA_advance_loc4:
-                args = [struct_parse(structs.Dwarf_uint32(''), self.stream)]
+                arg, offset = decoders['DW_FORM_data4'](buffer, offset)
+                args = [arg]
             elif opcode in (DW_CFA_offset_extended, DW_CFA_register,
                             DW_CFA_def_cfa, DW_CFA_val_offset):
-                args = [
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream),
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream)]
+                arg1, offset = decode_uleb128(buffer, offset)
+                arg2, offset = decode_uleb128(buffer, offset)
+                args = [arg1, arg2]
             elif opcode in (DW_CFA_restore_extended, DW_CFA_undefined,
                             DW_CFA_same_value, DW_CFA_def_cfa_register,
-                            DW_CFA_def_cfa_offset):
-                args = [struct_parse(structs.Dwarf_uleb128(''), self.stream)]
+                            DW_CFA_def_cfa_offset, DW_CFA_GNU_args_size):
+                arg, offset = decode_uleb128(buffer, offset)
+                args = [arg]
             elif opcode == DW_CFA_def_cfa_offset_sf:
-                args = [struct_parse(structs.Dwarf_sleb128(''), self.stream)]
+                arg, offset = decode_sleb128(buffer, offset)
+                args = [arg]
             elif opcode == DW_CFA_def_cfa_expression:
-                args = [struct_parse(
-                    structs.Dwarf_dw_form['DW_FORM_block'], self.stream)]
+                arg, offset = decode_block(buffer, offset)
+                args = [arg]
             elif opcode in (DW_CFA_expression, DW_CFA_val_expression):
-                args = [
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream),
-                    struct_parse(
-                        structs.Dwarf_dw_form['DW_FORM_block'], self.stream)]
+                arg1, offset = decode_uleb128(buffer, offset)
+                arg2, offset = decode_block(buffer, offset)
+                args = [arg1, arg2]
             elif opcode in (DW_CFA_offset_extended_sf,
                             DW_CFA_def_cfa_sf, DW_CFA_val_offset_sf):
-                args = [
-                    struct_parse(structs.Dwarf_uleb128(''), self.stream),
-                    struct_parse(structs.Dwarf_sleb128(''), self.stream)]
+                arg1, offset = decode_uleb128(buffer, offset)
+                arg2, offset = decode_sleb128(buffer, offset)
+                args = [arg1, arg2]
             else:
                 dwarf_assert(False, 'Unknown CFI opcode: 0x%x' % opcode)
 
             instructions.append(CallFrameInstruction(opcode=opcode, args=args))
-            offset = self.stream.tell()
+        # Leave the stream after the instructions, like a parse from it would
+        self.stream.seek(offset)
         return instructions
 
 
+class EHFrameHeader(object):
+    """ The .eh_frame_hdr section: the address of .eh_frame, and a binary
+        search table of the initial locations of its FDEs, sorted by address
+        (see the LSB).
+
+        stream, size:
+            A stream holding the .eh_frame_hdr section, and its size
+
+        address:
+            The address of the section
+
+        base_structs:
+            The structs of the file, for its endianness and address size
+    """
+    def __init__(self, stream, size, address, base_structs):
+        self.stream = stream
+        self.size = size
+        self.address = address
+        self.structs = base_structs
+        self._buffer = get_stream_buffer(stream)
+
+        self.version = self._buffer[0]
+        eh_frame_ptr_encoding = self._buffer[1]
+        fde_count_encoding = self._buffer[2]
+        self._table_encoding = self._buffer[3]
+        self.eh_frame_address, offset = decode_encoded_pointer(
+            self._buffer, 4, eh_frame_ptr_encoding, base_structs,
+            pcrel_base=address)
+        self.fde_count, offset = decode_encoded_pointer(
+            self._buffer, offset, fde_count_encoding, base_structs,
+            pcrel_base=address, datarel_base=address)
+        self._table_offset = offset
+
+        # The table is only usable with entries of a fixed size
+        self._has_table = (
+            fde_count_encoding != DW_EH_PE_omit and
+            self._table_encoding != DW_EH_PE_omit and
+            _encoded_pointer_size(
+                self._table_encoding, base_structs) is not None)
+
+        # The decoded table: sorted parallel lists of the initial locations
+        # of the FDEs and of their addresses. Filled lazily.
+        self._locations = None
+        self._fde_addresses = None
+
+    def has_table(self):
+        """ Does the section have a binary search table?
+        """
+        return self._has_table
+
+    def find_FDE_address(self, address):
+        """ Get the address of the FDE with the greatest initial location
+            lower or equal to the given address, or None. The FDE may end
+            before the address.
+        """
+        if self._locations is None:
+            self._decode_table()
+        i = bisect_right(self._locations, address) - 1
+        if i < 0:
+            return None
+        return self._fde_addresses[i]
+
+    def _decode_table(self):
+        """ Decode the whole table at once, which is much faster than
+            decoding its entries on each search
+        """
+        locations = []
+        fde_addresses = []
+        offset = self._table_offset
+        for _ in range(self.fde_count):
+            initial_location, offset = decode_encoded_pointer(
+                self._buffer, offset, self._table_encoding, self.structs,
+                pcrel_base=self.address, datarel_base=self.address)
+            fde_address, offset = decode_encoded_pointer(
+                self._buffer, offset, self._table_encoding, self.structs,
+                pcrel_base=self.address, datarel_base=self.address)
+            locations.append(initial_location)
+            fde_addresses.append(fde_address)
+        self._locations = locations
+        self._fde_addresses = fde_addresses
+
+
+def decode_encoded_pointer(buffer, offset, encoding, structs,
+                           pcrel_base=None, datarel_base=None):
+    """ Decode a pointer encoded as told by encoding (a DW_EH_PE_* value)
+        from the buffer at offset. Return a (value, new_offset) tuple; the
+        value is None if the encoding is DW_EH_PE_omit.
+
+        pcrel_base is the address of the buffer, for pc-relative pointers,
+        and datarel_base the base of data-relative pointers. Without them,
+        and for the other applications, the value isn't adjusted.
+    """
+    if encoding == DW_EH_PE_omit:
+        return None, offset
+    value_format = encoding & 0x0F
+    start = offset
+    if value_format == DW_EH_PE_uleb128:
+        value, offset = decode_uleb128(buffer, offset)
+    elif value_format == DW_EH_PE_sleb128:
+        value, offset = decode_sleb128(buffer, offset)
+    else:
+        size = _encoded_pointer_size(encoding, structs)
+        if size is None:
+            dwarf_assert(False, 'Unknown pointer encoding: 0x%x' % encoding)
+        code = _EH_PE_STRUCT_CODES.get(value_format)
+        if code is None:
+            # DW_EH_PE_absptr
+            code = 'I' if size == 4 else 'Q'
+        endianness = '<' if structs.little_endian else '>'
+        value = struct.unpack_from(endianness + code, buffer, offset)[0]
+        offset += size
+
+    application = encoding & 0x70
+    if application == DW_EH_PE_pcrel and pcrel_base is not None:
+        value += pcrel_base + start
+    elif application == DW_EH_PE_datarel and datarel_base is not None:
+        value += datarel_base
+    if application:
+        value &= (1 << (structs.address_size * 8)) - 1
+    return value, offset
+
+
 def instruction_name(opcode):
     """ Given an opcode, return the instruction name.
     """
@@ -224,13 +560,17 @@ class CFIEntry(object):
         Contains a header and a list of instructions (CallFrameInstruction).
         offset: the offset of this entry from the beginning of the section
         cie: for FDEs, a CIE pointer is required
+        augmentation_dict: for CIEs of .eh_frame, a dict describing their
+            augmentation data ('FDE_encoding', 'LSDA_encoding', 'personality')
     """
-    def __init__(self, header, structs, instructions, offset, cie=None):
+    def __init__(self, header, structs, instructions, offset, cie=None,
+                 augmentation_dict=None):
         self.header = header
         self.structs = structs
         self.instructions = instructions
         self.offset = offset
         self.cie = cie
+        self.augmentation_dict = augmentation_dict or {}
         self._decoded_table = None
 
     def get_decoded(self):
@@ -435,6 +775,54 @@ DecodedCallFrameTable = namedtuple(
 
 #---------------- PRIVATE ----------------#
 
+# The header of a CFI entry, as parsed by CallFrameInfo before its
+# instructions
+#
+# header:
+#   The header struct of the entry
+#
+# structs:
+#   The DWARFStructs of the entry
+#
+# is_CIE, cie_offset:
+#   Whether the entry is a CIE, and for a FDE the offset of its CIE
+#
+# initial_location, address_range:
+#   The range of addresses of a FDE (None for a CIE)
+#
+# augmentation_dict:
+#   The augmentation data of a CIE of .eh_frame
+#
+# instructions_offset, end_offset:
+#   The offsets where the instructions of the entry start, and where the
+#   entry ends
+#
+_EntryHeader = namedtuple('_EntryHeader',
+    'header structs is_CIE cie_offset initial_location address_range '
+    'augmentation_dict instructions_offset end_offset')
+
+# The struct codes of the fixed-size formats of encoded pointers
+_EH_PE_STRUCT_CODES = {
+    DW_EH_PE_udata2: 'H',
+    DW_EH_PE_udata4: 'I',
+    DW_EH_PE_udata8: 'Q',
+    DW_EH_PE_sdata2: 'h',
+    DW_EH_PE_sdata4: 'i',
+    DW_EH_PE_sdata8: 'q',
+}
+
+
+def _encoded_pointer_size(encoding, structs):
+    """ The size of a pointer with the given encoding, or None if it has
+        a variable size
+    """
+    value_format = encoding & 0x0F
+    if value_format == DW_EH_PE_absptr:
+        return structs.address_size
+    code = _EH_PE_STRUCT_CODES.get(value_format)
+    return struct.calcsize('<' + code) if code is not None else None
+
+
 _PRIMARY_MASK = 0b11000000
 _PRIMARY_ARG_MASK = 0b00111111
 
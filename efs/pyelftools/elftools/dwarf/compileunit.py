@@ -6,7 +6,7 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
-from .die import DIE
+from .die import DIE, CompactDIE
 
 
 class CompileUnit(object):
@@ -53,9 +53,15 @@ class CompileUnit(object):
         # requested.
         self._abbrev_table = None
 
+        # Cache for compiled abbrev declarations: a dict keyed by code
+        self._compiled_abbrevs = {}
+
         # A list of DIEs belonging to this CU. Lazily parsed.
         self._dielist = []
 
+        # The class of the DIEs, depending on the DWARFInfo's mode
+        self._die_class = CompactDIE if dwarfinfo.compact_dies else DIE
+
     def dwarf_format(self):
         """ Get the DWARF format (32 or 64) for this CU
         """
@@ -69,12 +75,34 @@ class CompileUnit(object):
                 self['debug_abbrev_offset'])
         return self._abbrev_table
 
+    def get_compiled_abbrev(self, code):
+        """ Get the declaration for a given code from the abbreviation table
+            of this CU, compiled for parsing its DIEs (see
+            AbbrevTable.get_compiled_abbrev)
+        """
+        compiled = self._compiled_abbrevs.get(code)
+        if compiled is None:
+            compiled = self.get_abbrev_table().get_compiled_abbrev(
+                code, self.structs)
+            self._compiled_abbrevs[code] = compiled
+        return compiled
+
     def get_top_DIE(self):
         """ Get the top DIE (which is either a DW_TAG_compile_unit or
             DW_TAG_partial_unit) of this CU
         """
         return self._get_DIE(0)
 
+    def get_DIE_at_offset(self, offset):
+        """ Parse the DIE at the given offset in the .debug_info section,
+            which must be within this CU, without parsing the other DIEs.
+            The DIE has no parent and no children.
+        """
+        return self._die_class(
+                cu=self,
+                stream=self.dwarfinfo.debug_info_sec.stream,
+                offset=offset)
+
     def iter_DIEs(self):
         """ Iterate over all the DIEs in the CU, in order of their appearance.
             Note that null DIEs will also be returned.
@@ -82,6 +110,73 @@ class CompileUnit(object):
         self._parse_DIEs()
         return iter(self._dielist)
 
+    def iter_DIEs_streaming(self, skip_children=None):
+        """ Iterate over all the DIEs in the CU in prefix order, parsing them
+            as they are yielded, without materializing the CU. Yield
+            (depth, DIE) pairs, where depth is 0 for the top DIE, 1 for its
+            children and so on. A null DIE has the depth of the siblings
+            whose list it ends.
+
+            Only the stack of the current DIE's ancestors is kept: get_parent()
+            works on the yielded DIEs, but they have no children lists and
+            aren't stored in the CU, so memory use doesn't grow with its size.
+
+            skip_children is an optional predicate called with every DIE
+            that has children; if it returns True, the children of that DIE
+            (and the null DIE ending them) are not yielded. When the DIE has
+            a DW_AT_sibling attribute they are not even parsed: the iteration
+            jumps straight to the sibling.
+        """
+        stream = self.dwarfinfo.debug_info_sec.stream
+        cu_boundary = ( self.cu_offset +
+                        self['unit_length'] +
+                        self.structs.initial_length_field_size())
+
+        parentstack = []
+        # Depth of the parent stack below which DIEs are skipped
+        skip_depth = None
+        die_offset = self.cu_die_offset
+        while die_offset < cu_boundary:
+            die = self._die_class(cu=self, stream=stream, offset=die_offset)
+            die_offset += die.size
+            depth = len(parentstack)
+            skipped = skip_depth is not None and depth > skip_depth
+
+            if die.is_null():
+                if not skipped:
+                    yield depth, die
+                # Some compilers generate extra NULLs in the end; ignore them
+                if parentstack:
+                    parentstack.pop()
+                    if skip_depth is not None and len(parentstack) <= skip_depth:
+                        skip_depth = None
+                continue
+
+            if parentstack:
+                die.set_parent(parentstack[-1])
+            if skipped:
+                if die.has_children:
+                    parentstack.append(die)
+                continue
+
+            yield depth, die
+            if die.has_children:
+                if skip_children is not None and skip_children(die):
+                    sibling = die.attributes.get('DW_AT_sibling')
+                    if sibling is not None:
+                        die_offset = self.resolve_reference(sibling)
+                        continue
+                    skip_depth = depth
+                parentstack.append(die)
+
+    def resolve_reference(self, attr):
+        """ Get the offset in .debug_info of the DIE a reference attribute
+            (an AttributeValue of a DIE of this CU) points to
+        """
+        if attr.form == 'DW_FORM_ref_addr':
+            return attr.value
+        return self.cu_offset + attr.value
+
     #------ PRIVATE ------#
 
     def __getitem__(self, name):
@@ -113,7 +208,7 @@ class CompileUnit(object):
         # First pass: parse all DIEs and place them into self._dielist
         die_offset = self.cu_die_offset
         while die_offset < cu_boundary:
-            die = DIE(
+            die = self._die_class(
                     cu=self,
                     stream=self.dwarfinfo.debug_info_sec.stream,
                     offset=die_offset)
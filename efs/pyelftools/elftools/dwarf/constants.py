@@ -173,3 +173,28 @@ DW_CFA_def_cfa_offset_sf = 0x13
 DW_CFA_val_offset = 0x14
 DW_CFA_val_offset_sf = 0x15
 DW_CFA_val_expression = 0x16
+DW_CFA_GNU_args_size = 0x2e
+
+
+# Pointer encodings of .eh_frame and .eh_frame_hdr (see the DW_EH_PE_*
+# constants of the LSB). The low 4 bits give the format of the value, and
+# the next 3 bits how it's applied.
+#
+DW_EH_PE_absptr = 0x00
+DW_EH_PE_uleb128 = 0x01
+DW_EH_PE_udata2 = 0x02
+DW_EH_PE_udata4 = 0x03
+DW_EH_PE_udata8 = 0x04
+DW_EH_PE_sleb128 = 0x09
+DW_EH_PE_sdata2 = 0x0a
+DW_EH_PE_sdata4 = 0x0b
+DW_EH_PE_sdata8 = 0x0c
+
+DW_EH_PE_pcrel = 0x10
+DW_EH_PE_textrel = 0x20
+DW_EH_PE_datarel = 0x30
+DW_EH_PE_funcrel = 0x40
+DW_EH_PE_aligned = 0x50
+
+DW_EH_PE_indirect = 0x80
+DW_EH_PE_omit = 0xff
@@ -452,17 +452,16 @@ def _import_extra(attr, die, section_offset):
         ref_die_offset = attr.value + die.cu.cu_offset
 
     # Now find the CU this DIE belongs to (since we have to find its abbrev
-    # table). This is done by linearly scanning through all CUs, looking for
-    # one spanning an address space containing the referred DIE's offset.
-    for cu in die.dwarfinfo.iter_CUs():
-        if cu['unit_length'] + cu.cu_offset > ref_die_offset >= cu.cu_offset:
-            # Once we have the CU, we can actually parse this DIE from the
-            # stream.
-            with preserve_stream_pos(die.stream):
-                ref_die = DIE(cu, die.stream, ref_die_offset)
-            #print '&&& ref_die', ref_die
-            return '[Abbrev Number: %s (%s)]' % (
-                ref_die.abbrev_code, ref_die.tag)
+    # table).
+    cu = die.dwarfinfo.get_CU_containing(ref_die_offset)
+    if cu is not None:
+        # Once we have the CU, we can actually parse this DIE from the
+        # stream.
+        with preserve_stream_pos(die.stream):
+            ref_die = DIE(cu, die.stream, ref_die_offset)
+        #print '&&& ref_die', ref_die
+        return '[Abbrev Number: %s (%s)]' % (
+            ref_die.abbrev_code, ref_die.tag)
 
     return '[unknown]'
 
@@ -7,12 +7,16 @@
 # This code is in the public domain
 #-------------------------------------------------------------------------------
 from collections import namedtuple, OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 import os
 
 from ..common.exceptions import DWARFError
 from ..common.py3compat import bytes2str, iteritems
-from ..common.utils import struct_parse, preserve_stream_pos
 from .enums import DW_FORM_raw2name
+from .leb128 import decode_uleb128
 
 
 # AttributeValue - describes an attribute value in the DIE:
@@ -39,7 +43,61 @@ AttributeValue = namedtuple(
     'AttributeValue', 'name form value raw_value offset')
 
 
-class DIE(object):
+class _DIEMixin(object):
+    """ Methods shared by DIE and CompactDIE
+    """
+    __slots__ = ()
+
+    def is_null(self):
+        """ Is this a null entry?
+        """
+        return self.tag is None
+
+    def get_parent(self):
+        """ The parent DIE of this DIE. None if the DIE has no parent (i.e. a
+            top-level DIE).
+        """
+        return self._parent
+
+    def get_full_path(self):
+        """ Return the full path filename for the DIE.
+
+            The filename is the join of 'DW_AT_comp_dir' and 'DW_AT_name',
+            either of which may be missing in practice. Note that its value is
+            usually a string taken from the .debug_string section and the
+            returned value will be a string.
+        """
+        comp_dir_attr = self.attributes.get('DW_AT_comp_dir', None)
+        comp_dir = bytes2str(comp_dir_attr.value) if comp_dir_attr else ''
+        fname_attr = self.attributes.get('DW_AT_name', None)
+        fname = bytes2str(fname_attr.value) if fname_attr else ''
+        return os.path.join(comp_dir, fname)
+
+    def iter_siblings(self):
+        """ Yield all siblings of this DIE
+        """
+        if self._parent:
+            for sibling in self._parent.iter_children():
+                if sibling is not self:
+                    yield sibling
+        else:
+            raise StopIteration()
+
+    def set_parent(self, die):
+        self._parent = die
+
+    def __repr__(self):
+        s = 'DIE %s, size=%s, has_chidren=%s\n' % (
+            self.tag, self.size, self.has_children)
+        for attrname, attrval in iteritems(self.attributes):
+            s += '    |%-18s:  %s\n' % (attrname, attrval)
+        return s
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class DIE(_DIEMixin):
     """ A DWARF debugging information entry. On creation, parses itself from
         the stream. Each DIE is held by a CU.
 
@@ -91,100 +149,56 @@ class DIE(object):
 
         self._parse_DIE()
 
-    def is_null(self):
-        """ Is this a null entry?
-        """
-        return self.tag is None
-
-    def get_parent(self):
-        """ The parent DIE of this DIE. None if the DIE has no parent (i.e. a
-            top-level DIE).
-        """
-        return self._parent
-
-    def get_full_path(self):
-        """ Return the full path filename for the DIE.
-
-            The filename is the join of 'DW_AT_comp_dir' and 'DW_AT_name',
-            either of which may be missing in practice. Note that its value is
-            usually a string taken from the .debug_string section and the
-            returned value will be a string.
-        """
-        comp_dir_attr = self.attributes.get('DW_AT_comp_dir', None)
-        comp_dir = bytes2str(comp_dir_attr.value) if comp_dir_attr else ''
-        fname_attr = self.attributes.get('DW_AT_name', None)
-        fname = bytes2str(fname_attr.value) if fname_attr else ''
-        return os.path.join(comp_dir, fname)
-
     def iter_children(self):
         """ Yield all children of this DIE
         """
         return iter(self._children)
 
-    def iter_siblings(self):
-        """ Yield all siblings of this DIE
-        """
-        if self._parent:
-            for sibling in self._parent.iter_children():
-                if sibling is not self:
-                    yield sibling
-        else:
-            raise StopIteration()
-
     # The following methods are used while creating the DIE and should not be
     # interesting to consumers
     #
     def add_child(self, die):
         self._children.append(die)
 
-    def set_parent(self, die):
-        self._parent = die
-
     #------ PRIVATE ------#
 
-    def __repr__(self):
-        s = 'DIE %s, size=%s, has_chidren=%s\n' % (
-            self.tag, self.size, self.has_children)
-        for attrname, attrval in iteritems(self.attributes):
-            s += '    |%-18s:  %s\n' % (attrname, attrval)
-        return s
-
-    def __str__(self):
-        return self.__repr__()
-
     def _parse_DIE(self):
         """ Parses the DIE info from the section, based on the abbreviation
             table of the CU
         """
-        structs = self.cu.structs
+        decoders = self.cu.structs.Dwarf_dw_form_decoders
+        # The DIE is decoded straight from the buffer of the section, not
+        # through the stream
+        buffer = self.dwarfinfo.get_debug_info_buffer()
 
         # A DIE begins with the abbreviation code. Read it and use it to
         # obtain the abbrev declaration for this DIE.
-        # Note: here and elsewhere, preserve_stream_pos is used on operations
-        # that manipulate the stream by reading data from it.
         #
-        self.abbrev_code = struct_parse(
-            structs.Dwarf_uleb128(''), self.stream, self.offset)
+        self.abbrev_code, offset = decode_uleb128(buffer, self.offset)
 
         # This may be a null entry
         if self.abbrev_code == 0:
-            self.size = self.stream.tell() - self.offset
+            self.size = offset - self.offset
             return
 
-        with preserve_stream_pos(self.stream):
-            abbrev_decl = self.cu.get_abbrev_table().get_abbrev(
-                self.abbrev_code)
-        self.tag = abbrev_decl['tag']
-        self.has_children = abbrev_decl.has_children()
+        self.tag, self.has_children, attr_specs = (
+            self.cu.get_compiled_abbrev(self.abbrev_code))
 
         # Guided by the attributes listed in the abbreviation declaration, parse
-        # values from the stream.
+        # values from the buffer, with the decoders of their forms.
         #
-        for name, form in abbrev_decl.iter_attr_specs():
-            attr_offset = self.stream.tell()
-            raw_value = struct_parse(structs.Dwarf_dw_form[form], self.stream)
+        for name, form, decoder in attr_specs:
+            attr_offset = offset
+            raw_value, offset = decoder(buffer, offset)
+
+            value_form = form
+            value_raw_value = raw_value
+            # Let's hope this doesn't get too deep :-)
+            while value_form == 'DW_FORM_indirect':
+                value_form = _resolve_indirect_form(value_raw_value)
+                value_raw_value, offset = decoders[value_form](buffer, offset)
 
-            value = self._translate_attr_value(form, raw_value)
+            value = self._translate_attr_value(value_form, value_raw_value)
             self.attributes[name] = AttributeValue(
                 name=name,
                 form=form,
@@ -192,29 +206,187 @@ class DIE(object):
                 raw_value=raw_value,
                 offset=attr_offset)
 
-        self.size = self.stream.tell() - self.offset
+        self.size = offset - self.offset
 
     def _translate_attr_value(self, form, raw_value):
         """ Translate a raw attr value according to the form
         """
         value = None
         if form == 'DW_FORM_strp':
-            with preserve_stream_pos(self.stream):
-                value = self.dwarfinfo.get_string_from_table(raw_value)
+            value = self.dwarfinfo.get_string_from_table(raw_value)
         elif form == 'DW_FORM_flag':
             value = not raw_value == 0
-        elif form == 'DW_FORM_indirect':
-            try:
-                form = DW_FORM_raw2name[raw_value]
-            except KeyError as err:
-                raise DWARFError(
-                        'Found DW_FORM_indirect with unknown raw_value=' +
-                        str(raw_value))
-
-            raw_value = struct_parse(
-                self.cu.structs.Dwarf_dw_form[form], self.stream)
-            # Let's hope this doesn't get too deep :-)
-            return self._translate_attr_value(form, raw_value)
         else:
             value = raw_value
         return value
+
+
+class CompactDIE(_DIEMixin):
+    """ A DWARF debugging information entry with a compact representation,
+        for loading the DIEs of large debug builds. Has the same interface as
+        DIE, but uses __slots__ and keeps the attributes of the entry as
+        tuples of raw values and offsets, parallel to the attribute specs of
+        its abbreviation declaration.
+
+        Attribute values are decoded on the first access to 'attributes',
+        which returns a read-only mapping producing AttributeValue objects on
+        demand.
+    """
+    __slots__ = ('cu', 'offset', 'tag', 'has_children', 'abbrev_code', 'size',
+                 '_abbrev_decl', '_raw_values', '_attr_offsets', '_values',
+                 '_children', '_parent')
+
+    def __init__(self, cu, stream, offset):
+        """ cu:
+                CompileUnit object this DIE belongs to
+
+            stream, offset:
+                The stream and offset into it where this DIE's data is located
+        """
+        self.cu = cu
+        self.offset = offset
+        self.tag = None
+        self.has_children = None
+        self.abbrev_code = None
+        self.size = 0
+        self._abbrev_decl = None
+        self._raw_values = ()
+        self._attr_offsets = ()
+        self._values = None
+        self._children = None
+        self._parent = None
+
+        self._parse_DIE(stream)
+
+    @property
+    def dwarfinfo(self):
+        return self.cu.dwarfinfo
+
+    @property
+    def stream(self):
+        return self.cu.dwarfinfo.debug_info_sec.stream
+
+    @property
+    def attributes(self):
+        """ A read-only ordered mapping of attribute names to AttributeValue
+            objects
+        """
+        if self._values is None and self._abbrev_decl is not None:
+            self._values = [
+                self._translate_attr_value(form, raw_value)
+                for form, raw_value in zip(self._abbrev_decl.attr_forms,
+                                           self._raw_values)]
+        return _CompactAttributes(self)
+
+    def iter_children(self):
+        """ Yield all children of this DIE
+        """
+        return iter(self._children or ())
+
+    def add_child(self, die):
+        if self._children is None:
+            self._children = []
+        self._children.append(die)
+
+    #------ PRIVATE ------#
+
+    def _get_attribute(self, index):
+        decl = self._abbrev_decl
+        raw_value = self._raw_values[index]
+        if decl.attr_forms[index] == 'DW_FORM_indirect':
+            raw_value = raw_value[0]
+        return AttributeValue(
+            name=decl.attr_names[index],
+            form=decl.attr_forms[index],
+            value=self._values[index],
+            raw_value=raw_value,
+            offset=self._attr_offsets[index])
+
+    def _parse_DIE(self, stream):
+        """ Parses the DIE info from the section, keeping the raw attribute
+            values undecoded
+        """
+        decoders = self.cu.structs.Dwarf_dw_form_decoders
+        buffer = self.dwarfinfo.get_debug_info_buffer()
+        self.abbrev_code, offset = decode_uleb128(buffer, self.offset)
+
+        if self.abbrev_code == 0:
+            self.size = offset - self.offset
+            return
+
+        self._abbrev_decl = self.cu.get_abbrev_table().get_abbrev(
+            self.abbrev_code)
+        self.tag, self.has_children, attr_specs = (
+            self.cu.get_compiled_abbrev(self.abbrev_code))
+
+        raw_values = []
+        attr_offsets = []
+        for _, form, decoder in attr_specs:
+            attr_offsets.append(offset)
+            raw_value, offset = decoder(buffer, offset)
+            if form == 'DW_FORM_indirect':
+                # Keep the raw form along with the actual form and raw value
+                # it resolves to
+                real_form, real_raw_value = form, raw_value
+                while real_form == 'DW_FORM_indirect':
+                    real_form = _resolve_indirect_form(real_raw_value)
+                    real_raw_value, offset = decoders[real_form](
+                        buffer, offset)
+                raw_value = (raw_value, real_form, real_raw_value)
+            raw_values.append(raw_value)
+        self._raw_values = tuple(raw_values)
+        self._attr_offsets = tuple(attr_offsets)
+
+        self.size = offset - self.offset
+
+    def _translate_attr_value(self, form, raw_value):
+        """ Translate a raw attr value according to the form
+        """
+        if form == 'DW_FORM_strp':
+            return self.dwarfinfo.get_string_from_table(raw_value)
+        elif form == 'DW_FORM_flag':
+            return not raw_value == 0
+        elif form == 'DW_FORM_indirect':
+            _, form, raw_value = raw_value
+            return self._translate_attr_value(form, raw_value)
+        return raw_value
+
+
+def _resolve_indirect_form(raw_value):
+    """ The name of the form a DW_FORM_indirect raw value stands for
+    """
+    try:
+        return DW_FORM_raw2name[raw_value]
+    except KeyError as err:
+        raise DWARFError(
+                'Found DW_FORM_indirect with unknown raw_value=' +
+                str(raw_value))
+
+
+class _CompactAttributes(Mapping):
+    """ The attributes of a CompactDIE, as a read-only ordered mapping
+    """
+    __slots__ = ('_die',)
+
+    def __init__(self, die):
+        self._die = die
+
+    def __getitem__(self, name):
+        decl = self._die._abbrev_decl
+        if decl is None:
+            raise KeyError(name)
+        return self._die._get_attribute(decl.attr_index[name])
+
+    def __contains__(self, name):
+        decl = self._die._abbrev_decl
+        return decl is not None and name in decl.attr_index
+
+    def __iter__(self):
+        decl = self._die._abbrev_decl
+        return iter(decl.attr_names if decl is not None else ())
+
+    def __len__(self):
+        return len(self._die._raw_values)
+
+    def __repr__(self):
+        return repr(OrderedDict(self.items()))
@@ -8,6 +8,7 @@
 #-------------------------------------------------------------------------------
 from ..common.py3compat import BytesIO, iteritems
 from ..common.utils import struct_parse, bytelist2string
+from .leb128 import decode_uleb128, decode_sleb128
 
 
 # DWARF expression opcodes. name -> opcode mapping
@@ -108,6 +109,7 @@ class GenericExprVisitor(object):
         self.structs = structs
         self._init_dispatch_table()
         self.stream = None
+        self._expr_buffer = None
         self._cur_opcode = None
         self._cur_opcode_name = None
         self._cur_args = []
@@ -117,6 +119,7 @@ class GenericExprVisitor(object):
             (integer) byte values.
         """
         self.stream = BytesIO(bytelist2string(expr))
+        self._expr_buffer = bytearray(expr)
 
         while True:
             # Get the next opcode from the stream. If nothing is left in the
@@ -173,6 +176,21 @@ class GenericExprVisitor(object):
                 struct_parse(struct_arg2, self.stream)]
         return visitor
 
+    def _make_visitor_arg_leb128(self, *decoders):
+        """ Create a visitor method for an opcode that accepts LEB128
+            arguments, decoded straight from the expression by the given
+            functions of the leb128 module.
+        """
+        def visitor(opcode, opcode_name):
+            offset = self.stream.tell()
+            args = []
+            for decode in decoders:
+                arg, offset = decode(self._expr_buffer, offset)
+                args.append(arg)
+            self.stream.seek(offset)
+            self._cur_args = args
+        return visitor
+
     def _init_dispatch_table(self):
         self._dispatch_table = {}
         def add(opcode_name, func):
@@ -200,13 +218,13 @@ class GenericExprVisitor(object):
                 self.structs.Dwarf_int32(''),
                 self.structs.Dwarf_int32('')))
         add('DW_OP_constu',
-            self._make_visitor_arg_struct(self.structs.Dwarf_uleb128('')))
+            self._make_visitor_arg_leb128(decode_uleb128))
         add('DW_OP_consts',
-            self._make_visitor_arg_struct(self.structs.Dwarf_sleb128('')))
+            self._make_visitor_arg_leb128(decode_sleb128))
         add('DW_OP_pick',
             self._make_visitor_arg_struct(self.structs.Dwarf_uint8('')))
         add('DW_OP_plus_uconst',
-            self._make_visitor_arg_struct(self.structs.Dwarf_uleb128('')))
+            self._make_visitor_arg_leb128(decode_uleb128))
         add('DW_OP_bra', 
             self._make_visitor_arg_struct(self.structs.Dwarf_int16('')))
         add('DW_OP_skip', 
@@ -227,22 +245,18 @@ class GenericExprVisitor(object):
             add('DW_OP_lit%s' % n, self._visit_OP_with_no_args)
             add('DW_OP_reg%s' % n, self._visit_OP_with_no_args)
             add('DW_OP_breg%s' % n, 
-                self._make_visitor_arg_struct(self.structs.Dwarf_sleb128('')))
+                self._make_visitor_arg_leb128(decode_sleb128))
 
         add('DW_OP_fbreg',
-            self._make_visitor_arg_struct(self.structs.Dwarf_sleb128('')))
+            self._make_visitor_arg_leb128(decode_sleb128))
         add('DW_OP_regx',
-            self._make_visitor_arg_struct(self.structs.Dwarf_uleb128('')))
+            self._make_visitor_arg_leb128(decode_uleb128))
         add('DW_OP_bregx',
-            self._make_visitor_arg_struct2(
-                self.structs.Dwarf_uleb128(''),
-                self.structs.Dwarf_sleb128('')))
+            self._make_visitor_arg_leb128(decode_uleb128, decode_sleb128))
         add('DW_OP_piece',
-            self._make_visitor_arg_struct(self.structs.Dwarf_uleb128('')))
+            self._make_visitor_arg_leb128(decode_uleb128))
         add('DW_OP_bit_piece',
-            self._make_visitor_arg_struct2(
-                self.structs.Dwarf_uleb128(''),
-                self.structs.Dwarf_uleb128('')))
+            self._make_visitor_arg_leb128(decode_uleb128, decode_uleb128))
         add('DW_OP_deref_size',
             self._make_visitor_arg_struct(self.structs.Dwarf_int8('')))
         add('DW_OP_xderef_size',
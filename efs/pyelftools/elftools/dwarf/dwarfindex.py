@@ -0,0 +1,447 @@
+#-------------------------------------------------------------------------------
+# elftools: dwarf/dwarfindex.py
+#
+# DWARFIndex - an on-disk index of the DWARF information of a file, reused
+# across runs instead of decoding the debug sections again
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+from bisect import bisect_left
+from collections import namedtuple
+import os
+import struct
+import sys
+
+from ..common.bufferstream import BufferStream
+from ..common.py3compat import bytes2str, str2bytes
+from .addressindex import AddressIndex, AddressRange
+from .lineprogram import LineTable
+from .nameindex import NameEntry
+
+
+# A file entry of a LineTable loaded from a DWARFIndex, with the attributes
+# of the line program header entries that LineTable uses
+#
+IndexedFileEntry = namedtuple('IndexedFileEntry', 'name dir_index')
+
+
+class DWARFIndex(object):
+    """ An index of the DWARF information of a file, kept in a sidecar file.
+        It holds:
+
+            - the offsets of the CUs in .debug_info
+            - the AddressIndex of the CUs, functions and inlined functions
+            - the NameIndex entries of the DIEs
+            - the LineTable of each CU
+
+        The file is tagged with a key identifying the contents of the file it
+        was built for (e.g. its build-id); load() rejects it for another key.
+        A loaded index is memory-mapped, and its tables are decoded lazily as
+        they are queried, so loading it takes constant time.
+
+        Accessible attributes:
+
+            key:
+                The key of the index
+
+            cu_offsets, cu_ends:
+                Sorted parallel sequences of the offsets of the CUs in
+                .debug_info and of the offsets where they end
+
+            address_index:
+                The AddressIndex of the file
+    """
+    MAGIC = b'PYELFIDX'
+    VERSION = 3
+
+    # The blocks of the file, in order, with the struct format of their
+    # items. Strings are referred to by their offset in the 'strings' block,
+    # where each is stored after its length (as an uint32).
+    _BLOCKS = (
+        ('strings', 'B'),
+        ('cu_offsets', 'Q'),
+        ('cu_ends', 'Q'),
+        # begin, end, cu_offset, die_offset, tag, name, depth
+        ('ranges', 'QQQQIII'),
+        ('segment_starts', 'Q'),
+        # first, count: the slice of segment_ranges covering the segment
+        ('segment_spans', 'II'),
+        # indices in ranges
+        ('segment_ranges', 'I'),
+        # name, die_offset, tag (sorted by name)
+        ('names', 'IQI'),
+        # cu_offset, first_row, num_rows, first_file, num_files, first_dir,
+        # num_dirs (sorted by cu_offset)
+        ('line_tables', 'QIIIIII'),
+        ('line_addresses', 'Q'),
+        ('line_files', 'I'),
+        ('line_lines', 'i'),
+        ('line_columns', 'I'),
+        ('line_flags', 'B'),
+        # name, dir_index
+        ('line_file_entries', 'II'),
+        # name
+        ('line_directories', 'I'),
+    )
+    _BLOCK_FORMATS = dict(_BLOCKS)
+
+    # The string reference of a missing string (e.g. a range with no name)
+    _NO_STRING = 0xFFFFFFFF
+
+    _HEADER = struct.Struct('<8sII')
+    _BLOCK_ENTRY = struct.Struct('<QQ')
+
+    def __init__(self, stream, key, blocks):
+        """ Use load() to create a DWARFIndex.
+
+            stream:
+                The BufferStream of the index file
+
+            key:
+                The key of the index
+
+            blocks:
+                A dict mapping block names to their (offset, count) in the
+                file
+        """
+        self.stream = stream
+        self.key = key
+        self._buffer = stream.buffer
+        self._blocks = blocks
+        self._strings = {}
+
+        self.cu_offsets = self._scalar_array('cu_offsets')
+        self.cu_ends = self._scalar_array('cu_ends')
+        self._ranges = self._records('ranges')
+        self.address_index = self._make_address_index()
+
+        self._names = self._records('names')
+        self._name_keys = _LazySequence(
+            len(self._names), lambda i: self._get_string(self._names[i][0]))
+        self._line_tables = self._records('line_tables')
+        self._line_table_keys = _LazySequence(
+            len(self._line_tables), lambda i: self._line_tables[i][0])
+        self._line_file_entries = self._records('line_file_entries')
+        self._line_directories = self._scalar_array('line_directories')
+
+    @classmethod
+    def load(cls, path, key):
+        """ Load the index file at path, memory-mapping it. Return None if it
+            doesn't exist, isn't a valid index file, or was built with another
+            key (e.g. for an older build of the file).
+        """
+        try:
+            stream = BufferStream.from_path(path)
+        except (IOError, OSError):
+            return None
+        try:
+            buffer = stream.buffer
+            magic, version, key_size = cls._HEADER.unpack_from(buffer, 0)
+            offset = cls._HEADER.size
+            if (magic != cls.MAGIC or version != cls.VERSION or
+                    buffer[offset:offset + key_size].tobytes() !=
+                        str2bytes(key)):
+                stream.close()
+                return None
+            offset = _align(offset + key_size)
+
+            blocks = {}
+            for name, fmt in cls._BLOCKS:
+                block_offset, count = cls._BLOCK_ENTRY.unpack_from(
+                    buffer, offset)
+                offset += cls._BLOCK_ENTRY.size
+                if (block_offset + count * struct.calcsize('<' + fmt) >
+                        len(buffer)):
+                    stream.close()
+                    return None
+                blocks[name] = (block_offset, count)
+            return cls(stream, key, blocks)
+        except (struct.error, ValueError):
+            stream.close()
+            return None
+
+    @classmethod
+    def write(cls, path, key, cu_offsets, cu_ends, address_index, names,
+              line_tables):
+        """ Write an index file at path. The file is replaced atomically.
+            Raises IOError/OSError if it can't be written.
+
+            key:
+                The key to tag the index with (a string)
+
+            cu_offsets, cu_ends:
+                The offsets of the CUs and where they end, as sorted parallel
+                sequences
+
+            address_index:
+                An AddressIndex
+
+            names:
+                An iterable of NameEntry objects
+
+            line_tables:
+                A dict mapping CU offsets to LineTable objects
+        """
+        strings = _StringTableWriter()
+        data = {
+            'cu_offsets': list(cu_offsets),
+            'cu_ends': list(cu_ends),
+        }
+
+        range_indices = {}
+        data['ranges'] = []
+        for i, r in enumerate(address_index.ranges):
+            range_indices[id(r)] = i
+            data['ranges'].append((
+                r.begin, r.end, r.cu_offset, r.die_offset,
+                strings.add(str2bytes(r.tag)), strings.add(r.name), r.depth))
+
+        data['segment_starts'] = []
+        data['segment_spans'] = []
+        data['segment_ranges'] = []
+        for start, covering in address_index.iter_segments():
+            data['segment_starts'].append(start)
+            data['segment_spans'].append(
+                (len(data['segment_ranges']), len(covering)))
+            data['segment_ranges'].extend(range_indices[id(r)]
+                                          for r in covering)
+
+        data['names'] = [
+            (strings.add(entry.name), entry.die_offset,
+             strings.add(str2bytes(entry.tag) if entry.tag else None))
+            for entry in sorted(names,
+                                key=lambda e: (e.name, e.die_offset))]
+
+        for name in ('line_tables', 'line_addresses', 'line_files',
+                     'line_lines', 'line_columns', 'line_flags',
+                     'line_file_entries', 'line_directories'):
+            data[name] = []
+        for cu_offset in sorted(line_tables):
+            table = line_tables[cu_offset]
+            data['line_tables'].append((
+                cu_offset,
+                len(data['line_addresses']), len(table),
+                len(data['line_file_entries']), len(table.file_entry),
+                len(data['line_directories']), len(table.include_directory)))
+            data['line_addresses'].extend(table.addresses)
+            data['line_files'].extend(table.files)
+            data['line_lines'].extend(table.lines)
+            data['line_columns'].extend(table.columns)
+            data['line_flags'].extend(table.flags)
+            data['line_file_entries'].extend(
+                (strings.add(entry.name), entry.dir_index)
+                for entry in table.file_entry)
+            data['line_directories'].extend(
+                strings.add(directory)
+                for directory in table.include_directory)
+
+        data['strings'] = strings.getvalue()
+
+        # The header, then the directory of the blocks, then the blocks, each
+        # aligned to 8 bytes
+        key = str2bytes(key)
+        header = cls._HEADER.pack(cls.MAGIC, cls.VERSION, len(key)) + key
+        offset = _align(len(header)) + len(cls._BLOCKS) * cls._BLOCK_ENTRY.size
+        directory = []
+        chunks = []
+        for name, fmt in cls._BLOCKS:
+            offset = _align(offset)
+            chunk = _pack_items(fmt, data[name])
+            directory.append(cls._BLOCK_ENTRY.pack(offset, len(data[name])))
+            chunks.append((offset, chunk))
+            offset += len(chunk)
+
+        tmppath = path + '.tmp'
+        try:
+            with open(tmppath, 'wb') as f:
+                f.write(header)
+                f.write(b'\0' * (_align(len(header)) - len(header)))
+                f.write(b''.join(directory))
+                for offset, chunk in chunks:
+                    f.write(b'\0' * (offset - f.tell()))
+                    f.write(chunk)
+            getattr(os, 'replace', os.rename)(tmppath, path)
+        except (IOError, OSError):
+            # Don't leave a partial file behind (e.g. on a full disk)
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
+            raise
+
+    def lookup_name(self, name):
+        """ Get the list of the NameEntry objects of the DIEs with the given
+            name (bytes), like NameIndex.lookup
+        """
+        i = bisect_left(self._name_keys, name)
+        entries = []
+        while i < len(self._names) and self._name_keys[i] == name:
+            _, die_offset, tag = self._names[i]
+            tag = self._get_string(tag)
+            entries.append(NameEntry(
+                name=name,
+                die_offset=die_offset,
+                tag=bytes2str(tag) if tag is not None else None))
+            i += 1
+        return entries
+
+    def get_line_table(self, cu_offset):
+        """ Get the LineTable of the CU at the given offset, or None if the
+            CU has no line program.
+        """
+        i = bisect_left(self._line_table_keys, cu_offset)
+        if i >= len(self._line_tables) or self._line_table_keys[i] != cu_offset:
+            return None
+        (_, first_row, num_rows, first_file, num_files, first_dir,
+            num_dirs) = self._line_tables[i]
+
+        file_entry = [
+            IndexedFileEntry(
+                name=self._get_string(self._line_file_entries[n][0]),
+                dir_index=self._line_file_entries[n][1])
+            for n in range(first_file, first_file + num_files)]
+        include_directory = [
+            self._get_string(self._line_directories[n])
+            for n in range(first_dir, first_dir + num_dirs)]
+
+        columns = [self._scalar_array(name, first_row, num_rows)
+                   for name in ('line_addresses', 'line_files', 'line_lines',
+                                'line_columns', 'line_flags')]
+        return LineTable.from_columns(
+            *columns, file_entry=file_entry,
+            include_directory=include_directory)
+
+    def close(self):
+        """ Unmap the index file
+        """
+        self.stream.close()
+
+    #------ PRIVATE ------#
+
+    def _make_address_index(self):
+        ranges = _LazySequence(len(self._ranges), self._get_range)
+        spans = self._records('segment_spans')
+        segment_ranges = self._scalar_array('segment_ranges')
+        covering = _LazySequence(
+            len(spans),
+            lambda i: tuple(ranges[segment_ranges[n]] for n in
+                            range(spans[i][0], spans[i][0] + spans[i][1])))
+        return AddressIndex.from_segments(
+            ranges, self._scalar_array('segment_starts'), covering)
+
+    def _get_range(self, i):
+        begin, end, cu_offset, die_offset, tag, name, depth = self._ranges[i]
+        return AddressRange(
+            begin=begin,
+            end=end,
+            tag=bytes2str(self._get_string(tag)),
+            name=self._get_string(name),
+            depth=depth,
+            cu_offset=cu_offset,
+            die_offset=die_offset)
+
+    def _get_string(self, offset):
+        """ The string at the given offset of the 'strings' block, or None
+            for _NO_STRING
+        """
+        if offset == self._NO_STRING:
+            return None
+        string = self._strings.get(offset)
+        if string is None:
+            start = self._blocks['strings'][0] + offset
+            size = struct.unpack_from('<I', self._buffer, start)[0]
+            string = self._buffer[start + 4:start + 4 + size].tobytes()
+            self._strings[offset] = string
+        return string
+
+    def _scalar_array(self, name, first=0, count=None):
+        """ A sequence of count items of a block of scalars, from its item
+            number first. Where the format matches the native one, it's a
+            zero-copy memoryview cast to it.
+        """
+        offset, size = self._blocks[name]
+        if count is None:
+            count = size - first
+        code = self._BLOCK_FORMATS[name]
+        itemsize = struct.calcsize('<' + code)
+        start = offset + first * itemsize
+        view = self._buffer[start:start + count * itemsize]
+        if (hasattr(view, 'cast') and sys.byteorder == 'little' and
+                struct.calcsize(code) == itemsize):
+            return view.cast(code)
+        item = struct.Struct('<' + code)
+        return _LazySequence(
+            count, lambda i: item.unpack_from(view, i * itemsize)[0])
+
+    def _records(self, name):
+        """ A sequence of the items of a block of records, as tuples
+        """
+        offset, count = self._blocks[name]
+        record = struct.Struct('<' + self._BLOCK_FORMATS[name])
+        return _LazySequence(
+            count,
+            lambda i: record.unpack_from(self._buffer, offset + i * record.size))
+
+
+class _LazySequence(object):
+    """ A read-only sequence computing its items on access, with a function
+        of their index
+    """
+    def __init__(self, length, getitem):
+        self._length = length
+        self._getitem = getitem
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError('index out of range')
+        return self._getitem(i)
+
+
+class _StringTableWriter(object):
+    """ Collects the strings of an index file, storing each distinct string
+        once
+    """
+    def __init__(self):
+        self._offsets = {}
+        self._chunks = []
+        self._size = 0
+
+    def add(self, string):
+        """ Add a string (bytes, or None) and return its offset
+        """
+        if string is None:
+            return DWARFIndex._NO_STRING
+        offset = self._offsets.get(string)
+        if offset is None:
+            offset = self._size
+            chunk = struct.pack('<I', len(string)) + string
+            self._chunks.append(chunk)
+            self._size += len(chunk)
+            self._offsets[string] = offset
+        return offset
+
+    def getvalue(self):
+        """ The strings block, as a bytes object
+        """
+        return b''.join(self._chunks)
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _pack_items(fmt, items):
+    """ Pack a list of items of the given struct format (scalars if the
+        format has one field, tuples otherwise) in little endian
+    """
+    if fmt == 'B' and isinstance(items, bytes):
+        return items
+    if len(fmt) == 1:
+        return struct.pack('<%d%s' % (len(items), fmt), *items)
+    record = struct.Struct('<' + fmt)
+    return b''.join(record.pack(*item) for item in items)
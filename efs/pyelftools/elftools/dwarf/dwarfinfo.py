@@ -6,19 +6,24 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
-from collections import namedtuple
+from bisect import bisect_right
+from collections import namedtuple, OrderedDict
 
 from ..common.exceptions import DWARFError
+from ..common.py3compat import iteritems, str2bytes
 from ..common.utils import (struct_parse, dwarf_assert,
-                            parse_cstring_from_stream)
+                            parse_cstring_from_stream, get_stream_buffer)
 from .structs import DWARFStructs
 from .compileunit import CompileUnit
 from .abbrevtable import AbbrevTable
 from .lineprogram import LineProgram
-from .callframe import CallFrameInfo
+from .callframe import CallFrameInfo, EHFrameHeader
 from .locationlists import LocationLists
 from .ranges import RangeLists
 from .aranges import ARanges
+from .addressindex import AddressIndexBuilder
+from .dwarfindex import DWARFIndex
+from .nameindex import NameIndexBuilder
 
 
 # Describes a debug section
@@ -27,12 +32,15 @@ from .aranges import ARanges
 # name: section name in the container file
 # global_offset: the global offset of the section in its container file
 # size: the size of the section's data, in bytes
+# address: the address of the section in memory (0 by default). Needed to
+#   decode the pc-relative pointers of .eh_frame
 #
 # 'name' and 'global_offset' are for descriptional purposes only and
 # aren't strictly required for the DWARF parsing to work.
 #
 DebugSectionDescriptor = namedtuple('DebugSectionDescriptor',
-    'stream name global_offset size')
+    'stream name global_offset size address')
+DebugSectionDescriptor.__new__.__defaults__ = (0,)
 
 
 # Some configuration parameters for the DWARF reader. This exists to allow
@@ -65,7 +73,13 @@ class DWARFInfo(object):
             debug_str_sec,
             debug_loc_sec,
             debug_ranges_sec,
-            debug_line_sec):
+            debug_line_sec,
+            debug_pubnames_sec=None,
+            debug_pubtypes_sec=None,
+            eh_frame_hdr_sec=None,
+            compact_dies=False,
+            cu_cache_size=256,
+            cfi_cache_size=1024):
         """ config:
                 A DwarfConfig object
 
@@ -73,6 +87,19 @@ class DWARFInfo(object):
                 DebugSectionDescriptor for a section. Pass None for sections
                 that don't exist. These arguments are best given with
                 keyword syntax.
+
+            compact_dies:
+                If True, CUs create CompactDIE objects instead of DIE, which
+                take much less memory and decode their attributes lazily
+
+            cu_cache_size:
+                The maximal number of CompileUnit objects kept by the LRU
+                cache of get_CU_at_offset. The DIEs of the CUs evicted from it
+                are freed once no one else refers to them.
+
+            cfi_cache_size:
+                The maximal number of decoded FDEs kept by the LRU cache of
+                unwind_rule_at
         """
         self.config = config
         self.debug_info_sec = debug_info_sec
@@ -84,6 +111,12 @@ class DWARFInfo(object):
         self.debug_loc_sec = debug_loc_sec
         self.debug_ranges_sec = debug_ranges_sec
         self.debug_line_sec = debug_line_sec
+        self.debug_pubnames_sec = debug_pubnames_sec
+        self.debug_pubtypes_sec = debug_pubtypes_sec
+        self.eh_frame_hdr_sec = eh_frame_hdr_sec
+        self.compact_dies = compact_dies
+        self.cu_cache_size = cu_cache_size
+        self.cfi_cache_size = cfi_cache_size
 
         # This is the DWARFStructs the context uses, so it doesn't depend on
         # DWARF format and address_size (these are determined per CU) - set them
@@ -96,10 +129,90 @@ class DWARFInfo(object):
         # Cache for abbrev tables: a dict keyed by offset
         self._abbrevtable_cache = {}
 
+        # The data of .debug_info as a buffer. Filled lazily.
+        self._debug_info_buffer = None
+
+        # The offsets of the CUs in .debug_info and the offsets where they
+        # end, as sorted parallel lists. Filled lazily.
+        self._cu_offsets = None
+        self._cu_ends = None
+
+        # LRU cache for CUs: an ordered dict keyed by offset
+        self._cu_cache = OrderedDict()
+
+        # The AddressIndex used by addr2line, and its cache of line tables:
+        # a dict keyed by CU offset
+        self._address_index = None
+        self._linetable_cache = {}
+
+        # The DWARFIndex loaded by load_index, if any
+        self._index = None
+
+        # The NameIndex used by lookup_name. Built lazily.
+        self._name_index = None
+
+        # The CallFrameInfo objects of .debug_frame and .eh_frame, created
+        # lazily, and the LRU cache of unwind_rule_at: an ordered dict of the
+        # decoded tables of FDEs, keyed by (for_eh_frame, FDE offset)
+        self._cfi = None
+        self._eh_cfi = None
+        self._unwind_table_cache = OrderedDict()
+
     def iter_CUs(self):
         """ Yield all the compile units (CompileUnit objects) in the debug info
+
+            The CUs already in the LRU cache of get_CU_at_offset are reused,
+            but the others aren't added to it: a full scan doesn't keep the
+            DIEs of the last cu_cache_size CUs alive.
         """
-        return self._parse_CUs_iter()
+        for offset in self._get_CU_offsets()[0]:
+            cu = self._cu_cache.get(offset)
+            yield cu if cu is not None else self._parse_CU_at_offset(offset)
+
+    def get_CU_at_offset(self, offset):
+        """ Get the CompileUnit whose header starts at the given offset in the
+            .debug_info section. Raise DWARFError if no CU starts there.
+
+            CompileUnit objects are kept in an LRU cache, so two calls for the
+            same offset usually return the same object (with its DIEs already
+            parsed).
+        """
+        cu = self._cu_cache.pop(offset, None)
+        if cu is not None:
+            # Reinsert it as the most recently used
+            self._cu_cache[offset] = cu
+            return cu
+
+        offsets, _ = self._get_CU_offsets()
+        i = bisect_right(offsets, offset) - 1
+        if i < 0 or offsets[i] != offset:
+            raise DWARFError('No CU at offset 0x%x' % offset)
+        cu = self._parse_CU_at_offset(offset)
+        self._cu_cache[offset] = cu
+        while len(self._cu_cache) > self.cu_cache_size:
+            self._cu_cache.popitem(last=False)
+        return cu
+
+    def get_CU_containing(self, die_offset):
+        """ Get the CompileUnit containing the given offset (typically of a
+            DIE) in the .debug_info section, or None if no CU contains it.
+        """
+        offsets, ends = self._get_CU_offsets()
+        i = bisect_right(offsets, die_offset) - 1
+        if i < 0 or die_offset >= ends[i]:
+            return None
+        return self.get_CU_at_offset(offsets[i])
+
+    def get_DIE_at_offset(self, offset):
+        """ Get the DIE at the given offset in the .debug_info section,
+            parsing only that DIE and the header of its CU. The DIE isn't
+            linked to its parent and children; iterate over the DIEs of its
+            CU (get_CU_containing) for that.
+        """
+        cu = self.get_CU_containing(offset)
+        if cu is None:
+            raise DWARFError('No DIE at offset 0x%x' % offset)
+        return cu.get_DIE_at_offset(offset)
 
     def get_abbrev_table(self, offset):
         """ Get an AbbrevTable from the given offset in the debug_abbrev
@@ -123,6 +236,15 @@ class DWARFInfo(object):
                 offset=offset)
         return self._abbrevtable_cache[offset]
 
+    def get_debug_info_buffer(self):
+        """ Get the data of the .debug_info section as a buffer (see
+            get_stream_buffer), which DIEs are parsed from.
+        """
+        if self._debug_info_buffer is None:
+            self._debug_info_buffer = get_stream_buffer(
+                self.debug_info_sec.stream)
+        return self._debug_info_buffer
+
     def get_string_from_table(self, offset):
         """ Obtain a string from the string table section, given an offset
             relative to the section.
@@ -151,11 +273,7 @@ class DWARFInfo(object):
     def CFI_entries(self):
         """ Get a list of dwarf_frame CFI entries from the .debug_frame section.
         """
-        cfi = CallFrameInfo(
-            stream=self.debug_frame_sec.stream,
-            size=self.debug_frame_sec.size,
-            base_structs=self.structs)
-        return cfi.get_entries()
+        return self._get_CFI().get_entries()
 
     def has_EH_CFI(self):
         """ Does this dwarf info have a eh_frame CFI section?
@@ -165,11 +283,35 @@ class DWARFInfo(object):
     def EH_CFI_entries(self):
         """ Get a list of eh_frame CFI entries from the .eh_frame section.
         """
-        cfi = CallFrameInfo(
-            stream=self.eh_frame_sec.stream,
-            size=self.eh_frame_sec.size,
-            base_structs=self.structs)
-        return cfi.get_entries()
+        return self._get_EH_CFI().get_entries()
+
+    def unwind_rule_at(self, address):
+        """ Get the row of the decoded call frame table (see
+            CFIEntry.get_decoded) that applies at the given address: a dict
+            with the 'pc', the 'cfa' rule and the rules of the registers. The
+            FDE containing the address is looked up in .debug_frame, then in
+            .eh_frame. Return None if no FDE contains it.
+
+            The decoded tables of the FDEs are kept in an LRU cache of
+            cfi_cache_size entries, so unwinding many stack samples decodes
+            each FDE once.
+        """
+        for for_eh_frame in (False, True):
+            if for_eh_frame:
+                if not self.has_EH_CFI():
+                    continue
+                cfi = self._get_EH_CFI()
+            else:
+                if not self.has_CFI():
+                    continue
+                cfi = self._get_CFI()
+            offset = cfi.find_FDE_offset(address)
+            if offset is None:
+                continue
+            pcs, table = self._get_unwind_table(cfi, for_eh_frame, offset)
+            i = bisect_right(pcs, address) - 1
+            return table[i] if i >= 0 else None
+        return None
 
     def get_aranges(self):
         """ Get an ARanges object representing the .debug_aranges section of
@@ -200,24 +342,222 @@ class DWARFInfo(object):
         else:
             return None
 
+    def build_address_index(self):
+        """ Build an AddressIndex of the address ranges of the CUs, functions
+            and inlined functions, in a single pass over the DIEs. Unlike
+            get_aranges(), this doesn't depend on .debug_aranges.
+        """
+        return AddressIndexBuilder(self).build()
+
+    def build_name_index(self):
+        """ Build a NameIndex of the DIEs of functions, types and variables,
+            from .debug_pubnames and .debug_pubtypes for the CUs they cover,
+            and in a single pass over the top-level DIEs of the other CUs.
+        """
+        return NameIndexBuilder(self).build()
+
+    def lookup_name(self, name, tag=None):
+        """ Find DIEs by name (a str, or bytes like the values of
+            DW_AT_name). Names in namespaces are qualified, as in 'ns::name'.
+            Return the sorted list of the offsets of the DIEs in .debug_info;
+            get_DIE_at_offset parses the DIE at an offset.
+
+            If tag is given, only the DIEs with this tag (or one of these tags,
+            if it's a collection of tags) are returned.
+
+            The names are indexed on the first call, or taken from the
+            DWARFIndex loaded by load_index.
+        """
+        if not isinstance(name, bytes):
+            name = str2bytes(name)
+        if isinstance(tag, str):
+            tag = (tag,)
+
+        if self._index is not None:
+            entries = self._index.lookup_name(name)
+        else:
+            entries = self._get_name_index().lookup(name)
+
+        offsets = set()
+        for entry in entries:
+            if tag is not None:
+                entry_tag = entry.tag
+                if entry_tag is None:
+                    # The entry comes from a name table: parse the DIE
+                    entry_tag = self.get_DIE_at_offset(entry.die_offset).tag
+                if entry_tag not in tag:
+                    continue
+            offsets.add(entry.die_offset)
+        return sorted(offsets)
+
+    def addr2line(self, addresses):
+        """ Resolve a batch of addresses to source lines. Return a list of
+            LineInfo objects in the same order as the addresses, with None for
+            the addresses that no line program covers.
+
+            The CUs are found with an AddressIndex, and the line program of
+            each CU is decoded once into a LineTable, which is cached for the
+            next calls.
+        """
+        if self._address_index is None:
+            self._address_index = self.build_address_index()
+
+        # Group the addresses by CU, so that each line table is searched with
+        # a single batch
+        results = [None] * len(addresses)
+        by_cu = {}
+        for n, ranges in enumerate(self._address_index.lookup_many(addresses)):
+            if ranges:
+                by_cu.setdefault(ranges[0].cu_offset, []).append(n)
+
+        for cu_offset, indices in iteritems(by_cu):
+            linetable = self._get_line_table(cu_offset)
+            if linetable is None:
+                continue
+            infos = linetable.lookup_many([addresses[n] for n in indices])
+            for n, info in zip(indices, infos):
+                results[n] = info
+        return results
+
+    def load_index(self, path, key):
+        """ Load the DWARFIndex file at path if it was written for the given
+            key (see write_index), and answer the queries it covers from it:
+            the CU offsets, the address index and the line tables of addr2line,
+            and the names of lookup_name.
+            Return True if it was loaded, False if there is no valid index for
+            the key at path.
+        """
+        index = DWARFIndex.load(path, key)
+        if index is None:
+            return False
+        self._index = index
+        self._cu_offsets = index.cu_offsets
+        self._cu_ends = index.cu_ends
+        self._address_index = index.address_index
+        self._linetable_cache = {}
+        return True
+
+    def write_index(self, path, key):
+        """ Write a DWARFIndex file at path, tagged with key (a string
+            identifying the contents of the file, e.g. its build-id). This
+            decodes the line programs of all the CUs and indexes the names of
+            their DIEs, so it's as costly as a first addr2line and a first
+            lookup_name over the whole file.
+        """
+        if self._address_index is None:
+            self._address_index = self.build_address_index()
+        offsets, ends = self._get_CU_offsets()
+        line_tables = {}
+        for offset in offsets:
+            linetable = self._get_line_table(offset)
+            if linetable is not None:
+                line_tables[offset] = linetable
+        DWARFIndex.write(
+            path, key,
+            cu_offsets=offsets,
+            cu_ends=ends,
+            address_index=self._address_index,
+            names=self._get_name_index(),
+            line_tables=line_tables)
+
     #------ PRIVATE ------#
 
-    def _parse_CUs_iter(self):
-        """ Parse CU entries from debug_info. Yield CUs in order of appearance.
+    def _get_line_table(self, cu_offset):
+        """ Get the (cached) LineTable of the CU at the given offset, or None
+            if the CU has no line program.
+        """
+        if cu_offset not in self._linetable_cache:
+            if self._index is not None:
+                linetable = self._index.get_line_table(cu_offset)
+            else:
+                lineprog = self.line_program_for_CU(
+                    self.get_CU_at_offset(cu_offset))
+                linetable = (
+                    lineprog.get_line_table() if lineprog is not None else None)
+            self._linetable_cache[cu_offset] = linetable
+        return self._linetable_cache[cu_offset]
+
+    def _get_name_index(self):
+        if self._name_index is None:
+            self._name_index = self.build_name_index()
+        return self._name_index
+
+    def _get_CU_offsets(self):
+        """ Get the offsets of the CUs in .debug_info and the offsets where
+            they end, as sorted parallel lists. Only the initial length of
+            each CU header is read to build them, on the first call.
+        """
+        if self._cu_offsets is None:
+            offsets = []
+            ends = []
+            if self.debug_info_sec is not None:
+                stream = self.debug_info_sec.stream
+                offset = 0
+                while offset < self.debug_info_sec.size:
+                    # Compute the offset of the next CU in the section. The
+                    # unit_length field of the CU header contains its size not
+                    # including the length field itself (see also
+                    # _parse_CU_at_offset).
+                    unit_length = struct_parse(
+                        self.structs.Dwarf_uint32(''), stream, offset)
+                    if unit_length == 0xFFFFFFFF:
+                        unit_length = struct_parse(
+                            self.structs.Dwarf_uint64(''), stream)
+                    offsets.append(offset)
+                    offset = stream.tell() + unit_length
+                    ends.append(offset)
+            self._cu_offsets = offsets
+            self._cu_ends = ends
+        return self._cu_offsets, self._cu_ends
+
+    def _get_CFI(self):
+        """ The CallFrameInfo of .debug_frame
+        """
+        if self._cfi is None:
+            self._cfi = CallFrameInfo(
+                stream=self.debug_frame_sec.stream,
+                size=self.debug_frame_sec.size,
+                base_structs=self.structs)
+        return self._cfi
+
+    def _get_EH_CFI(self):
+        """ The CallFrameInfo of .eh_frame, searched through the table of
+            .eh_frame_hdr if there is one
+        """
+        if self._eh_cfi is None:
+            eh_frame_hdr = None
+            if self.eh_frame_hdr_sec is not None:
+                eh_frame_hdr = EHFrameHeader(
+                    stream=self.eh_frame_hdr_sec.stream,
+                    size=self.eh_frame_hdr_sec.size,
+                    address=self.eh_frame_hdr_sec.address,
+                    base_structs=self.structs)
+                if eh_frame_hdr.eh_frame_address != self.eh_frame_sec.address:
+                    # The table is of another .eh_frame section
+                    eh_frame_hdr = None
+            self._eh_cfi = CallFrameInfo(
+                stream=self.eh_frame_sec.stream,
+                size=self.eh_frame_sec.size,
+                base_structs=self.structs,
+                for_eh_frame=True,
+                address=self.eh_frame_sec.address,
+                eh_frame_hdr=eh_frame_hdr)
+        return self._eh_cfi
+
+    def _get_unwind_table(self, cfi, for_eh_frame, offset):
+        """ Get the (pcs, table) pair of the decoded table of the FDE at the
+            given offset of the CallFrameInfo: its rows, and the sorted list
+            of their pcs. Kept in the LRU cache of unwind_rule_at.
         """
-        if self.debug_info_sec is None:
-            return
-
-        offset = 0
-        while offset < self.debug_info_sec.size:
-            cu = self._parse_CU_at_offset(offset)
-            # Compute the offset of the next CU in the section. The unit_length
-            # field of the CU header contains its size not including the length
-            # field itself.
-            offset = (  offset +
-                        cu['unit_length'] +
-                        cu.structs.initial_length_field_size())
-            yield cu
+        key = (for_eh_frame, offset)
+        entry = self._unwind_table_cache.pop(key, None)
+        if entry is None:
+            table = cfi.get_entry_at_offset(offset).get_decoded().table
+            entry = ([row['pc'] for row in table], table)
+        self._unwind_table_cache[key] = entry
+        while len(self._unwind_table_cache) > self.cfi_cache_size:
+            self._unwind_table_cache.popitem(last=False)
+        return entry
 
     def _parse_CU_at_offset(self, offset):
         """ Parse and return a CU at the given offset in the debug_info stream.
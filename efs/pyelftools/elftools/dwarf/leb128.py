@@ -0,0 +1,56 @@
+#-------------------------------------------------------------------------------
+# elftools: dwarf/leb128.py
+#
+# Decoding of LEB128 variable-length integers straight from buffers
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+from ..common.exceptions import ELFParseError
+
+
+# These decode the LEB128 encoded number at the given offset of a buffer, and
+# return a (value, new_offset) tuple, new_offset being the offset following the
+# number. The buffer must yield integers when indexed: bytes on Python 3, a
+# bytearray, or a memoryview of unsigned bytes (see get_stream_buffer).
+#
+# They are equivalent to the Dwarf_uleb128 and Dwarf_sleb128 construct structs
+# of DWARFStructs, without their overhead.
+
+def decode_uleb128(buffer, offset):
+    """ Decode an unsigned LEB128 number
+    """
+    try:
+        byte = buffer[offset]
+        if byte < 0x80:
+            return byte, offset + 1
+        value = byte & 0x7F
+        shift = 7
+        while True:
+            offset += 1
+            byte = buffer[offset]
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value, offset + 1
+            shift += 7
+    except IndexError:
+        raise ELFParseError('Unterminated LEB128 number')
+
+
+def decode_sleb128(buffer, offset):
+    """ Decode a signed LEB128 number
+    """
+    try:
+        value = 0
+        shift = 0
+        while True:
+            byte = buffer[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                if byte & 0x40:
+                    # negative -> sign extend
+                    value |= - (1 << shift)
+                return value, offset
+    except IndexError:
+        raise ELFParseError('Unterminated LEB128 number')
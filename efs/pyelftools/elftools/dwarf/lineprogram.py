@@ -6,12 +6,14 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
-import os
 import copy
+from array import array
+from bisect import bisect_right
 from collections import namedtuple
 
-from ..common.utils import struct_parse
+from ..common.utils import struct_parse, dwarf_assert, get_stream_buffer
 from .constants import *
+from .leb128 import decode_uleb128, decode_sleb128
 
 
 # LineProgramEntry - an entry in the line program.
@@ -40,6 +42,44 @@ LineProgramEntry = namedtuple(
     'LineProgramEntry', 'command is_extended args state')
 
 
+# LineInfo - the source location of an address, as resolved by a LineTable.
+#
+# address:
+#   The address that was looked up
+#
+# filename:
+#   The name of the source file, from the file_entry list of the line program
+#   header (None if the file index is invalid)
+#
+# directory:
+#   The include directory of the file, or None if the file is in the
+#   compilation directory of the CU
+#
+# line, column:
+#   The source line and column
+#
+# is_stmt:
+#   Whether the address is a recommended breakpoint location
+#
+LineInfo = namedtuple('LineInfo',
+    'address filename directory line column is_stmt')
+
+
+# LineSequence - a sequence of rows of a line program (a series of
+# contiguous target addresses, ended by a DW_LNE_end_sequence instruction),
+# as listed by the sequence index of LineProgram.get_sequences().
+#
+# address, end_address:
+#   The range of addresses [address, end_address) covered by the sequence:
+#   the addresses of its first row and of the row ending it
+#
+# offset:
+#   The offset in the stream of the first instruction of the sequence, where
+#   decoding can start with the initial state (see LineProgram.iter_rows)
+#
+LineSequence = namedtuple('LineSequence', 'address end_address offset')
+
+
 class LineState(object):
     """ Represents a line program state (or a "row" in the matrix
         describing debug location information for addresses).
@@ -47,6 +87,12 @@ class LineState(object):
         described in section 6.2.2 of DWARFv3
     """
     def __init__(self, default_is_stmt):
+        self.reset(default_is_stmt)
+
+    def reset(self, default_is_stmt):
+        """ Set the registers to their initial values, as at the start of a
+            sequence
+        """
         self.address = 0
         self.file = 1
         self.line = 1
@@ -101,6 +147,19 @@ class LineProgram(object):
         self.program_end_offset = program_end_offset
         self._decoded_entries = None
 
+        # The sequence index, and the sorted list of the addresses of its
+        # sequences. Built lazily, along with the checkpoints of the
+        # sequences: a dict mapping the offset of a sequence to the sorted
+        # list of the addresses of its checkpoints and the parallel list of
+        # the checkpoints.
+        self._sequences = None
+        self._sequence_addresses = None
+        self._checkpoints = None
+
+        # The offsets of the DW_LNE_define_file instructions whose file entry
+        # was already appended to the header
+        self._defined_file_offsets = set()
+
     def get_entries(self):
         """ Get the decoded entries for this line program. Return a list of
             LineProgramEntry objects.
@@ -111,145 +170,455 @@ class LineProgram(object):
             with readelf and debugging.
         """
         if self._decoded_entries is None:
-            self._decoded_entries = self._decode_line_program()
+            self._decoded_entries = list(self.iter_entries())
         return self._decoded_entries
 
+    def iter_entries(self, snapshot=True):
+        """ Decode the line program incrementally, yielding the entries of
+            get_entries() as they're decoded, without keeping them.
+
+            If snapshot is False, the states of the entries are all the same
+            LineState object, updated in place as the decoding goes on: a
+            state is only valid until the next entry is requested.
+        """
+        return self._iter_program(
+            self.program_start_offset, snapshot=snapshot, rows_only=False)
+
+    def iter_rows(self, start_offset=None, stop_address=None,
+                  stop_at_end_sequence=False, snapshot=False):
+        """ Decode the line program incrementally, yielding only the rows
+            of the line table (LineState objects), as they're decoded.
+
+            start_offset:
+                The offset in the stream where decoding starts. It must be
+                the start of a sequence, e.g. the offset of a LineSequence.
+                By default, the start of the program.
+
+            stop_address:
+                If given, decoding stops before the first row with a higher
+                address. Within a sequence, the last row yielded is then the
+                one covering stop_address (unless it ends the sequence).
+
+            stop_at_end_sequence:
+                If True, decoding stops after the row ending the first
+                sequence.
+
+            snapshot:
+                If False (the default), the same LineState object is updated
+                in place and yielded for every row, so a row is only valid
+                until the next one is requested. If True, each row is a copy.
+        """
+        if start_offset is None:
+            start_offset = self.program_start_offset
+        return self._iter_program(
+            start_offset, snapshot=snapshot, rows_only=True,
+            stop_address=stop_address,
+            stop_at_end_sequence=stop_at_end_sequence)
+
+    def get_sequences(self):
+        """ Get the sequence index of the line program: the list of its
+            LineSequence objects, sorted by address. It's built on the first
+            call by decoding the program once, without keeping its rows.
+        """
+        if self._sequences is None:
+            offsets = [self.program_start_offset]
+            sequences = []
+            self._checkpoints = {}
+            checkpoints = []
+            address = None
+            for row in self._iter_program(
+                    self.program_start_offset, snapshot=False, rows_only=True,
+                    sequence_offsets=offsets, checkpoints=checkpoints):
+                if address is None:
+                    address = row.address
+                if row.end_sequence:
+                    # The offset of the sequence is the one recorded when the
+                    # previous sequence ended
+                    sequence = LineSequence(
+                        address=address,
+                        end_address=row.address,
+                        offset=offsets[len(sequences)])
+                    sequences.append(sequence)
+                    self._checkpoints[sequence.offset] = (
+                        [state.address for _, state in checkpoints],
+                        checkpoints)
+                    checkpoints = []
+                    address = None
+            sequences.sort(key=lambda seq: seq.address)
+            self._sequences = sequences
+            self._sequence_addresses = [seq.address for seq in sequences]
+        return self._sequences
+
+    def find_row(self, address):
+        """ Get the row of the line table covering the address (a LineState
+            object), or None if no sequence covers it. The sequence covering
+            the address is found with the sequence index, and only decoded
+            from its last checkpoint before the address.
+        """
+        sequences = self.get_sequences()
+        i = bisect_right(self._sequence_addresses, address) - 1
+        # Sequences may overlap (e.g. in an object file, where they all
+        # start at 0), so the ones starting before the address are tried
+        # from the closest
+        while i >= 0:
+            sequence = sequences[i]
+            if address < sequence.end_address:
+                found = self._find_row_in_sequence(sequence, address)
+                if found is not None and not found.end_sequence:
+                    return found
+            i -= 1
+        return None
+
+    def get_line_table(self):
+        """ Get a LineTable: the rows of the line program, in compact arrays
+            sorted by address for fast lookups.
+        """
+        return LineTable(self)
+
     #------ PRIVATE ------#
-    
+
+    # The number of rows between two checkpoints of a sequence
+    CHECKPOINT_INTERVAL = 64
+
     def __getitem__(self, name):
         """ Implement dict-like access to header entries
         """
         return self.header[name]
 
-    def _decode_line_program(self):
-        entries = []
-        state = LineState(self.header['default_is_stmt'])
+    def _find_row_in_sequence(self, sequence, address):
+        """ The last row of the sequence with an address lower or equal to
+            the given one, or None
+        """
+        checkpoint_addresses, checkpoints = self._checkpoints[sequence.offset]
+        i = bisect_right(checkpoint_addresses, address) - 1
+        if i >= 0:
+            offset, found = checkpoints[i]
+            found = copy.copy(found)
+        else:
+            offset, found = sequence.offset, None
+        for row in self._iter_program(
+                offset, snapshot=True, rows_only=True, stop_address=address,
+                stop_at_end_sequence=True, start_state=found):
+            found = row
+        return found
+
+    def _iter_program(self, start_offset, snapshot, rows_only,
+                      stop_address=None, stop_at_end_sequence=False,
+                      sequence_offsets=None, start_state=None,
+                      checkpoints=None):
+        """ Decode the line program from start_offset, which must be the
+            start of a sequence (or the offset of a checkpoint, given with
+            its row as start_state), yielding LineProgramEntry objects as
+            they're decoded (only their states if rows_only).
 
-        def add_entry_new_state(cmd, args, is_extended=False):
-            # Add an entry that sets a new state.
-            # After adding, clear some state registers.
-            entries.append(LineProgramEntry(
-                cmd, is_extended, args, copy.copy(state)))
+            Unless snapshot is True, a single LineState object is updated
+            in place and yielded for every row. Decoding stops before a row
+            with an address above stop_address, and after the row ending a
+            sequence if stop_at_end_sequence. The offset after each
+            end_sequence instruction is appended to sequence_offsets if it's
+            a list, and a (offset, row) checkpoint is appended to checkpoints
+            every CHECKPOINT_INTERVAL rows of a sequence if it's a list.
+        """
+        header = self.header
+        default_is_stmt = header['default_is_stmt']
+        opcode_base = header['opcode_base']
+        line_base = header['line_base']
+        line_range = header['line_range']
+        minimum_instruction_length = header['minimum_instruction_length']
+        maximum_operations_per_instruction = (
+            header['maximum_operations_per_instruction'])
+        if start_state is None:
+            state = LineState(default_is_stmt)
+        else:
+            state = copy.copy(start_state)
             state.basic_block = False
             state.prologue_end = False
             state.epilogue_begin = False
+        num_rows = 0
+
+        # The program is decoded straight from the buffer of the stream
+        buffer = get_stream_buffer(self.stream)
+        decoders = self.structs.Dwarf_dw_form_decoders
+        decode_uint16 = decoders['DW_FORM_data2']
+        decode_target_addr = decoders['DW_FORM_addr']
 
-        def add_entry_old_state(cmd, args, is_extended=False):
-            # Add an entry that doesn't visibly set a new state
-            entries.append(LineProgramEntry(cmd, is_extended, args, None))
+        offset = start_offset
+        end_offset = self.program_end_offset
+        while offset < end_offset:
+            command_offset = offset
+            opcode = buffer[offset]
+            offset += 1
 
-        offset = self.program_start_offset
-        while offset < self.program_end_offset:
-            opcode = struct_parse(
-                self.structs.Dwarf_uint8(''), 
-                self.stream,
-                offset)
+            # The command is described by an entry with these arguments,
+            # unless they're left None. new_state tells whether the command
+            # adds a row.
+            command = opcode
+            is_extended = False
+            args = None
+            new_state = False
 
             # As an exercise in avoiding premature optimization, if...elif
             # chains are used here for standard and extended opcodes instead
             # of dispatch tables. This keeps the code much cleaner. Besides,
             # the majority of instructions in a typical program are special
             # opcodes anyway.
-            if opcode >= self.header['opcode_base']:
+            if opcode >= opcode_base:
                 # Special opcode (follow the recipe in 6.2.5.1)
-                maximum_operations_per_instruction = self['maximum_operations_per_instruction']
-                adjusted_opcode = opcode - self['opcode_base']
-                operation_advance = adjusted_opcode // self['line_range']
+                adjusted_opcode = opcode - opcode_base
+                operation_advance = adjusted_opcode // line_range
                 address_addend = (
-                    self['minimum_instruction_length'] * 
+                    minimum_instruction_length *
                         ((state.op_index + operation_advance) //
                           maximum_operations_per_instruction))
                 state.address += address_addend
                 state.op_index = (state.op_index + operation_advance) % maximum_operations_per_instruction
-                line_addend = self['line_base'] + (adjusted_opcode % self['line_range'])
+                line_addend = line_base + (adjusted_opcode % line_range)
                 state.line += line_addend
-                add_entry_new_state(
-                    opcode, [line_addend, address_addend, state.op_index])
+                args = [line_addend, address_addend, state.op_index]
+                new_state = True
             elif opcode == 0:
                 # Extended opcode: start with a zero byte, followed by
                 # instruction size and the instruction itself.
-                inst_len = struct_parse(self.structs.Dwarf_uleb128(''),
-                                        self.stream)
-                ex_opcode = struct_parse(self.structs.Dwarf_uint8(''),
-                                         self.stream)
+                inst_len, offset = decode_uleb128(buffer, offset)
+                command = buffer[offset]
+                is_extended = True
+                offset += 1
 
-                if ex_opcode == DW_LNE_end_sequence:
+                if command == DW_LNE_end_sequence:
                     state.end_sequence = True
-                    add_entry_new_state(ex_opcode, [], is_extended=True)
-                    # reset state
-                    state = LineState(self.header['default_is_stmt']) 
-                elif ex_opcode == DW_LNE_set_address:
-                    operand = struct_parse(self.structs.Dwarf_target_addr(''),
-                                           self.stream)
+                    args = []
+                    new_state = True
+                elif command == DW_LNE_set_address:
+                    operand, offset = decode_target_addr(buffer, offset)
                     state.address = operand
-                    add_entry_old_state(ex_opcode, [operand], is_extended=True)
-                elif ex_opcode == DW_LNE_define_file:
+                    args = [operand]
+                elif command == DW_LNE_define_file:
                     operand = struct_parse(
-                        self.structs.Dwarf_lineprog_file_entry, self.stream)
-                    self['file_entry'].append(operand)
-                    add_entry_old_state(ex_opcode, [operand], is_extended=True)
+                        self.structs.Dwarf_lineprog_file_entry, self.stream,
+                        offset)
+                    offset = self.stream.tell()
+                    # The program may be decoded more than once, but each
+                    # file is defined once
+                    if command_offset not in self._defined_file_offsets:
+                        self._defined_file_offsets.add(command_offset)
+                        self['file_entry'].append(operand)
+                    args = [operand]
                 else:
-                    # Unknown, but need to roll forward the stream because the
-                    # length is specified. Seek forward inst_len - 1 because
+                    # Unknown, but need to roll forward the offset because the
+                    # length is specified. Move forward inst_len - 1 because
                     # we've already read the extended opcode, which takes part
                     # in the length.
-                    self.stream.seek(inst_len - 1, os.SEEK_CUR)
+                    offset += inst_len - 1
             else: # 0 < opcode < opcode_base
                 # Standard opcode
                 if opcode == DW_LNS_copy:
-                    add_entry_new_state(opcode, [])
+                    args = []
+                    new_state = True
                 elif opcode == DW_LNS_advance_pc:
-                    operand = struct_parse(self.structs.Dwarf_uleb128(''),
-                                           self.stream)
+                    operand, offset = decode_uleb128(buffer, offset)
                     address_addend = (
-                        operand * self.header['minimum_instruction_length'])
+                        operand * minimum_instruction_length)
                     state.address += address_addend
-                    add_entry_old_state(opcode, [address_addend])
+                    args = [address_addend]
                 elif opcode == DW_LNS_advance_line:
-                    operand = struct_parse(self.structs.Dwarf_sleb128(''),
-                                           self.stream)
+                    operand, offset = decode_sleb128(buffer, offset)
                     state.line += operand
                 elif opcode == DW_LNS_set_file:
-                    operand = struct_parse(self.structs.Dwarf_uleb128(''),
-                                           self.stream)
+                    operand, offset = decode_uleb128(buffer, offset)
                     state.file = operand
-                    add_entry_old_state(opcode, [operand])
+                    args = [operand]
                 elif opcode == DW_LNS_set_column:
-                    operand = struct_parse(self.structs.Dwarf_uleb128(''),
-                                           self.stream)
+                    operand, offset = decode_uleb128(buffer, offset)
                     state.column = operand
-                    add_entry_old_state(opcode, [operand])
+                    args = [operand]
                 elif opcode == DW_LNS_negate_stmt:
                     state.is_stmt = not state.is_stmt
-                    add_entry_old_state(opcode, [])
+                    args = []
                 elif opcode == DW_LNS_set_basic_block:
                     state.basic_block = True
-                    add_entry_old_state(opcode, [])
+                    args = []
                 elif opcode == DW_LNS_const_add_pc:
-                    adjusted_opcode = 255 - self['opcode_base']
-                    address_addend = ((adjusted_opcode // self['line_range']) *
-                                      self['minimum_instruction_length'])
+                    adjusted_opcode = 255 - opcode_base
+                    address_addend = ((adjusted_opcode // line_range) *
+                                      minimum_instruction_length)
                     state.address += address_addend
-                    add_entry_old_state(opcode, [address_addend])
+                    args = [address_addend]
                 elif opcode == DW_LNS_fixed_advance_pc:
-                    operand = struct_parse(self.structs.Dwarf_uint16(''),
-                                           self.stream)
+                    operand, offset = decode_uint16(buffer, offset)
                     state.address += operand
-                    add_entry_old_state(opcode, [operand])
+                    args = [operand]
                 elif opcode == DW_LNS_set_prologue_end:
                     state.prologue_end = True
-                    add_entry_old_state(opcode, [])
+                    args = []
                 elif opcode == DW_LNS_set_epilogue_begin:
                     state.epilogue_begin = True
-                    add_entry_old_state(opcode, [])
+                    args = []
                 elif opcode == DW_LNS_set_isa:
-                    operand = struct_parse(self.structs.Dwarf_uleb128(''),
-                                           self.stream)
+                    operand, offset = decode_uleb128(buffer, offset)
                     state.isa = operand
-                    add_entry_old_state(opcode, [operand])
+                    args = [operand]
                 else:
                     dwarf_assert(False, 'Invalid standard line program opcode: %s' % (
                         opcode,))
-            offset = self.stream.tell()
-        return entries
 
+            if args is None:
+                continue
+            if not new_state:
+                # An entry that doesn't visibly set a new state
+                if not rows_only:
+                    yield LineProgramEntry(command, is_extended, args, None)
+                continue
+
+            # An entry that sets a new state
+            if stop_address is not None and state.address > stop_address:
+                return
+            row = copy.copy(state) if snapshot else state
+            if rows_only:
+                yield row
+            else:
+                yield LineProgramEntry(command, is_extended, args, row)
+
+            if state.end_sequence:
+                if sequence_offsets is not None:
+                    sequence_offsets.append(offset)
+                if stop_at_end_sequence:
+                    return
+                state.reset(default_is_stmt)
+                num_rows = 0
+            else:
+                num_rows += 1
+                if (checkpoints is not None and
+                        num_rows % self.CHECKPOINT_INTERVAL == 0):
+                    checkpoints.append((offset, copy.copy(state)))
+                # After adding, clear some state registers.
+                state.basic_block = False
+                state.prologue_end = False
+                state.epilogue_begin = False
+
+
+def _address_array():
+    """ An empty array suitable for target addresses
+    """
+    try:
+        return array('Q')
+    except ValueError:
+        # Python 2 has no 'Q' typecode
+        return array('L')
+
+
+class LineTable(object):
+    """ The rows of a line program (the "line table" matrix described in
+        section 6.2 of DWARFv3), stored as parallel arrays sorted by address,
+        so that addresses can be resolved to source lines by binary search.
+
+        The row of an address is the last row with an address lower or equal
+        to it, unless that row ends a sequence (then the address isn't
+        covered by the line program).
+
+        Accessible attributes:
+
+            addresses, files, lines, columns, flags:
+                The parallel arrays of the rows. flags is a bitmask of the
+                FLAG_* constants.
+    """
+    FLAG_IS_STMT = 0x1
+    FLAG_BASIC_BLOCK = 0x2
+    FLAG_END_SEQUENCE = 0x4
+    FLAG_PROLOGUE_END = 0x8
+    FLAG_EPILOGUE_BEGIN = 0x10
+
+    def __init__(self, lineprogram):
+        """ lineprogram:
+                The LineProgram to build the table from
+        """
+        self.file_entry = lineprogram['file_entry']
+        self.include_directory = lineprogram['include_directory']
+
+        rows = []
+        for state in lineprogram.iter_rows():
+            flags = (
+                (state.is_stmt and self.FLAG_IS_STMT) |
+                (state.basic_block and self.FLAG_BASIC_BLOCK) |
+                (state.end_sequence and self.FLAG_END_SEQUENCE) |
+                (state.prologue_end and self.FLAG_PROLOGUE_END) |
+                (state.epilogue_begin and self.FLAG_EPILOGUE_BEGIN))
+            rows.append((state.address, state.file, state.line, state.column,
+                         flags))
+        # A stable sort keeps the rows of a sequence in order. The end of a
+        # sequence sorts before the start of another one at the same address.
+        rows.sort(key=lambda row: (
+            row[0], not row[4] & self.FLAG_END_SEQUENCE))
+
+        self.addresses = _address_array()
+        self.files = array('L')
+        self.lines = array('l')
+        self.columns = array('L')
+        self.flags = array('B')
+        for address, file, line, column, flags in rows:
+            self.addresses.append(address)
+            self.files.append(file)
+            self.lines.append(line)
+            self.columns.append(column)
+            self.flags.append(flags)
+
+    @classmethod
+    def from_columns(cls, addresses, files, lines, columns, flags,
+                     file_entry, include_directory):
+        """ Create a LineTable from its parallel arrays (any sequences of
+            integers, e.g. memoryviews) and the file entries and include
+            directories of its line program header, without decoding a line
+            program (e.g. when loaded from a DWARFIndex).
+        """
+        table = cls.__new__(cls)
+        table.file_entry = file_entry
+        table.include_directory = include_directory
+        table.addresses = addresses
+        table.files = files
+        table.lines = lines
+        table.columns = columns
+        table.flags = flags
+        return table
+
+    def lookup(self, address):
+        """ Get the LineInfo of an address, or None if it isn't covered by the
+            line table.
+        """
+        return self._row_info(
+            bisect_right(self.addresses, address) - 1, address)
+
+    def lookup_many(self, addresses):
+        """ Batched lookup(): get the list of the results of lookup() for each
+            of the addresses, in the same order.
+        """
+        results = [None] * len(addresses)
+        i = 0
+        for n, address in sorted(enumerate(addresses), key=lambda e: e[1]):
+            i = max(bisect_right(self.addresses, address, i) - 1, 0)
+            results[n] = self._row_info(i, address)
+        return results
+
+    def __len__(self):
+        return len(self.addresses)
+
+    #------ PRIVATE ------#
+
+    def _row_info(self, i, address):
+        if (i < 0 or i >= len(self.addresses) or
+                self.addresses[i] > address or
+                self.flags[i] & self.FLAG_END_SEQUENCE):
+            return None
+        filename = directory = None
+        file_index = self.files[i]
+        if 1 <= file_index <= len(self.file_entry):
+            file_entry = self.file_entry[file_index - 1]
+            filename = file_entry.name
+            dir_index = file_entry.dir_index
+            if 1 <= dir_index <= len(self.include_directory):
+                directory = self.include_directory[dir_index - 1]
+        return LineInfo(
+            address=address,
+            filename=filename,
+            directory=directory,
+            line=self.lines[i],
+            column=self.columns[i],
+            is_stmt=bool(self.flags[i] & self.FLAG_IS_STMT))
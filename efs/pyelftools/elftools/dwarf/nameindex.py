@@ -0,0 +1,168 @@
+#-------------------------------------------------------------------------------
+# elftools: dwarf/nameindex.py
+#
+# Index of the DIEs of functions, types and variables by name
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+from collections import namedtuple
+
+from ..common.utils import struct_parse, parse_cstring_from_stream
+from .structs import DWARFStructs
+
+
+# An entry of the name index
+#
+# name:
+#   The name of the DIE (bytes, like the values of DW_AT_name). The names of
+#   DIEs nested in namespaces are qualified with '::', like in the name
+#   tables of .debug_pubnames.
+#
+# die_offset:
+#   The offset of the DIE in .debug_info
+#
+# tag:
+#   The tag of the DIE, or None if the index was built from name tables,
+#   which don't record it
+#
+NameEntry = namedtuple('NameEntry', 'name die_offset tag')
+
+
+class NameIndex(object):
+    """ Maps the names of DIEs to their NameEntry objects.
+
+        entries:
+            An iterable of NameEntry objects
+    """
+    def __init__(self, entries):
+        self._entries = {}
+        for entry in entries:
+            self._entries.setdefault(entry.name, []).append(entry)
+
+    def lookup(self, name):
+        """ Get the list of the NameEntry objects of the DIEs with the given
+            name (bytes), in no particular order
+        """
+        return self._entries.get(name, [])
+
+    def __iter__(self):
+        """ Yield all the NameEntry objects, sorted by name
+        """
+        for name in sorted(self._entries):
+            for entry in self._entries[name]:
+                yield entry
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+
+class NameIndexBuilder(object):
+    """ Collects the NameEntry objects of a DWARFInfo. They're read from the
+        name tables of its .debug_pubnames and .debug_pubtypes sections, and
+        the names of the CUs these tables don't cover are found in one
+        streaming pass over their DIEs, which only descends into namespaces.
+
+        dwarfinfo:
+            The DWARFInfo to index
+    """
+    # The DIEs whose children are named in the index
+    SCOPE_TAGS = frozenset((
+        'DW_TAG_compile_unit', 'DW_TAG_partial_unit', 'DW_TAG_namespace'))
+
+    def __init__(self, dwarfinfo):
+        self.dwarfinfo = dwarfinfo
+
+    def build(self):
+        """ Return a NameIndex of the DIEs of the DWARFInfo
+        """
+        entries = []
+        # The offsets of the CUs that have a set in .debug_pubnames and in
+        # .debug_pubtypes. A file may mix CUs with and without name tables.
+        names_cus = set()
+        types_cus = set()
+        tables = ((self.dwarfinfo.debug_pubnames_sec, names_cus),
+                  (self.dwarfinfo.debug_pubtypes_sec, types_cus))
+        for section, covered in tables:
+            if section is not None:
+                entries.extend(self._iter_name_table_entries(section, covered))
+        entries.extend(self._iter_DIE_entries(names_cus, types_cus))
+        return NameIndex(entries)
+
+    #------ PRIVATE ------#
+
+    def _iter_name_table_entries(self, section, covered):
+        """ Yield the NameEntry objects of the name tables of a
+            .debug_pubnames or .debug_pubtypes section (see section 6.1.1 of
+            the DWARFv4 spec), adding the offsets of the CUs of its sets to
+            the covered set
+        """
+        stream = section.stream
+        offset = 0
+        while offset < section.size:
+            # Like in a CU header, the first word of the initial length field
+            # determines the DWARF format of the set
+            initial_length = struct_parse(
+                self.dwarfinfo.structs.Dwarf_uint32(''), stream, offset)
+            structs = DWARFStructs(
+                little_endian=self.dwarfinfo.config.little_endian,
+                dwarf_format=64 if initial_length == 0xFFFFFFFF else 32,
+                address_size=self.dwarfinfo.config.default_address_size)
+            header = struct_parse(structs.Dwarf_nameLUT_header, stream, offset)
+            end = (offset + header['unit_length'] +
+                   structs.initial_length_field_size())
+            covered.add(header['debug_info_offset'])
+
+            # The set is a list of (DIE offset, name) pairs, ended by a zero
+            # offset. DIE offsets are relative to the CU of the set.
+            while stream.tell() < end:
+                die_offset = struct_parse(structs.Dwarf_offset(''), stream)
+                if die_offset == 0:
+                    break
+                name_offset = stream.tell()
+                name = parse_cstring_from_stream(stream)
+                if name is None:
+                    break
+                # The string is parsed by chunks, so the stream is past it
+                stream.seek(name_offset + len(name) + 1)
+                yield NameEntry(
+                    name=name,
+                    die_offset=header['debug_info_offset'] + die_offset,
+                    tag=None)
+            offset = end
+
+    def _iter_DIE_entries(self, names_cus, types_cus):
+        """ Yield the NameEntry objects of the named DIEs in the scopes of
+            SCOPE_TAGS, walking the CUs with streaming iteration. The names
+            of the CUs in names_cus, and the types of those in types_cus, are
+            left out, as their name tables have them.
+        """
+        skip = lambda die: die.tag not in self.SCOPE_TAGS
+        for cu in self.dwarfinfo.iter_CUs():
+            want_names = cu.cu_offset not in names_cus
+            want_types = cu.cu_offset not in types_cus
+            if not (want_names or want_types):
+                continue
+            # The qualified names of the namespaces, keyed by DIE offset
+            scopes = {}
+            for depth, die in cu.iter_DIEs_streaming(skip_children=skip):
+                if depth == 0 or die.is_null():
+                    continue
+                name_attr = die.attributes.get('DW_AT_name')
+                if name_attr is None:
+                    continue
+                name = name_attr.value
+                prefix = scopes.get(die.get_parent().offset)
+                if prefix is not None:
+                    name = prefix + b'::' + name
+                if die.tag == 'DW_TAG_namespace':
+                    scopes[die.offset] = name
+                if (want_types if _is_type_tag(die.tag) else want_names):
+                    yield NameEntry(
+                        name=name, die_offset=die.offset, tag=die.tag)
+
+
+def _is_type_tag(tag):
+    """ Whether DIEs of the tag are named in .debug_pubtypes rather than in
+        .debug_pubnames
+    """
+    return tag.endswith('_type') or tag == 'DW_TAG_typedef'
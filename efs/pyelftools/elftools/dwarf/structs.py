@@ -7,6 +7,8 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
+import struct
+
 from ..construct import (
     UBInt8, UBInt16, UBInt32, UBInt64, ULInt8, ULInt16, ULInt32, ULInt64,
     SBInt8, SBInt16, SBInt32, SBInt64, SLInt8, SLInt16, SLInt32, SLInt64,
@@ -14,6 +16,9 @@ from ..construct import (
     Array, PrefixedArray, CString, Embed, StaticField
     )
 from ..common.construct_utils import RepeatUntilExcluding
+from ..common.exceptions import ELFParseError
+from ..common.py3compat import PY3
+from .leb128 import decode_uleb128, decode_sleb128
 
 from .enums import *
 
@@ -57,6 +62,13 @@ class DWARFStructs(object):
                 that parse such forms. These Structs have already been given
                 dummy names.
 
+            Dwarf_dw_form_decoders:
+                A dictionary mapping the same keys into functions that parse
+                the raw value of such forms straight from a buffer (see
+                get_stream_buffer): decoder(buffer, offset) returns a
+                (raw_value, new_offset) tuple. They are much faster
+                equivalents of the Structs of Dwarf_dw_form.
+
             Dwarf_lineprog_header (+):
                 Line program header
 
@@ -69,6 +81,13 @@ class DWARFStructs(object):
             Dwarf_FDE_header (+):
                 A call-frame FDE
 
+            Dwarf_aranges_header (+):
+                Header of a set of address ranges in .debug_aranges
+
+            Dwarf_nameLUT_header (+):
+                Header of a set of names in .debug_pubnames or
+                .debug_pubtypes
+
         See also the documentation of public methods.
     """
     def __init__(self,
@@ -130,9 +149,11 @@ class DWARFStructs(object):
         self._create_cu_header()
         self._create_abbrev_declaration()
         self._create_dw_form()
+        self._create_dw_form_decoders()
         self._create_lineprog_header()
         self._create_callframe_entry_headers()
         self._create_aranges_header()
+        self._create_nameLUT_header()
 
     def _create_initial_length(self):
         def _InitialLength(name):
@@ -157,7 +178,8 @@ class DWARFStructs(object):
             self.Dwarf_initial_length('unit_length'),
             self.Dwarf_uint16('version'),
             self.Dwarf_offset('debug_abbrev_offset'),
-            self.Dwarf_uint8('address_size'))
+            self.Dwarf_uint8('address_size'),
+            record=True)
 
     def _create_abbrev_declaration(self):
         self.Dwarf_abbrev_declaration = Struct('Dwarf_abbrev_entry',
@@ -168,7 +190,8 @@ class DWARFStructs(object):
                     obj.name == 'DW_AT_null' and obj.form == 'DW_FORM_null',
                 Struct('attr_spec',
                     Enum(self.Dwarf_uleb128('name'), **ENUM_DW_AT),
-                    Enum(self.Dwarf_uleb128('form'), **ENUM_DW_FORM))))
+                    Enum(self.Dwarf_uleb128('form'), **ENUM_DW_FORM),
+                    record=True)))
 
     def _create_dw_form(self):
         self.Dwarf_dw_form = dict(
@@ -211,6 +234,14 @@ class DWARFStructs(object):
             DW_AT_GNU_all_call_sites=self.Dwarf_uleb128(''),
         )
 
+    def _create_dw_form_decoders(self):
+        key = (self.little_endian, self.dwarf_format, self.address_size)
+        decoders = _dw_form_decoders_cache.get(key)
+        if decoders is None:
+            decoders = _make_dw_form_decoders(*key)
+            _dw_form_decoders_cache[key] = decoders
+        self.Dwarf_dw_form_decoders = decoders
+
     def _create_aranges_header(self):
         self.Dwarf_aranges_header = Struct("Dwarf_aranges_header",
             self.Dwarf_initial_length('unit_length'),
@@ -220,6 +251,14 @@ class DWARFStructs(object):
             self.Dwarf_uint8('segment_size')
             )
 
+    def _create_nameLUT_header(self):
+        self.Dwarf_nameLUT_header = Struct("Dwarf_nameLUT_header",
+            self.Dwarf_initial_length('unit_length'),
+            self.Dwarf_uint16('version'),
+            self.Dwarf_offset('debug_info_offset'),
+            self.Dwarf_offset('debug_info_length')
+            )
+
     def _create_lineprog_header(self):
         # A file entry is terminated by a NULL byte, so we don't want to parse
         # past it. Therefore an If is used.
@@ -265,7 +304,8 @@ class DWARFStructs(object):
                 self.Dwarf_uint8('segment_size'),
                 self.Dwarf_uleb128('code_alignment_factor'),
                 self.Dwarf_sleb128('data_alignment_factor'),
-                self.Dwarf_uleb128('return_address_register'))
+                self.Dwarf_uleb128('return_address_register'),
+                record=True)
         else:
             self.Dwarf_CIE_header = Struct('Dwarf_CIE_header',
                 self.Dwarf_initial_length('length'),
@@ -274,13 +314,15 @@ class DWARFStructs(object):
                 CString('augmentation'),
                 self.Dwarf_uleb128('code_alignment_factor'),
                 self.Dwarf_sleb128('data_alignment_factor'),
-                self.Dwarf_uleb128('return_address_register'))
+                self.Dwarf_uleb128('return_address_register'),
+                record=True)
 
         self.Dwarf_FDE_header = Struct('Dwarf_FDE_header',
             self.Dwarf_initial_length('length'),
             self.Dwarf_offset('CIE_pointer'),
             self.Dwarf_target_addr('initial_location'),
-            self.Dwarf_target_addr('address_range'))
+            self.Dwarf_target_addr('address_range'),
+            record=True)
 
     def _make_block_struct(self, length_field):
         """ Create a struct for DW_FORM_block<size>
@@ -323,6 +365,9 @@ class _ULEB128Adapter(Adapter):
             value = (value << 7) + (ord(b) & 0x7F)
         return value
 
+    def _compile_parse(self, gen, context):
+        return _compile_LEB128(gen, decode_uleb128)
+
 
 class _SLEB128Adapter(Adapter):
     """ An adapter for SLEB128, given a sequence of bytes in a sub-construct.
@@ -337,6 +382,28 @@ class _SLEB128Adapter(Adapter):
             value |= - (1 << (7 * len(obj)))
         return value
 
+    def _compile_parse(self, gen, context):
+        return _compile_LEB128(gen, decode_sleb128)
+
+
+def _compile_LEB128(gen, decoder):
+    """ Emit the code of a compiled parser decoding a LEB128 number straight
+        from its buffer with decoder. A truncated number raises ArrayError,
+        like the RepeatUntil of _LEB128_reader does.
+    """
+    if not PY3:
+        # The memoryviews of Python 2 yield str when indexed: the number is
+        # parsed by the adapter's _parse instead
+        raise NotImplementedError()
+    obj = gen.var()
+    gen.emit('try:')
+    with gen.indented():
+        gen.emit('%s, pos = %s(buf, pos)' % (obj, gen.bind(decoder)))
+    gen.emit('except %s as ex:' % gen.bind(ELFParseError))
+    with gen.indented():
+        gen.emit("raise ArrayError('missing terminator', ex)")
+    return obj
+
 
 def _ULEB128(name):
     """ A construct creator for ULEB128 encoding.
@@ -350,3 +417,95 @@ def _SLEB128(name):
     return Rename(name, _SLEB128Adapter(_LEB128_reader()))
 
 
+
+
+# Form decoders only depend on the endianness, the DWARF format and the address
+# size, so they are shared by all the DWARFStructs with the same ones
+_dw_form_decoders_cache = {}
+
+
+def _make_dw_form_decoders(little_endian, dwarf_format, address_size):
+    """ Create the dictionary of form decoders (see Dwarf_dw_form_decoders)
+    """
+    endianness = '<' if little_endian else '>'
+
+    def fixed(fmt):
+        packer = struct.Struct(endianness + fmt)
+        unpack_from = packer.unpack_from
+        size = packer.size
+        def decode(buffer, offset):
+            try:
+                return unpack_from(buffer, offset)[0], offset + size
+            except struct.error as e:
+                raise ELFParseError(str(e))
+        return decode
+
+    def block(length_decoder):
+        def decode(buffer, offset):
+            size, offset = length_decoder(buffer, offset)
+            end = offset + size
+            if end > len(buffer):
+                raise ELFParseError('expected %d, found %d' % (
+                    size, len(buffer) - offset))
+            return list(buffer[offset:end]), end
+        return decode
+
+    uint8 = fixed('B')
+    uint16 = fixed('H')
+    uint32 = fixed('I')
+    uint64 = fixed('Q')
+    offset = uint32 if dwarf_format == 32 else uint64
+    target_addr = uint32 if address_size == 4 else uint64
+
+    return dict(
+        DW_FORM_addr=target_addr,
+
+        DW_FORM_block1=block(uint8),
+        DW_FORM_block2=block(uint16),
+        DW_FORM_block4=block(uint32),
+        DW_FORM_block=block(decode_uleb128),
+
+        DW_FORM_data1=uint8,
+        DW_FORM_data2=uint16,
+        DW_FORM_data4=uint32,
+        DW_FORM_data8=uint64,
+        DW_FORM_sdata=decode_sleb128,
+        DW_FORM_udata=decode_uleb128,
+
+        DW_FORM_string=_decode_cstring,
+        DW_FORM_strp=offset,
+        DW_FORM_flag=uint8,
+
+        DW_FORM_ref1=uint8,
+        DW_FORM_ref2=uint16,
+        DW_FORM_ref4=uint32,
+        DW_FORM_ref8=uint64,
+        DW_FORM_ref_udata=decode_uleb128,
+        DW_FORM_ref_addr=offset,
+
+        DW_FORM_indirect=decode_uleb128,
+
+        DW_FORM_flag_present=lambda buffer, offset: (b'', offset),
+        DW_FORM_sec_offset=offset,
+        DW_FORM_exprloc=block(decode_uleb128),
+        DW_FORM_ref_sig8=offset,
+
+        DW_FORM_GNU_strp_alt=offset,
+        DW_FORM_GNU_ref_alt=offset,
+        DW_AT_GNU_all_call_sites=decode_uleb128,
+    )
+
+
+def _decode_cstring(buffer, offset):
+    CHUNKSIZE = 64
+    chunks = []
+    while True:
+        chunk = bytes(buffer[offset:offset + CHUNKSIZE])
+        end_index = chunk.find(b'\x00')
+        if end_index >= 0:
+            chunks.append(chunk[:end_index])
+            return b''.join(chunks), offset + end_index + 1
+        if len(chunk) < CHUNKSIZE:
+            raise ELFParseError('unterminated string')
+        chunks.append(chunk)
+        offset += CHUNKSIZE
@@ -17,16 +17,22 @@ from ..common.utils import struct_parse, parse_cstring_from_stream
 class _DynamicStringTable(object):
     """ Bare string table based on values found via ELF dynamic tags and
         loadable segments only.  Good enough for get_string() only.
+        Strings are memoized per offset.
     """
     def __init__(self, stream, table_offset):
         self._stream = stream
         self._table_offset = table_offset
+        self._strings = {}
 
     def get_string(self, offset):
         """ Get the string stored at the given offset in this string table.
         """
-        return parse_cstring_from_stream(self._stream,
-                                         self._table_offset + offset)
+        s = self._strings.get(offset)
+        if s is None:
+            s = parse_cstring_from_stream(self._stream,
+                                          self._table_offset + offset)
+            self._strings[offset] = s
+        return s
 
 
 class DynamicTag(object):
@@ -181,9 +187,8 @@ class DynamicSegment(Segment, Dynamic):
         # segment, we do so by searching for the dynamic section whose content
         # is located at the same offset as the dynamic segment
         stringtable = None
-        for section in elffile.iter_sections():
-            if (isinstance(section, DynamicSection) and
-                    section['sh_offset'] == header['p_offset']):
+        for section in elffile.get_sections_by_type('SHT_DYNAMIC'):
+            if section['sh_offset'] == header['p_offset']:
                 stringtable = elffile.get_section(section['sh_link'])
                 break
         Segment.__init__(self, header, stream)
@@ -6,6 +6,7 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
+import hashlib
 import io
 import struct
 import zlib
@@ -19,6 +20,7 @@ except ImportError:
     PAGESIZE = mmap.PAGESIZE
 
 from ..common.py3compat import BytesIO
+from ..common.bufferstream import BufferStream
 from ..common.exceptions import ELFError
 from ..common.utils import struct_parse, elf_assert
 from .structs import ELFStructs
@@ -36,7 +38,8 @@ from ..dwarf.dwarfinfo import DWARFInfo, DebugSectionDescriptor, DwarfConfig
 
 class ELFFile(object):
     """ Creation: the constructor accepts a stream (file-like object) with the
-        contents of an ELF file.
+        contents of an ELF file. Alternatively, from_path opens the file at a
+        given path, memory-mapping it by default.
 
         Accessible attributes:
 
@@ -67,8 +70,45 @@ class ELFFile(object):
         self.stream.seek(0)
         self.e_ident_raw = self.stream.read(16)
 
+        self._section_headers = None
+        self._sections = {}
+        self._segment_headers = None
+        self._segments = {}
         self._file_stringtable_section = self._get_file_stringtable()
         self._section_name_map = None
+        self._section_type_map = None
+
+    @classmethod
+    def from_path(cls, path, use_mmap=True):
+        """ Create an ELFFile for the file at the given path.
+
+            If use_mmap is True, the file is memory-mapped and read through a
+            BufferStream: parsing reads from memory instead of issuing a
+            seek() and read() system call per structure, and the data_view()
+            of sections and segments are zero-copy memoryview slices.
+            Otherwise the file is opened as a regular file.
+
+            The returned ELFFile owns the stream; release it with close() or
+            by using the ELFFile in a with statement.
+        """
+        stream = (BufferStream.from_path(path) if use_mmap
+                  else open(path, 'rb'))
+        try:
+            return cls(stream)
+        except:
+            stream.close()
+            raise
+
+    def close(self):
+        """ Close the underlying stream
+        """
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def num_sections(self):
         """ Number of sections in the file
@@ -77,25 +117,44 @@ class ELFFile(object):
 
     def get_section(self, n):
         """ Get the section at index #n from the file (Section object or a
-            subclass)
+            subclass). Section objects are created on first access and
+            reused afterwards.
         """
-        section_header = self._get_section_header(n)
-        return self._make_section(section_header)
+        section = self._sections.get(n)
+        if section is None:
+            section = self._make_section(self._get_section_header(n))
+            self._sections[n] = section
+        return section
 
     def get_section_by_name(self, name):
         """ Get a section from the file, by name. Return None if no such
             section exists.
         """
-        # The first time this method is called, construct a name to number
-        # mapping
-        #
         if self._section_name_map is None:
-            self._section_name_map = {}
-            for i, sec in enumerate(self.iter_sections()):
-                self._section_name_map[sec.name] = i
+            self._build_section_indexes()
         secnum = self._section_name_map.get(name, None)
         return None if secnum is None else self.get_section(secnum)
 
+    def get_sections_by_type(self, sh_type):
+        """ Get a list of the sections of the given type (e.g. 'SHT_DYNAMIC'),
+            in file order.
+        """
+        if self._section_type_map is None:
+            self._build_section_indexes()
+        return [self.get_section(i)
+                for i in self._section_type_map.get(sh_type, ())]
+
+    def get_relocation_section_for(self, section):
+        """ Get the relocation section (RelocationSection object) applying to
+            the given section, or None if there isn't one. It's the .rel or
+            .rela section named after it; if both exist, the .rel one.
+        """
+        for name in ('.rel' + section.name, '.rela' + section.name):
+            relsection = self.get_section_by_name(name)
+            if isinstance(relsection, RelocationSection):
+                return relsection
+        return None
+
     def iter_sections(self):
         """ Yield all the sections in the file
         """
@@ -108,10 +167,15 @@ class ELFFile(object):
         return self['e_phnum']
 
     def get_segment(self, n):
-        """ Get the segment at index #n from the file (Segment object)
+        """ Get the segment at index #n from the file (Segment object).
+            Segment objects are created on first access and reused
+            afterwards.
         """
-        segment_header = self._get_segment_header(n)
-        return self._make_segment(segment_header)
+        segment = self._segments.get(n)
+        if segment is None:
+            segment = self._make_segment(self._get_segment_header(n))
+            self._segments[n] = segment
+        return segment
 
     def iter_segments(self):
         """ Yield all the segments in the file
@@ -119,6 +183,19 @@ class ELFFile(object):
         for i in range(self.num_segments()):
             yield self.get_segment(i)
 
+    def drop_caches(self):
+        """ Drop the parsed section and program header tables and the
+            Section and Segment objects created so far. They are rebuilt on
+            demand; note that sections and segments obtained afterwards are
+            new objects.
+        """
+        self._section_headers = None
+        self._sections = {}
+        self._segment_headers = None
+        self._segments = {}
+        self._section_name_map = None
+        self._section_type_map = None
+
     def address_offsets(self, start, size=1):
         """ Yield a file offset for each ELF segment containing a memory region.
 
@@ -139,12 +216,22 @@ class ELFFile(object):
         return bool(self.get_section_by_name('.debug_info')) or \
             bool(self.get_section_by_name('.zdebug_info'))
 
-    def get_dwarf_info(self, relocate_dwarf_sections=True):
+    def get_dwarf_info(self, relocate_dwarf_sections=True, compact_dies=False,
+                       index_path=None):
         """ Return a DWARFInfo object representing the debugging information in
             this file.
 
             If relocate_dwarf_sections is True, relocations for DWARF sections
             are looked up and applied.
+
+            If compact_dies is True, the DIEs are created as CompactDIE objects
+            (see DWARFInfo).
+
+            If index_path is given, it's the path of a sidecar DWARFIndex file
+            for this file. It's loaded if it was written for the same contents
+            (see get_index_key), and written otherwise, so that later opens
+            of the file answer addr2line queries from it. If it can't be
+            written, the DWARFInfo is returned without an index.
         """
         # Expect that has_dwarf_info was called, so at least .debug_info is
         # present.
@@ -153,7 +240,8 @@ class ELFFile(object):
 
         section_names = ('.debug_info', '.debug_aranges', '.debug_abbrev', '.debug_str',
                          '.debug_line', '.debug_frame',
-                         '.debug_loc', '.debug_ranges')
+                         '.debug_loc', '.debug_ranges',
+                         '.debug_pubnames', '.debug_pubtypes')
 
         compressed = bool(self.get_section_by_name('.zdebug_info'))
         if compressed:
@@ -161,7 +249,8 @@ class ELFFile(object):
 
         debug_info_sec_name, debug_aranges_sec_name, debug_abbrev_sec_name, debug_str_sec_name, \
             debug_line_sec_name, debug_frame_sec_name, debug_loc_sec_name, \
-            debug_ranges_sec_name = section_names
+            debug_ranges_sec_name, debug_pubnames_sec_name, \
+            debug_pubtypes_sec_name = section_names
 
         debug_sections = {}
         for secname in section_names:
@@ -176,7 +265,7 @@ class ELFFile(object):
                     dwarf_section = self._decompress_dwarf_section(dwarf_section)
                 debug_sections[secname] = dwarf_section
 
-        return DWARFInfo(
+        dwarfinfo = DWARFInfo(
                 config=DwarfConfig(
                     little_endian=self.little_endian,
                     default_address_size=self.elfclass // 8,
@@ -185,12 +274,58 @@ class ELFFile(object):
                 debug_aranges_sec=debug_sections[debug_aranges_sec_name],
                 debug_abbrev_sec=debug_sections[debug_abbrev_sec_name],
                 debug_frame_sec=debug_sections[debug_frame_sec_name],
-                # TODO(eliben): reading of eh_frame is not hooked up yet
-                eh_frame_sec=None,
+                eh_frame_sec=self._read_eh_frame_section(
+                    '.eh_frame', relocate_dwarf_sections),
+                eh_frame_hdr_sec=self._read_eh_frame_section(
+                    '.eh_frame_hdr', relocate_dwarf_sections),
                 debug_str_sec=debug_sections[debug_str_sec_name],
                 debug_loc_sec=debug_sections[debug_loc_sec_name],
                 debug_ranges_sec=debug_sections[debug_ranges_sec_name],
-                debug_line_sec=debug_sections[debug_line_sec_name])
+                debug_line_sec=debug_sections[debug_line_sec_name],
+                debug_pubnames_sec=debug_sections[debug_pubnames_sec_name],
+                debug_pubtypes_sec=debug_sections[debug_pubtypes_sec_name],
+                compact_dies=compact_dies)
+
+        if index_path is not None:
+            key = self.get_index_key()
+            if not relocate_dwarf_sections:
+                key += ':unrelocated'
+            if not dwarfinfo.load_index(index_path, key):
+                try:
+                    dwarfinfo.write_index(index_path, key)
+                except (IOError, OSError):
+                    # The index is only a cache: go on without it (e.g. in
+                    # a read-only directory)
+                    pass
+        return dwarfinfo
+
+    def get_build_id(self):
+        """ Return the build-id of the file (the descriptor of its
+            NT_GNU_BUILD_ID note) as a hex string, or None if it has none.
+        """
+        for section in self.get_sections_by_type('SHT_NOTE'):
+            for note in section.iter_notes():
+                if note['n_type'] == 'NT_GNU_BUILD_ID':
+                    return note['n_desc']
+        return None
+
+    def get_index_key(self):
+        """ Return a string identifying the contents of the file, for
+            tagging caches of data derived from it such as a DWARFIndex. It's
+            based on the build-id of the file if it has one. Otherwise it's
+            the SHA-256 digest of the whole file, which takes a full read.
+        """
+        build_id = self.get_build_id()
+        if build_id is not None:
+            return 'build-id:' + build_id
+        digest = hashlib.sha256()
+        self.stream.seek(0)
+        while True:
+            chunk = self.stream.read(PAGESIZE * 256)
+            if not chunk:
+                break
+            digest.update(chunk)
+        return 'sha256:' + digest.hexdigest()
 
 
     def get_machine_arch(self):
@@ -270,11 +405,28 @@ class ELFFile(object):
     def _get_section_header(self, n):
         """ Find the header of section #n, parse it and return the struct
         """
+        if self._section_headers is None:
+            self._section_headers = self._parse_header_table(
+                self.structs.Elf_Shdr, self['e_shoff'],
+                self['e_shentsize'], self['e_shnum'])
+        if 0 <= n < len(self._section_headers):
+            return self.structs.Elf_Shdr.make_record(self._section_headers[n])
         return struct_parse(
             self.structs.Elf_Shdr,
             self.stream,
             stream_pos=self._section_offset(n))
 
+    def _build_section_indexes(self):
+        """ Build the section name and section type indexes, in one pass
+            over the section header table, without creating Section objects.
+        """
+        self._section_name_map = {}
+        self._section_type_map = {}
+        for i in range(self.num_sections()):
+            header = self._get_section_header(i)
+            self._section_name_map[self._get_section_name(header)] = i
+            self._section_type_map.setdefault(header['sh_type'], []).append(i)
+
     def _get_section_name(self, section_header):
         """ Given a section header, find this section's name in the file's
             string table
@@ -365,11 +517,34 @@ class ELFFile(object):
     def _get_segment_header(self, n):
         """ Find the header of segment #n, parse it and return the struct
         """
+        if self._segment_headers is None:
+            self._segment_headers = self._parse_header_table(
+                self.structs.Elf_Phdr, self['e_phoff'],
+                self['e_phentsize'], self['e_phnum'])
+        if 0 <= n < len(self._segment_headers):
+            return self.structs.Elf_Phdr.make_record(self._segment_headers[n])
         return struct_parse(
             self.structs.Elf_Phdr,
             self.stream,
             stream_pos=self._segment_offset(n))
 
+    def _parse_header_table(self, struct, offset, entsize, num):
+        """ Read a section or program header table in one go and unpack its
+            entries with the struct's precompiled packer. Returns the list of
+            raw value tuples of the entries; entries cut off by the end of
+            the file are left out.
+        """
+        if num == 0 or entsize < struct.packer.size:
+            return []
+        self.stream.seek(offset)
+        data = self.stream.read(entsize * num)
+        entries = []
+        for i in range(num):
+            if i * entsize + struct.packer.size > len(data):
+                break
+            entries.append(struct.packer.unpack_from(data, i * entsize))
+        return entries
+
     def _get_file_stringtable(self):
         """ Find the file's string table section
         """
@@ -377,7 +552,8 @@ class ELFFile(object):
         return StringTableSection(
                 header=self._get_section_header(stringtable_section_num),
                 name='',
-                stream=self.stream)
+                stream=self.stream,
+                preload=True)
 
     def _parse_elf_header(self):
         """ Parses the ELF file header and assigns the result to attributes
@@ -389,23 +565,39 @@ class ELFFile(object):
         """ Read the contents of a DWARF section from the stream and return a
             DebugSectionDescriptor. Apply relocations if asked to.
         """
-        self.stream.seek(section['sh_offset'])
-        # The section data is read into a new stream, for processing
-        section_stream = BytesIO()
-        section_stream.write(self.stream.read(section['sh_size']))
-
+        reloc_handler = RelocationHandler(self)
+        reloc_section = None
         if relocate_dwarf_sections:
-            reloc_handler = RelocationHandler(self)
             reloc_section = reloc_handler.find_relocations_for_section(section)
+
+        if reloc_section is None and isinstance(self.stream, BufferStream):
+            # Nothing to patch: the data of a memory-mapped file is used in
+            # place, so opening a large file doesn't copy its debug sections
+            section_data = section.data_view()
+        else:
+            # The section data is read into a buffer, for processing
+            self.stream.seek(section['sh_offset'])
+            section_data = bytearray(self.stream.read(section['sh_size']))
             if reloc_section is not None:
-                reloc_handler.apply_section_relocations(
-                        section_stream, reloc_section)
+                reloc_handler.apply_relocations_to_buffer(
+                        section_data, reloc_section)
 
         return DebugSectionDescriptor(
-                stream=section_stream,
+                stream=BufferStream(section_data),
                 name=section.name,
                 global_offset=section['sh_offset'],
-                size=section['sh_size'])
+                size=section['sh_size'],
+                address=section['sh_addr'])
+
+    def _read_eh_frame_section(self, name, relocate_dwarf_sections):
+        """ Read the .eh_frame or .eh_frame_hdr section with the given name
+            like _read_dwarf_section, or return None if there is no such
+            section. Unlike the DWARF sections, they're never compressed.
+        """
+        section = self.get_section_by_name(name)
+        if section is None or section['sh_type'] == 'SHT_NOBITS':
+            return None
+        return self._read_dwarf_section(section, relocate_dwarf_sections)
 
     @staticmethod
     def _decompress_dwarf_section(section):
@@ -6,7 +6,7 @@
 # Yann Rouillard (yann@pleiades.fr.eu.org)
 # This code is in the public domain
 #------------------------------------------------------------------------------
-from ..construct import CString
+from ..construct import CString, Array
 from ..common.utils import struct_parse, elf_assert
 from .sections import Section, Symbol
 
@@ -200,6 +200,7 @@ class GNUVerSymSection(Section):
         self.elffile = elffile
         self.elfstructs = self.elffile.structs
         self.symboltable = symboltable
+        self._entries = None
 
     def num_symbols(self):
         """ Number of symbols in the table
@@ -211,12 +212,16 @@ class GNUVerSymSection(Section):
             It begins at 1 and not 0 since the first entry is used to
             store the current version of the syminfo table
         """
-        # Grab the symbol's entry from the stream
-        entry_offset = self['sh_offset'] + n * self['sh_entsize']
-        entry = struct_parse(
-            self.elfstructs.Elf_Versym,
-            self.stream,
-            stream_pos=entry_offset)
+        entries = self._get_entries()
+        if entries is not None and 0 <= n < len(entries):
+            entry = entries[n]
+        else:
+            # Grab the symbol's entry from the stream
+            entry_offset = self['sh_offset'] + n * self['sh_entsize']
+            entry = struct_parse(
+                self.elfstructs.Elf_Versym,
+                self.stream,
+                stream_pos=entry_offset)
         # Find the symbol name in the associated symbol table
         name = self.symboltable.get_symbol(n).name
         return Symbol(entry, name)
@@ -226,3 +231,15 @@ class GNUVerSymSection(Section):
         """
         for i in range(self.num_symbols()):
             yield self.get_symbol(i)
+
+    def _get_entries(self):
+        """ Get the list of the entries of the table, parsed at once as an
+            array on the first call. None if the entries aren't contiguous.
+        """
+        if (self._entries is None and
+                self['sh_entsize'] == self.elfstructs.Elf_Versym.sizeof()):
+            self._entries = struct_parse(
+                Array(self.num_symbols(), self.elfstructs.Elf_Versym),
+                self.stream,
+                stream_pos=self['sh_offset'])
+        return self._entries
@@ -7,6 +7,7 @@
 # This code is in the public domain
 #-------------------------------------------------------------------------------
 from collections import namedtuple
+import struct
 
 from ..common.exceptions import ELFRelocationError
 from ..common.utils import elf_assert, struct_parse
@@ -43,6 +44,19 @@ class Relocation(object):
         return self.__repr__()
 
 
+# The relocations of a section decoded into columns, as returned by
+# RelocationSection.get_relocation_arrays()
+#
+# offsets, symbols, types:
+#   Lists of the r_offset, r_info_sym and r_info_type of the relocations
+#
+# addends:
+#   List of the r_addend of the relocations, or None in a REL section
+#
+RelocationArrays = namedtuple('RelocationArrays',
+    'offsets symbols types addends')
+
+
 class RelocationSection(Section):
     """ ELF relocation section. Serves as a collection of Relocation entries.
     """
@@ -62,6 +76,7 @@ class RelocationSection(Section):
         elf_assert(
             self.header['sh_entsize'] == expected_size,
             'Expected sh_entsize of SHT_REL section to be %s' % expected_size)
+        self._arrays = None
 
     def is_RELA(self):
         """ Is this a RELA relocation section? If not, it's REL.
@@ -89,6 +104,34 @@ class RelocationSection(Section):
         for i in range(self.num_relocations()):
             yield self.get_relocation(i)
 
+    def get_relocation_arrays(self):
+        """ Decode all the relocations in the section in one pass into
+            columns (RelocationArrays object). The result is cached.
+        """
+        if self._arrays is None:
+            packer = self.entry_struct.packer
+            data = self.data_view()
+            size = self.num_relocations() * packer.size
+            if hasattr(packer, 'iter_unpack'):
+                entries = list(packer.iter_unpack(data[:size]))
+            else:
+                entries = [packer.unpack_from(data, offset)
+                           for offset in range(0, size, packer.size)]
+
+            # r_info is taken apart like in the Values of ELFStructs
+            if self.elffile.elfclass == 32:
+                shift, type_mask = 8, 0xFF
+            else:
+                shift, type_mask = 32, 0xFFFFFFFF
+            infos = [entry[1] for entry in entries]
+            self._arrays = RelocationArrays(
+                offsets=[entry[0] for entry in entries],
+                symbols=[info >> shift for info in infos],
+                types=[info & type_mask for info in infos],
+                addends=([entry[2] for entry in entries]
+                         if self.is_RELA() else None))
+        return self._arrays
+
 
 class RelocationHandler(object):
     """ Handles the logic of relocations in ELF files.
@@ -101,94 +144,93 @@ class RelocationHandler(object):
             file. Return a RelocationSection object, or None if none was
             found.
         """
-        reloc_section_names = (
-                '.rel' + section.name,
-                '.rela' + section.name)
-        # Find the relocation section aimed at this one. Currently assume
-        # that either .rel or .rela section exists for this section, but
-        # not both.
-        for relsection in self.elffile.iter_sections():
-            if (    isinstance(relsection, RelocationSection) and
-                    relsection.name in reloc_section_names):
-                return relsection
-        return None
+        # Currently assume that either .rel or .rela section exists for this
+        # section, but not both.
+        return self.elffile.get_relocation_section_for(section)
 
     def apply_section_relocations(self, stream, reloc_section):
         """ Apply all relocations in reloc_section (a RelocationSection object)
             to the given stream, that contains the data of the section that is
             being relocated. The stream is modified as a result.
         """
+        stream.seek(0)
+        buffer = bytearray(stream.read())
+        self.apply_relocations_to_buffer(buffer, reloc_section)
+        stream.seek(0)
+        stream.write(buffer)
+
+    def apply_relocations_to_buffer(self, buffer, reloc_section):
+        """ Apply all relocations in reloc_section (a RelocationSection object)
+            to buffer, a bytearray with the data of the section that is being
+            relocated. The relocations are decoded at once and applied in a
+            single pass over the buffer.
+        """
         # The symbol table associated with this relocation section
         symtab = self.elffile.get_section(reloc_section['sh_link'])
-        for reloc in reloc_section.iter_relocations():
-            self._do_apply_relocation(stream, reloc, symtab)
-
-    def _do_apply_relocation(self, stream, reloc, symtab):
-        # Preparations for performing the relocation: obtain the value of
-        # the symbol mentioned in the relocation, as well as the relocation
-        # recipe which tells us how to actually perform it.
-        # All peppered with some sanity checking.
-        if reloc['r_info_sym'] >= symtab.num_symbols():
-            raise ELFRelocationError(
-                'Invalid symbol reference in relocation: index %s' % (
-                    reloc['r_info_sym']))
-        sym_value = symtab.get_symbol(reloc['r_info_sym'])['st_value']
-
-        reloc_type = reloc['r_info_type']
-        recipe = None
-
-        if self.elffile.get_machine_arch() == 'x86':
-            if reloc.is_RELA():
+        sym_values = symtab.get_symbol_values()
+        recipes = self._get_recipes(reloc_section)
+        arrays = reloc_section.get_relocation_arrays()
+        addends = arrays.addends or [0] * len(arrays.offsets)
+
+        endianness = '<' if self.elffile.little_endian else '>'
+        value_structs = {
+            4: struct.Struct(endianness + 'I'),
+            8: struct.Struct(endianness + 'Q'),
+        }
+
+        for offset, sym, reloc_type, addend in zip(
+                arrays.offsets, arrays.symbols, arrays.types, addends):
+            if sym >= len(sym_values):
                 raise ELFRelocationError(
-                    'Unexpected RELA relocation for x86: %s' % reloc)
-            recipe = self._RELOCATION_RECIPES_X86.get(reloc_type, None)
-        elif self.elffile.get_machine_arch() == 'x64':
-            if not reloc.is_RELA():
+                    'Invalid symbol reference in relocation: index %s' % sym)
+
+            recipe = recipes.get(reloc_type, None)
+            if recipe is None:
                 raise ELFRelocationError(
-                    'Unexpected REL relocation for x64: %s' % reloc)
-            recipe = self._RELOCATION_RECIPES_X64.get(reloc_type, None)
-        elif self.elffile.get_machine_arch() == 'MIPS':
-            if reloc.is_RELA():
+                        'Unsupported relocation type: %s' % reloc_type)
+
+            value_struct = value_structs.get(recipe.bytesize, None)
+            if value_struct is None:
+                raise ELFRelocationError('Invalid bytesize %s for relocation' %
+                        recipe.bytesize)
+
+            relocated_value = recipe.calc_func(
+                value=value_struct.unpack_from(buffer, offset)[0],
+                sym_value=sym_values[sym],
+                offset=offset,
+                addend=addend if recipe.has_addend else 0)
+
+            # Make sure the relocated value fits back by wrapping it around.
+            # This looks like a problem, but it seems to be the way this is
+            # done in binutils too.
+            value_struct.pack_into(buffer, offset,
+                relocated_value % (2 ** (recipe.bytesize * 8)))
+
+    def _get_recipes(self, reloc_section):
+        """ The relocation recipes for the machine of the file, keyed by
+            relocation type. All the relocations of a section are of the same
+            kind (REL or RELA), so it's checked once against the machine.
+        """
+        arch = self.elffile.get_machine_arch()
+        if arch == 'x86':
+            if reloc_section.is_RELA():
                 raise ELFRelocationError(
-                    'Unexpected RELA relocation for MIPS: %s' % reloc)
-            recipe = self._RELOCATION_RECIPES_MIPS.get(reloc_type, None)
-
-        if recipe is None:
-            raise ELFRelocationError(
-                    'Unsupported relocation type: %s' % reloc_type)
-
-        # So now we have everything we need to actually perform the relocation.
-        # Let's get to it:
-
-        # 0. Find out which struct we're going to be using to read this value
-        #    from the stream and write it back.
-        if recipe.bytesize == 4:
-            value_struct = self.elffile.structs.Elf_word('')
-        elif recipe.bytesize == 8:
-            value_struct = self.elffile.structs.Elf_word64('')
-        else:
-            raise ELFRelocationError('Invalid bytesize %s for relocation' %
-                    recipe_bytesize)
-
-        # 1. Read the value from the stream (with correct size and endianness)
-        original_value = struct_parse(
-            value_struct,
-            stream,
-            stream_pos=reloc['r_offset'])
-        # 2. Apply the relocation to the value, acting according to the recipe
-        relocated_value = recipe.calc_func(
-            value=original_value,
-            sym_value=sym_value,
-            offset=reloc['r_offset'],
-            addend=reloc['r_addend'] if recipe.has_addend else 0)
-        # 3. Write the relocated value back into the stream
-        stream.seek(reloc['r_offset'])
-
-        # Make sure the relocated value fits back by wrapping it around. This
-        # looks like a problem, but it seems to be the way this is done in
-        # binutils too.
-        relocated_value = relocated_value % (2 ** (recipe.bytesize * 8))
-        value_struct.build_stream(relocated_value, stream)
+                    'Unexpected RELA relocation for x86: %s' %
+                    reloc_section.name)
+            return self._RELOCATION_RECIPES_X86
+        elif arch == 'x64':
+            if not reloc_section.is_RELA():
+                raise ELFRelocationError(
+                    'Unexpected REL relocation for x64: %s' %
+                    reloc_section.name)
+            return self._RELOCATION_RECIPES_X64
+        elif arch == 'MIPS':
+            if reloc_section.is_RELA():
+                raise ELFRelocationError(
+                    'Unexpected RELA relocation for MIPS: %s' %
+                    reloc_section.name)
+            return self._RELOCATION_RECIPES_MIPS
+        return {}
 
     # Relocations are represented by "recipes". Each recipe specifies:
     #  bytesize: The number of bytes to read (and write back) to the section.
@@ -241,7 +283,7 @@ class RelocationHandler(object):
         ENUM_RELOC_TYPE_x64['R_X86_64_64']: _RELOCATION_RECIPE_TYPE(
             bytesize=8, has_addend=True, calc_func=_reloc_calc_sym_plus_addend),
         ENUM_RELOC_TYPE_x64['R_X86_64_PC32']: _RELOCATION_RECIPE_TYPE(
-            bytesize=8, has_addend=True,
+            bytesize=4, has_addend=True,
             calc_func=_reloc_calc_sym_plus_addend_pcrel),
         ENUM_RELOC_TYPE_x64['R_X86_64_32']: _RELOCATION_RECIPE_TYPE(
             bytesize=4, has_addend=True, calc_func=_reloc_calc_sym_plus_addend),
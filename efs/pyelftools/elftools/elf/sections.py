@@ -6,10 +6,18 @@
 # Eli Bendersky (eliben@gmail.com)
 # This code is in the public domain
 #-------------------------------------------------------------------------------
+from ..common.bufferstream import BufferStream
+from ..common.py3compat import intern
 from ..common.utils import struct_parse, elf_assert, parse_cstring_from_stream
 from collections import defaultdict
+import struct
 from .notes import iter_notes
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class Section(object):
     """ Base class for ELF sections. Also used for all sections types that have
@@ -30,6 +38,15 @@ class Section(object):
         self.stream.seek(self['sh_offset'])
         return self.stream.read(self['sh_size'])
 
+    def data_view(self):
+        """ The section data as a buffer. If the file is read through a
+            BufferStream, this is a zero-copy memoryview slice of it,
+            otherwise the data read from the file (like data()).
+        """
+        if isinstance(self.stream, BufferStream):
+            return self.stream.view(self['sh_offset'], self['sh_size'])
+        return self.data()
+
     def is_null(self):
         """ Is this a null section?
         """
@@ -58,16 +75,59 @@ class NullSection(Section):
 
 class StringTableSection(Section):
     """ ELF string table section.
+
+        Strings are decoded once per offset: get_string keeps them, interned,
+        in a memo. If preload is True, or once load() is called, the whole
+        table is read in a single go and strings are taken from it instead of
+        being parsed from the stream.
     """
-    def __init__(self, header, name, stream):
+    def __init__(self, header, name, stream, preload=False):
         super(StringTableSection, self).__init__(header, name, stream)
+        self._strings = {}
+        self._table = None
+        if preload:
+            self.load()
+
+    def load(self):
+        """ Read the whole string table into memory, if not done yet.
+        """
+        if self._table is None:
+            self._table = self.data()
 
     def get_string(self, offset):
         """ Get the string stored at the given offset in this string table.
         """
-        table_offset = self['sh_offset']
-        s = parse_cstring_from_stream(self.stream, table_offset + offset)
-        return s.decode('ascii')
+        s = self._strings.get(offset)
+        if s is None:
+            s = intern(self._parse_string(offset).decode('ascii'))
+            self._strings[offset] = s
+        return s
+
+    def iter_strings(self):
+        """ Yield (offset, string) for all the strings of the table, in
+            order. Loads the table (see load()).
+        """
+        self.load()
+        table = self._table
+        offset = 0
+        for raw in table.split(b'\x00')[:-1]:
+            s = self._strings.get(offset)
+            if s is None:
+                s = intern(raw.decode('ascii'))
+                self._strings[offset] = s
+            yield offset, s
+            offset += len(raw) + 1
+
+    def _parse_string(self, offset):
+        """ The bytes of the string at offset, without the terminating
+            \x00 byte
+        """
+        if self._table is not None:
+            end = self._table.find(b'\x00', offset)
+            if end >= 0:
+                return self._table[offset:end]
+        return parse_cstring_from_stream(
+            self.stream, self['sh_offset'] + offset)
 
 
 class SymbolTableSection(Section):
@@ -84,6 +144,7 @@ class SymbolTableSection(Section):
         elf_assert(self['sh_size'] % self['sh_entsize'] == 0,
                 'Expected section size to be a multiple of entry size in section %r' % name)
         self._symbol_name_map = None
+        self._symbol_values = None
 
     def num_symbols(self):
         """ Number of symbols in the table
@@ -120,9 +181,104 @@ class SymbolTableSection(Section):
     def iter_symbols(self):
         """ Yield all the symbols in the table
         """
+        # Most of the string table is going to be needed
+        self.stringtable.load()
         for i in range(self.num_symbols()):
             yield self.get_symbol(i)
 
+    def get_symbol_values(self):
+        """ Get the st_value of all the symbols in the table, as a list
+            indexed by symbol number. The values are decoded in one pass and
+            cached.
+        """
+        if self._symbol_values is None:
+            e = '<' if self.elffile.little_endian else '>'
+            # st_value is at the same offset in all entries (see
+            # _symbol_dtype)
+            if self.elffile.elfclass == 32:
+                value_struct, value_offset = struct.Struct(e + 'I'), 4
+            else:
+                value_struct, value_offset = struct.Struct(e + 'Q'), 8
+            data = self.data_view()
+            entsize = self['sh_entsize']
+            self._symbol_values = [
+                value_struct.unpack_from(data, offset)[0]
+                for offset in range(value_offset,
+                                    self.num_symbols() * entsize, entsize)]
+        return self._symbol_values
+
+    def as_arrays(self):
+        """ Decode the whole table at once into columns of numpy arrays
+            (SymbolTableArrays object). Symbol names aren't resolved until
+            asked for. Requires numpy.
+        """
+        if numpy is None:
+            raise ImportError('SymbolTableSection.as_arrays requires numpy')
+        dtype = self._symbol_dtype()
+        entries = numpy.frombuffer(
+            self.data_view(), dtype=dtype, count=self.num_symbols())
+        return SymbolTableArrays(entries, self.stringtable)
+
+    def _symbol_dtype(self):
+        """ numpy structured dtype of a symbol table entry, laid out as
+            Elf32_Sym or Elf64_Sym in the file's endianness
+        """
+        e = '<' if self.elffile.little_endian else '>'
+        if self.elffile.elfclass == 32:
+            fields = [('st_name', 'u4', 0), ('st_value', 'u4', 4),
+                      ('st_size', 'u4', 8), ('st_info', 'u1', 12),
+                      ('st_other', 'u1', 13), ('st_shndx', 'u2', 14)]
+        else:
+            fields = [('st_name', 'u4', 0), ('st_info', 'u1', 4),
+                      ('st_other', 'u1', 5), ('st_shndx', 'u2', 6),
+                      ('st_value', 'u8', 8), ('st_size', 'u8', 16)]
+        return numpy.dtype({
+            'names': [name for name, _, _ in fields],
+            'formats': [e + fmt for _, fmt, _ in fields],
+            'offsets': [offset for _, _, offset in fields],
+            'itemsize': self['sh_entsize']})
+
+
+class SymbolTableArrays(object):
+    """ Columnar form of a symbol table, as returned by
+        SymbolTableSection.as_arrays().
+
+        Accessible attributes:
+
+            st_name, st_value, st_size, st_info, st_other, st_shndx:
+                numpy arrays with the raw values of the entries' fields.
+                st_info and st_other are not taken apart: the binding of
+                symbol n is st_info[n] >> 4 and its type st_info[n] & 0xf.
+
+            entries:
+                the structured numpy array holding all the columns
+    """
+    def __init__(self, entries, stringtable):
+        self.entries = entries
+        self.stringtable = stringtable
+        self.st_name = entries['st_name']
+        self.st_value = entries['st_value']
+        self.st_size = entries['st_size']
+        self.st_info = entries['st_info']
+        self.st_other = entries['st_other']
+        self.st_shndx = entries['st_shndx']
+
+    def __len__(self):
+        return len(self.entries)
+
+    def name(self, n):
+        """ The name of symbol #n
+        """
+        return self.stringtable.get_string(int(self.st_name[n]))
+
+    def names(self):
+        """ The names of all the symbols, decoded in bulk from the string
+            table: a list in symbol order
+        """
+        self.stringtable.load()
+        get_string = self.stringtable.get_string
+        return [get_string(offset) for offset in self.st_name.tolist()]
+
 
 class Symbol(object):
     """ Symbol object - representing a single symbol entry from a symbol table
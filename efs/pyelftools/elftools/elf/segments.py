@@ -7,6 +7,7 @@
 # This code is in the public domain
 #-------------------------------------------------------------------------------
 from ..construct import CString
+from ..common.bufferstream import BufferStream
 from ..common.utils import struct_parse
 from .constants import SH_FLAGS
 from .notes import iter_notes
@@ -23,6 +24,15 @@ class Segment(object):
         self.stream.seek(self['p_offset'])
         return self.stream.read(self['p_filesz'])
 
+    def data_view(self):
+        """ The segment data as a buffer. If the file is read through a
+            BufferStream, this is a zero-copy memoryview slice of it,
+            otherwise the data read from the file (like data()).
+        """
+        if isinstance(self.stream, BufferStream):
+            return self.stream.view(self['p_offset'], self['p_filesz'])
+        return self.data()
+
     def __getitem__(self, name):
         """ Implement dict-like access to header entries
         """
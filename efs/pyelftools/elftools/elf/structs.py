@@ -13,6 +13,7 @@ from ..construct import (
     SBInt32, SLInt32, SBInt64, SLInt64,
     Struct, Array, Enum, Padding, BitStruct, BitField, Value,
     )
+from ..common.construct_utils import PrecompiledStruct
 
 from .enums import *
 
@@ -38,6 +39,13 @@ class ELFStructs(object):
 
             Elf_Rel, Elf_Rela:
                 Entries in relocation sections
+
+            Elf_Dyn:
+                Dynamic section entry
+
+        The fixed-layout records above are PrecompiledStructs: they parse
+        with a single struct.Struct unpack into slotted records that allow
+        the same dict-like access as Containers.
     """
     def __init__(self, little_endian=True, elfclass=32):
         assert elfclass == 32 or elfclass == 64
@@ -80,7 +88,7 @@ class ELFStructs(object):
         self._create_note()
 
     def _create_ehdr(self):
-        self.Elf_Ehdr = Struct('Elf_Ehdr',
+        self.Elf_Ehdr = PrecompiledStruct('Elf_Ehdr',
             Struct('e_ident',
                 Array(4, self.Elf_byte('EI_MAG')),
                 Enum(self.Elf_byte('EI_CLASS'), **ENUM_EI_CLASS),
@@ -107,7 +115,7 @@ class ELFStructs(object):
 
     def _create_phdr(self):
         if self.elfclass == 32:
-            self.Elf_Phdr = Struct('Elf_Phdr',
+            self.Elf_Phdr = PrecompiledStruct('Elf_Phdr',
                 Enum(self.Elf_word('p_type'), **ENUM_P_TYPE),
                 self.Elf_offset('p_offset'),
                 self.Elf_addr('p_vaddr'),
@@ -118,7 +126,7 @@ class ELFStructs(object):
                 self.Elf_word('p_align'),
             )
         else: # 64
-            self.Elf_Phdr = Struct('Elf_Phdr',
+            self.Elf_Phdr = PrecompiledStruct('Elf_Phdr',
                 Enum(self.Elf_word('p_type'), **ENUM_P_TYPE),
                 self.Elf_word('p_flags'),
                 self.Elf_offset('p_offset'),
@@ -130,7 +138,7 @@ class ELFStructs(object):
             )
 
     def _create_shdr(self):
-        self.Elf_Shdr = Struct('Elf_Shdr',
+        self.Elf_Shdr = PrecompiledStruct('Elf_Shdr',
             self.Elf_word('sh_name'),
             Enum(self.Elf_word('sh_type'), **ENUM_SH_TYPE),
             self.Elf_xword('sh_flags'),
@@ -157,13 +165,13 @@ class ELFStructs(object):
             r_info_type = Value('r_info_type',
                 lambda ctx: ctx['r_info'] & 0xFFFFFFFF)
 
-        self.Elf_Rel = Struct('Elf_Rel',
+        self.Elf_Rel = PrecompiledStruct('Elf_Rel',
             self.Elf_addr('r_offset'),
             self.Elf_xword('r_info'),
             r_info_sym,
             r_info_type,
         )
-        self.Elf_Rela = Struct('Elf_Rela',
+        self.Elf_Rela = PrecompiledStruct('Elf_Rela',
             self.Elf_addr('r_offset'),
             self.Elf_xword('r_info'),
             r_info_sym,
@@ -172,7 +180,7 @@ class ELFStructs(object):
         )
 
     def _create_dyn(self):
-        self.Elf_Dyn = Struct('Elf_Dyn',
+        self.Elf_Dyn = PrecompiledStruct('Elf_Dyn',
             Enum(self.Elf_sxword('d_tag'), **ENUM_D_TAG),
             self.Elf_xword('d_val'),
             Value('d_ptr', lambda ctx: ctx['d_val']),
@@ -190,7 +198,7 @@ class ELFStructs(object):
             Padding(5),
             Enum(BitField('visibility', 3), **ENUM_ST_VISIBILITY))
         if self.elfclass == 32:
-            self.Elf_Sym = Struct('Elf_Sym',
+            self.Elf_Sym = PrecompiledStruct('Elf_Sym',
                 self.Elf_word('st_name'),
                 self.Elf_addr('st_value'),
                 self.Elf_word('st_size'),
@@ -199,7 +207,7 @@ class ELFStructs(object):
                 Enum(self.Elf_half('st_shndx'), **ENUM_ST_SHNDX),
             )
         else:
-            self.Elf_Sym = Struct('Elf_Sym',
+            self.Elf_Sym = PrecompiledStruct('Elf_Sym',
                 self.Elf_word('st_name'),
                 st_info_struct,
                 st_other_struct,
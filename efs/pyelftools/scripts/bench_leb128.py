@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+# scripts/bench_leb128.py
+#
+# Micro-benchmark of LEB128 decoding: the construct structs of DWARFStructs
+# against the decoders of elftools.dwarf.leb128
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import random
+import sys
+import timeit
+
+# For running from development directory. It should take precedence over the
+# installed pyelftools.
+sys.path.insert(0, '.')
+
+from elftools.common.py3compat import BytesIO
+from elftools.common.utils import struct_parse
+from elftools.dwarf.structs import DWARFStructs
+from elftools.dwarf.leb128 import decode_uleb128, decode_sleb128
+
+
+def encode_uleb128(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return out
+
+
+def encode_sleb128(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if ((value == 0 and not byte & 0x40) or
+                (value == -1 and byte & 0x40)):
+            out.append(byte)
+            return out
+        out.append(byte | 0x80)
+
+
+def make_values(count, signed):
+    # Mostly small numbers, like in real DWARF data
+    rnd = random.Random(0)
+    values = []
+    for _ in range(count):
+        bits = rnd.choice((6, 6, 6, 6, 13, 20, 32, 63))
+        value = rnd.getrandbits(bits)
+        if signed and rnd.random() < 0.5:
+            value = -value
+        values.append(value)
+    return values
+
+
+def bench(name, values, encode, struct, decode, repeat):
+    data = bytes(b''.join(bytes(encode(v)) for v in values))
+    count = len(values)
+
+    def construct_path():
+        stream = BytesIO(data)
+        return [struct_parse(struct, stream) for _ in range(count)]
+
+    def buffer_path():
+        buffer = bytearray(data)
+        offset = 0
+        result = []
+        for _ in range(count):
+            value, offset = decode(buffer, offset)
+            result.append(value)
+        return result
+
+    assert construct_path() == buffer_path() == values
+
+    t_construct = min(timeit.repeat(construct_path, number=1, repeat=repeat))
+    t_buffer = min(timeit.repeat(buffer_path, number=1, repeat=repeat))
+    print('%s: %d numbers, %d bytes' % (name, count, len(data)))
+    print('    construct: %8.1f ns/number' % (t_construct / count * 1e9))
+    print('    leb128:    %8.1f ns/number (%.1fx)' % (
+        t_buffer / count * 1e9, t_construct / t_buffer))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    structs = DWARFStructs(
+        little_endian=True, dwarf_format=32, address_size=8)
+    bench('ULEB128', make_values(count, signed=False), encode_uleb128,
+          structs.Dwarf_uleb128(''), decode_uleb128, repeat=3)
+    bench('SLEB128', make_values(count, signed=True), encode_sleb128,
+          structs.Dwarf_sleb128(''), decode_sleb128, repeat=3)
+
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+# scripts/bench_records.py
+#
+# Benchmark of the memory and time spent per parsed Elf_Sym: a Struct parsing
+# into Containers, a Struct in the record mode, and the PrecompiledStruct of
+# ELFStructs. Requires Python 3 (tracemalloc).
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+import copy
+import sys
+import timeit
+import tracemalloc
+
+# For running from development directory. It should take precedence over the
+# installed pyelftools.
+sys.path.insert(0, '.')
+
+from elftools.common.bufferstream import BufferStream
+from elftools.common.utils import struct_parse
+from elftools.construct import Struct, Buffered
+from elftools.elf.elffile import ELFFile
+
+
+def symbol_table_data(path):
+    """ Get the ELFStructs of the ELF file at path, with the data of its
+        symbol table
+    """
+    elffile = ELFFile(BufferStream.from_path(path))
+    section = (elffile.get_section_by_name('.symtab') or
+               elffile.get_section_by_name('.dynsym'))
+    if section is None:
+        sys.exit('%s has no symbol table' % path)
+    return elffile.structs, bytes(section.data())
+
+
+def record_struct(struct):
+    """ Copy a Struct into one in the record mode, with its nested Structs
+        (and those of its BitStructs)
+    """
+    subcons = []
+    for sc in struct.subcons:
+        if type(sc) is Struct:
+            sc = record_struct(sc)
+        elif isinstance(sc, Buffered) and type(sc.subcon) is Struct:
+            sc = copy.copy(sc)
+            sc.subcon = record_struct(sc.subcon)
+        subcons.append(sc)
+    return Struct(struct.name, *subcons, nested=struct.nested, record=True)
+
+
+def parse_all(struct, data, count):
+    stream = BufferStream(data)
+    return [struct_parse(struct, stream) for _ in range(count)]
+
+
+def bench(name, struct, data, count, baseline=None):
+    parse_all(struct, data, 1)  # compile the parser first
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    symbols = parse_all(struct, data, count)
+    retained = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del symbols
+
+    seconds = min(timeit.repeat(
+        lambda: parse_all(struct, data, count), number=1, repeat=3))
+    per_symbol = float(retained) / count
+    print('%-18s %8.1f bytes/symbol  %8.2f us/symbol%s' % (
+        name, per_symbol, seconds / count * 1e6,
+        '' if baseline is None else '  (%.1fx less memory)' % (
+            baseline / per_symbol)))
+    return per_symbol
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else 'examples/sample_exe64.elf'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    structs, table = symbol_table_data(path)
+    sym_size = structs.Elf_Sym.sizeof()
+    data = table * (count * sym_size // len(table) + 1)
+    container_struct = Struct('Elf_Sym', *structs.Elf_Sym.subcons)
+
+    print('%s: %d symbols of %d bytes' % (path, count, sym_size))
+    baseline = bench('Container', container_struct, data, count)
+    bench('Struct(record)', record_struct(container_struct), data, count,
+          baseline)
+    bench('PrecompiledStruct', structs.Elf_Sym, data, count, baseline)
+
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
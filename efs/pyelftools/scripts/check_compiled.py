@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+# scripts/check_compiled.py
+#
+# Regression check of the compiled parsers: parse_from() (compiled, see
+# Construct.compile) must parse like parse() (through _parse), and like the
+# expected object where one is given
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+from __future__ import print_function
+import sys
+
+# For running from development directory. It should take precedence over the
+# installed pyelftools.
+sys.path.insert(0, '.')
+
+from elftools.construct import Adapter, Array, MetaArray, Struct, ULInt8
+from elftools.dwarf.structs import DWARFStructs
+
+
+class Scale(Adapter):
+    """ Multiply a field by the field 'mult' of its struct """
+    def _decode(self, obj, context):
+        return obj * context.mult
+
+
+class Rel(Adapter):
+    """ Add the field 'base' of the enclosing struct to a field """
+    def _decode(self, obj, context):
+        return obj + context._.base
+
+
+_dwarf_structs = DWARFStructs(little_endian=True, dwarf_format=32,
+                              address_size=8)
+
+# The cases: (name, construct, data, expected object or None)
+CASES = [
+    ('sibling in the same unpack',
+        Struct('s', ULInt8('mult'), Scale(ULInt8('x'))),
+        b'\x03\x05', None),
+    ('siblings in the same unpack',
+        Struct('s', ULInt8('mult'), Scale(ULInt8('x')), Scale(ULInt8('y')),
+            ULInt8('z')),
+        b'\x02\x05\x07\x09', None),
+    ('bulk array of negative count',
+        MetaArray(lambda ctx: -1, ULInt8('v')),
+        b'\x01', []),
+    ('bulk array reading the enclosing context',
+        Struct('o', ULInt8('base'),
+            Array(2, Struct('e', Rel(ULInt8('v')), ULInt8('w')))),
+        b'\x10\x01\x02\x03\x04', None),
+    ('truncated ULEB128',
+        _dwarf_structs.Dwarf_uleb128('v'),
+        b'\x80\x80', None),
+    ('truncated SLEB128',
+        _dwarf_structs.Dwarf_sleb128('v'),
+        b'\xff', None),
+    ('struct with a truncated LEB128',
+        _dwarf_structs.Dwarf_abbrev_declaration,
+        b'\x11\x01\x03\x88', None),
+]
+
+
+def parse_outcome(parse):
+    try:
+        return parse()
+    except Exception as ex:
+        return type(ex).__name__
+
+
+def main():
+    failures = 0
+    for name, construct, data, expected in CASES:
+        parsed = parse_outcome(lambda: construct.parse(data))
+        compiled = parse_outcome(lambda: construct.parse_from(data)[0])
+        if compiled != parsed or expected is not None and parsed != expected:
+            failures += 1
+            print('FAIL %s: parse() gave %r, parse_from() gave %r' % (
+                name, parsed, compiled))
+    print('%d of %d cases passed' % (len(CASES) - failures, len(CASES)))
+    return 1 if failures else 0
+
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+# scripts/check_name_index.py
+#
+# Regression check of the name index of DWARFInfo.lookup_name: the names of
+# the DIEs of the CUs that .debug_pubnames doesn't cover, and the types of
+# those .debug_pubtypes doesn't cover, must be found by lookup_name, whether
+# the file has both sections, only one of them, or name tables for some of
+# its CUs only. The last case is a file linked from objects built with and
+# without -gpubnames, e.g.:
+#
+#   gcc -gdwarf-4 -gpubnames -c a.c && gcc -gdwarf-4 -c b.c && gcc a.o b.o
+#
+# This code is in the public domain
+#-------------------------------------------------------------------------------
+from __future__ import print_function
+import sys
+
+# For running from development directory. It should take precedence over the
+# installed pyelftools.
+sys.path.insert(0, '.')
+
+from elftools.dwarf.nameindex import NameIndexBuilder
+from elftools.elf.elffile import ELFFile
+
+
+def check(path, drop_section=None):
+    """ Check the name index of the ELF file at path, as if it had no
+        section drop_section (e.g. 'debug_pubtypes_sec'). Return the number
+        of missing names.
+    """
+    with open(path, 'rb') as f:
+        dwarfinfo = ELFFile(f).get_dwarf_info()
+        if drop_section is not None:
+            setattr(dwarfinfo, drop_section, None)
+        builder = NameIndexBuilder(dwarfinfo)
+        covered = []
+        for section in (dwarfinfo.debug_pubnames_sec,
+                        dwarfinfo.debug_pubtypes_sec):
+            cus = set()
+            if section is not None:
+                for _ in builder._iter_name_table_entries(section, cus):
+                    pass
+            covered.append(cus)
+        # The names of a walk of the DIEs of the CUs the tables don't cover
+        walked = builder._iter_DIE_entries(*covered)
+        missing = sorted(set(entry.name for entry in walked
+                             if not dwarfinfo.lookup_name(entry.name)))
+    if missing:
+        print('FAIL %s%s: %d names missing, e.g. %s' % (
+            path, '' if drop_section is None else ' without ' + drop_section,
+            len(missing), b', '.join(missing[:5]).decode('latin-1')))
+    return len(missing)
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit('usage: %s <elf-file>...' % sys.argv[0])
+    failures = 0
+    for path in sys.argv[1:]:
+        for drop_section in (None, 'debug_pubnames_sec', 'debug_pubtypes_sec'):
+            failures += check(path, drop_section) > 0
+    print('%d failures' % failures)
+    return 1 if failures else 0
+
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+elfcache.py: a persistent cache of the per-elf results of efs.
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+
+################################################################################
+# class ElfCache
+#   keeps the results of parsing elf files in a json file, so that unchanged
+#   elf files need not be parsed again. an entry is keyed by the file path and
+#   is valid while the size and the mtime of the file are unchanged, or while
+#   its sha-256 digest is unchanged if the size or the mtime differ (e.g. a new
+#   checkout of the same content). the least recently used entries are evicted
+#   once there are more than max_entries.
+#
+class ElfCache:
+    DEFAULT_MAX_ENTRIES = 4096
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, filename, max_entries=DEFAULT_MAX_ENTRIES, invalidate=False):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if not invalidate:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, 'r') as f:
+                entries = json.load(f, object_pairs_hook=OrderedDict)
+            if isinstance(entries, dict):
+                self.entries = entries
+        except (IOError, ValueError):
+            pass
+        self.evict()
+
+    def save(self):
+        tmpname = self.filename + '.tmp'
+        with open(tmpname, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmpname, self.filename)
+
+    @classmethod
+    def sha256(cls, filename):
+        h = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    ################################################################################
+    # get() returns the cached result of the elf file, or None if the file is not
+    # cached, has been changed or cannot be found.
+    #
+    def get(self, filename):
+        entry = self.entries.get(filename)
+        result = None
+        if entry is not None:
+            try:
+                st = os.stat(filename)
+                if entry["size"] == st.st_size:
+                    if entry["mtime"] == st.st_mtime_ns:
+                        result = entry["result"]
+                    elif entry["sha256"] == self.sha256(filename):
+                        entry["mtime"] = st.st_mtime_ns
+                        result = entry["result"]
+            except OSError:
+                pass
+        if result is not None:
+            self.entries.move_to_end(filename)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    ################################################################################
+    # put() caches the result of the elf file and evicts the least recently used
+    # entries if the cache is full.
+    #
+    def put(self, filename, result):
+        try:
+            st = os.stat(filename)
+            self.entries[filename] = {
+                "size": st.st_size,
+                "mtime": st.st_mtime_ns,
+                "sha256": self.sha256(filename),
+                "result": result,
+            }
+            self.entries.move_to_end(filename)
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        return "elf cache: %d hits, %d misses, %d entries" % (self.hits, self.misses, len(self.entries))